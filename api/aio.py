@@ -0,0 +1,164 @@
+import asyncio
+import functools
+import importlib.util
+import os
+import threading
+import time
+
+from flask import current_app
+from flask_restx import Resource
+
+import metrics
+from config import Config
+from queries import STATEMENTS
+
+
+def available():
+    """Whether the optional async drivers (asyncpg, aiosmtplib) are installed."""
+    return all(importlib.util.find_spec(name) is not None for name in ('asyncpg', 'aiosmtplib'))
+
+
+class EventLoopThread:
+    """One asyncio loop per process, running on a daemon thread.
+
+    Request threads hand coroutines to it with run() and wait for the
+    result. Their Postgres and SMTP waits are then multiplexed over the
+    loop's small connection pools instead of each thread pinning a
+    connection. run_coroutine_threadsafe() schedules from the caller's
+    thread, so the coroutine runs in a copy of the caller's context and
+    ``request``, ``g`` and ``current_app`` work inside it.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name='aio-loop', daemon=True).start()
+                    self._loop, self._pid = loop, os.getpid()
+        return self._loop
+
+    def run(self, coro, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+
+_loop_thread = EventLoopThread()
+
+
+def run(coro, timeout=None):
+    return _loop_thread.run(coro, timeout)
+
+
+def register_async(app):
+    """Run ``async def`` views and decorated methods (e.g. jwt_required) on the shared loop."""
+    def async_to_sync(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return run(func(*args, **kwargs))
+        return wrapper
+
+    app.async_to_sync = async_to_sync
+
+
+class AsyncResource(Resource):
+    """A Resource whose HTTP methods may be ``async def``."""
+
+    method_decorators = [lambda method: current_app.ensure_sync(method)]
+
+
+class AsyncDatabase:
+    """asyncpg pool living on the shared loop; ``sql`` uses $1, $2... placeholders.
+
+    Connections are held only for the statement, not for the request. A
+    pool far smaller than the number of request threads can therefore keep
+    up with them. asyncpg prepares and caches each statement per
+    connection, so the queries registry's SQL can be run by name.
+    """
+
+    def __init__(self, dsn_kwargs, min_size=1, max_size=10, timeout=10.0):
+        self.dsn_kwargs = dsn_kwargs
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self._pool = None
+        self._pool_lock = None
+
+    async def pool(self):
+        if self._pool is None:
+            if self._pool_lock is None:
+                self._pool_lock = asyncio.Lock()
+            async with self._pool_lock:
+                if self._pool is None:
+                    import asyncpg  # optional dependency
+                    self._pool = await asyncpg.create_pool(min_size=self.min_size, max_size=self.max_size,
+                                                           timeout=self.timeout, **self.dsn_kwargs)
+        return self._pool
+
+    async def fetch(self, sql, *args):
+        return await (await self.pool()).fetch(sql, *args, timeout=self.timeout)
+
+    async def fetchrow(self, sql, *args):
+        return await (await self.pool()).fetchrow(sql, *args, timeout=self.timeout)
+
+    async def execute(self, sql, *args):
+        return await (await self.pool()).execute(sql, *args, timeout=self.timeout)
+
+    async def statement(self, name, *args):
+        return await self.fetch(STATEMENTS[name], *args)
+
+    def stats(self):
+        if self._pool is None:
+            return {"size": 0, "idle": 0, "max_size": self.max_size}
+        return {"size": self._pool.get_size(), "idle": self._pool.get_idle_size(), "max_size": self.max_size}
+
+
+_db = None
+
+
+def get_async_db():
+    global _db
+    # The pool belongs to the parent's loop after a fork.
+    if _db is None or _db.pid != os.getpid():
+        _db = AsyncDatabase(
+            dict(database=Config.DB_NAME, user=Config.DB_USER, password=Config.DB_PASSWORD,
+                 host=Config.DB_HOST, port=Config.DB_PORT),
+            min_size=Config.ASYNC_DB_POOL_MIN_SIZE,
+            max_size=Config.ASYNC_DB_POOL_MAX_SIZE,
+            timeout=Config.DB_POOL_TIMEOUT,
+        )
+    return _db
+
+
+async def send_mail(msg):
+    """Send a Flask-Mail Message with aiosmtplib, using the app's MAIL_* settings."""
+    import aiosmtplib  # optional dependency
+
+    config = current_app.config
+    sender = msg.sender or config.get('MAIL_DEFAULT_SENDER')
+    if isinstance(sender, tuple):
+        sender = sender[1]
+    started, outcome = time.perf_counter(), 'error'
+    try:
+        await aiosmtplib.send(
+            msg.as_bytes(),
+            sender=sender,
+            recipients=list(msg.send_to),
+            hostname=config['MAIL_SERVER'],
+            port=config['MAIL_PORT'],
+            start_tls=config.get('MAIL_USE_TLS', False),
+            use_tls=config.get('MAIL_USE_SSL', False),
+            username=config.get('MAIL_USERNAME') or None,
+            password=config.get('MAIL_PASSWORD') or None,
+            timeout=Config.ASYNC_SMTP_TIMEOUT,
+        )
+        outcome = 'sent'
+    finally:
+        if metrics.ENABLED:
+            metrics.SMTP_SECONDS.observe(time.perf_counter() - started, outcome)
@@ -10,21 +10,33 @@ from flask_cors import CORS
 from config import Config
 from models import db  # Assuming you have a models module where your SQLAlchemy db instance is defined
 from routes import initialize_routes
-from utils import register_socketio_events, setup_logging
+from aio import register_async
+from campaigns import register_campaign_commands
+from invoice_totals import register_commands
+from metrics import register_metrics
+from log_pipeline import setup_logging
+from utils import register_db_session, register_socketio_events
+from mailer import MailDispatcher
+from revocation import get_blocklist
+from chat_bus import message_queue_options
 #from OpenSSL import SSL
 
 load_dotenv()  # Load environment variables from .env file
 
 mail = Mail()
+mail_dispatcher = MailDispatcher()
 jwt = JWTManager()
 api = Api(version='1.0', title='Python backend API', description='Sautis API for frontend React')
 socketio = SocketIO(cors_allowed_origins="*")
 migrate = Migrate()
 
+@jwt.token_in_blocklist_loader
+def check_if_token_revoked(jwt_header, jwt_payload):
+    return get_blocklist().is_revoked(jwt_payload['jti'])
+
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
-    app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(__file__), 'UPLOAD_FOLDER')
     app.config['logs'] = os.path.join(os.path.dirname(__file__), 'logs')
     app.config['DEBUG'] = False  # Enable debug mode
     app.config['SECRET_KEY'] = '825-647-297'
@@ -41,19 +53,29 @@ def create_app():
     CORS(app)  # Enable CORS for all routes
 
     mail.init_app(app)
+    mail_dispatcher.init_app(app)
     jwt.init_app(app)
     api.init_app(app)
-    socketio.init_app(app, ssl_context='adhoc')  # Use 'adhoc' for development, replace with app.ssl_context for production
+    socketio.init_app(app, ssl_context='adhoc',  # Use 'adhoc' for development, replace with app.ssl_context for production
+                      **message_queue_options(app.config['SOCKETIO_MESSAGE_QUEUE'], app.config['SOCKETIO_CHANNEL']))
     db.init_app(app)
     migrate.init_app(app, db)
 
     # Pass app and mail to initialize_routes
     initialize_routes(api, app, mail)
     register_socketio_events(socketio)
+    register_metrics(app)
+    register_async(app)
+    register_commands(app)
+    register_campaign_commands(app)
 
     # Set up logging
     setup_logging(app)
 
+    # Registered last so its after_request hook runs first: a failed commit turns the
+    # response into a 500 before the request id and metrics hooks see it.
+    register_db_session(app)
+
     return app
 
 # Ensure the app is created
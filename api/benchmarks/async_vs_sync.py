@@ -0,0 +1,164 @@
+"""Side-by-side benchmark of the sync routes and their ASYNC_MODE twins.
+
+Runs each endpoint pair from suite.py's harness against the same seeded
+database: once through /api (a psycopg2 connection held per request) and
+once through /api/async (asyncpg on the shared loop). Both pools get
+--pool-size connections. The interesting regime is --concurrency well
+above that: the sync routes queue for a connection while the async ones
+multiplex their statements. With --inline-mail, logins send their
+confirmation mail inside the request (smtplib vs aiosmtplib) instead of
+handing it to the mail queue.
+
+    DB_USER=postgres DB_PASSWORD=secret python benchmarks/async_vs_sync.py --concurrency 64 --pool-size 10
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import seed  # noqa: E402
+import suite  # noqa: E402
+
+
+def _async_login(w):
+    return w.client.post('/api/async/auth/login', json={'emailOrPhone': w.user(), 'password': seed.BENCH_PASSWORD})
+
+
+def _auth(w):
+    return {'Authorization': f"Bearer {w.data['token']}"}
+
+
+def _userinfo(w):
+    return w.client.get('/api/userinfo', headers=_auth(w))
+
+
+def _async_userinfo(w):
+    return w.client.get('/api/async/userinfo', headers=_auth(w))
+
+
+def _async_blog_detail(w):
+    return w.client.get(f'/api/async/blog/{w.title()}')
+
+
+def _async_invoice_get(w):
+    return w.client.get(f'/api/async/get_invoice/{w.invoice_id()}')
+
+
+suite.SCENARIOS.update({
+    'userinfo': (_userinfo, {200}),
+    'async_login': (_async_login, {200}),
+    'async_userinfo': (_async_userinfo, {200}),
+    'async_blog_detail': (_async_blog_detail, {200}),
+    'async_invoice_get': (_async_invoice_get, {200}),
+})
+
+# sync scenario -> its async twin
+PAIRS = {
+    'invoice_get': 'async_invoice_get',
+    'userinfo': 'async_userinfo',
+    'blog_detail': 'async_blog_detail',
+    'login': 'async_login',
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--dbname', default='sautis_bench',
+                        help='benchmark database; created if missing and overwritten by seeding')
+    parser.add_argument('--pairs', nargs='+', choices=sorted(PAIRS), default=list(PAIRS))
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--pool-size', type=int, default=10, help='connections in each of the two pools')
+    parser.add_argument('--duration', type=float, default=20, help='measured seconds per scenario')
+    parser.add_argument('--warmup', type=float, default=3, help='unmeasured seconds before each scenario')
+    parser.add_argument('--inline-mail', action='store_true', help='send login mail inside the request')
+    parser.add_argument('--output', help='write the report here instead of stdout')
+    seed.add_arguments(parser)
+    args = parser.parse_args()
+    if 'bench' not in args.dbname:
+        parser.error("--dbname must contain 'bench'; seeding deletes and truncates data")
+
+    suite.configure_environment(args, suite._free_port())
+    os.environ.update({
+        'ASYNC_MODE': 'true',
+        'DB_POOL_MAX_SIZE': str(args.pool_size),
+        'ASYNC_DB_POOL_MAX_SIZE': str(args.pool_size),
+        'MAIL_QUEUE_ENABLED': 'false' if args.inline_mail else 'true',
+    })
+    import aio
+    if not aio.available():
+        sys.exit('asyncpg and aiosmtplib must be installed: pip install -r requirements-async.txt')
+    from mailer import LocalSMTPServer
+    smtp = LocalSMTPServer(port=int(os.environ['MAIL_PORT'])).start()
+    suite.ensure_database(args.dbname)
+
+    from config import Config
+    volumes = {'users': args.users, 'blogs': args.blogs, 'invoices': args.invoices,
+               'messages': args.messages, 'random_seed': args.random_seed}
+    conn = seed.connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('bench_meta')")
+            current = seed.seeded_volumes(cur) if cur.fetchone()[0] else None
+        conn.rollback()
+        if current != volumes:
+            print(f'Seeding {args.dbname}: {volumes}', file=sys.stderr)
+            seed.seed(conn, args.users, args.blogs, args.invoices, args.messages,
+                      rounds=Config.BCRYPT_ROUNDS, random_seed=args.random_seed)
+        with conn.cursor() as cur:
+            cur.execute("SELECT title FROM blog ORDER BY random() LIMIT 2000")
+            titles = [row[0] for row in cur.fetchall()]
+            cur.execute("SELECT coalesce(max(id), 0) FROM invoices")
+            max_invoice = cur.fetchone()[0]
+        conn.rollback()
+    finally:
+        conn.close()
+
+    from app import app, socketio
+
+    response = app.test_client().post('/api/auth/login', json={'emailOrPhone': seed.user_email(0),
+                                                               'password': seed.BENCH_PASSWORD})
+    data = {'users': args.users, 'invoices': max_invoice, 'titles': titles,
+            'token': response.get_json()['access_token']}
+    report = {
+        'meta': {
+            'started_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'revision': suite._git_revision(),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'concurrency': args.concurrency,
+            'pool_size': args.pool_size,
+            'duration_s': args.duration,
+            'warmup_s': args.warmup,
+            'inline_mail': args.inline_mail,
+            'volumes': volumes,
+        },
+        'pairs': {},
+    }
+    for sync_name in args.pairs:
+        results = {}
+        for mode, name in (('sync', sync_name), ('async', PAIRS[sync_name])):
+            print(f'Running {name}', file=sys.stderr)
+            results[mode] = suite.run_scenario(name, app, socketio, data, args.concurrency,
+                                               args.duration, args.warmup)
+        results['throughput_change_pct'] = suite._change(results['sync']['throughput_rps'],
+                                                         results['async']['throughput_rps'])
+        results['p95_change_pct'] = suite._change(results['sync']['latency_ms']['p95'],
+                                                  results['async']['latency_ms']['p95'])
+        report['pairs'][sync_name] = results
+    report['meta']['async_pool'] = aio.get_async_db().stats()
+    smtp.stop()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
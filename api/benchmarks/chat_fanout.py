@@ -0,0 +1,134 @@
+"""Chat fan-out benchmark.
+
+Simulates Socket.IO clients spread over one or more server nodes that share
+a LocalPubSubManager channel, and measures how many messages per second the
+nodes can fan out and how long it takes for a message to reach its last
+recipient. Packets are captured at the Engine.IO send boundary, so the
+numbers cover room lookup, encoding and cross-node delivery but not sockets.
+
+    python benchmarks/chat_fanout.py --clients 1000 10000 --nodes 1 4
+"""
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+
+import socketio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_bus import LOBBY_ROOM, LocalPubSubManager, conversation_room  # noqa: E402
+
+NAMESPACE = '/'
+
+
+class Node:
+    """A Socket.IO server whose outgoing packets are counted instead of sent."""
+
+    def __init__(self, channel, recorder):
+        self.manager = LocalPubSubManager(channel=channel)
+        self.server = socketio.Server(async_mode='threading', client_manager=self.manager)
+        self.server._send_eio_packet = recorder.deliver
+        self.server.manager_initialized = True
+        self.manager.initialize()
+        self._eio_ids = itertools.count()
+
+    def connect(self, room):
+        sid = self.manager.connect(f'eio-{next(self._eio_ids)}', NAMESPACE)
+        self.manager.enter_room(sid, NAMESPACE, room)
+        return sid
+
+    def close(self):
+        self.manager.close()
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._done = threading.Condition(self._lock)
+        self.latencies = []
+        self.deliveries = 0
+
+    def expect(self, seq, recipients):
+        with self._lock:
+            self._pending[seq] = [recipients, time.perf_counter()]
+
+    def deliver(self, eio_sid, pkt):
+        seq = getattr(pkt, 'bench_seq', None)
+        if seq is None:
+            # One packet object is shared by every recipient on a node.
+            seq = pkt.bench_seq = json.loads(pkt.data[1:])[1]['seq']
+        with self._lock:
+            self.deliveries += 1
+            entry = self._pending[seq]
+            entry[0] -= 1
+            if entry[0] == 0:
+                self.latencies.append(time.perf_counter() - entry[1])
+                del self._pending[seq]
+                self._done.notify_all()
+
+    def wait(self, timeout):
+        with self._lock:
+            return self._done.wait_for(lambda: not self._pending, timeout)
+
+
+def run(clients, nodes, messages, room_size):
+    recorder = Recorder()
+    channel = f'bench-{uuid.uuid4().hex}'
+    cluster = [Node(channel, recorder) for _ in range(nodes)]
+    rooms = {}
+    for i in range(clients):
+        room = conversation_room(i // room_size) if room_size else LOBBY_ROOM
+        cluster[i % nodes].connect(room)
+        rooms[room] = rooms.get(room, 0) + 1
+    targets = list(rooms.items())
+
+    sender = cluster[0].server
+    started = time.perf_counter()
+    for seq in range(messages):
+        room, recipients = targets[seq % len(targets)]
+        recorder.expect(seq, recipients)
+        sender.emit('message', {'seq': seq, 'email': 'bench@example.com', 'message': 'x' * 64},
+                    to=room, namespace=NAMESPACE)
+    completed = recorder.wait(timeout=120)
+    elapsed = time.perf_counter() - started
+    for node in cluster:
+        node.close()
+
+    latencies = sorted(recorder.latencies) or [0.0]
+    return {
+        'clients': clients,
+        'nodes': nodes,
+        'room_size': room_size or clients,
+        'messages': messages,
+        'completed': completed,
+        'deliveries': recorder.deliveries,
+        'messages_per_sec': round(len(recorder.latencies) / elapsed, 1),
+        'deliveries_per_sec': round(recorder.deliveries / elapsed),
+        'fanout_ms_p50': round(statistics.median(latencies) * 1000, 3),
+        'fanout_ms_p99': round(latencies[int((len(latencies) - 1) * 0.99)] * 1000, 3),
+        'fanout_ms_max': round(latencies[-1] * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--clients', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--nodes', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--room-size', type=int, nargs='+', default=[0, 50],
+                        help='clients per conversation; 0 puts everyone in the lobby')
+    args = parser.parse_args()
+
+    for clients, nodes, room_size in itertools.product(args.clients, args.nodes, args.room_size):
+        print(json.dumps(run(clients, nodes, args.messages, room_size)), flush=True)
+
+
+if __name__ == '__main__':
+    main()
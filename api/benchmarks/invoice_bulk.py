@@ -0,0 +1,104 @@
+"""Rows/sec of the bulk invoice endpoints against one-invoice-per-request POSTs.
+
+Generates --rows invoices and imports them through /api/import/invoices as
+CSV and as NDJSON, then exports the table through /api/export/invoices as
+CSV. For comparison, it also POSTs --single-rows of them one at a time to
+/api/list_invoices. All rows land in the benchmark database's invoices
+table (see seed.py).
+
+    DB_USER=postgres DB_PASSWORD=secret python benchmarks/invoice_bulk.py --rows 100000
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import seed  # noqa: E402
+import suite  # noqa: E402
+
+
+def _invoices(rng, count):
+    return [{'name': name, 'amount': amount, 'due_date': due_date.isoformat(), 'status': status}
+            for name, amount, due_date, status, _ in seed._invoices(rng, count)]
+
+
+def _csv(invoices):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=['name', 'amount', 'due_date', 'status'])
+    writer.writeheader()
+    writer.writerows(invoices)
+    return buffer.getvalue().encode()
+
+
+def _ndjson(invoices):
+    return ''.join(json.dumps(invoice) + '\n' for invoice in invoices).encode()
+
+
+def _result(rows, elapsed, response):
+    return {'rows': rows, 'status': response.status_code, 'seconds': round(elapsed, 3),
+            'rows_per_sec': round(rows / elapsed) if elapsed else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--dbname', default='sautis_bench',
+                        help='benchmark database; created if missing')
+    parser.add_argument('--rows', type=int, default=100000, help='invoices per bulk import')
+    parser.add_argument('--single-rows', type=int, default=2000, help='invoices POSTed one per request')
+    parser.add_argument('--random-seed', type=int, default=42)
+    args = parser.parse_args()
+    if 'bench' not in args.dbname:
+        parser.error("--dbname must contain 'bench'")
+
+    args.concurrency = 1
+    suite.configure_environment(args, suite._free_port())
+    suite.ensure_database(args.dbname)
+    conn = seed.connect()
+    try:
+        with conn.cursor() as cur:
+            for statement in seed.SCHEMA:
+                cur.execute(statement)
+        conn.commit()
+    finally:
+        conn.close()
+
+    from flask_jwt_extended import create_access_token
+    from app import app
+
+    client = app.test_client()
+    with app.app_context():
+        headers = {'Authorization': f"Bearer {create_access_token(identity='invoice-bulk-bench')}"}
+    invoices = _invoices(random.Random(args.random_seed), args.rows)
+    report = {'rows': args.rows}
+
+    for fmt, body, mimetype in (('csv', _csv(invoices), 'text/csv'),
+                                ('ndjson', _ndjson(invoices), 'application/x-ndjson')):
+        print(f'Importing {args.rows} rows as {fmt}', file=sys.stderr)
+        started = time.perf_counter()
+        response = client.post('/api/import/invoices', data=body, headers={**headers, 'Content-Type': mimetype})
+        report[f'import_{fmt}'] = _result(args.rows, time.perf_counter() - started, response)
+        report[f'import_{fmt}']['server'] = response.get_json()
+
+    print(f'Posting {args.single_rows} rows one at a time', file=sys.stderr)
+    started = time.perf_counter()
+    for invoice in invoices[:args.single_rows]:
+        response = client.post('/api/list_invoices', json=invoice)
+    report['single_post'] = _result(args.single_rows, time.perf_counter() - started, response)
+
+    print('Exporting as csv', file=sys.stderr)
+    started = time.perf_counter()
+    response = client.get('/api/export/invoices', query_string={'format': 'csv'}, headers=headers)
+    exported = max(response.get_data().count(b'\n') - 1, 0)  # minus the header
+    report['export_csv'] = _result(exported, time.perf_counter() - started, response)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+"""Schema and bulk data for the benchmark database.
+
+Creates the tables the app reads (the ones initialize_db() does not) with
+the same definitions as production, then fills them with deterministic,
+realistically sized data through COPY. Every seeded user shares one
+password, BENCH_PASSWORD, so the hash is computed once.
+
+    python benchmarks/seed.py --users 100000 --blogs 50000 --messages 1000000
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import random
+import sys
+import time
+import uuid
+
+import bcrypt
+import psycopg2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_PASSWORD = 'bench-password'
+BATCH_ROWS = 50000
+
+WORDS = (
+    'flask postgres python react cache index query latency socket chat invoice blog search token '
+    'deploy docker queue worker thread pool mail smtp upload thumbnail stream cursor page view '
+    'budget market health travel music garden coffee recipe startup design privacy security cloud'
+).split()
+AUTHORS = ['Amina Njeri', 'Brian Otieno', 'Chen Wei', 'Dana Levi', 'Emeka Obi', 'Fatima Zahra',
+           'Grace Wanjiru', 'Hiro Tanaka', 'Ivan Petrov', 'Jane Smith']
+STATUSES = ['pending', 'paid', 'overdue', 'cancelled']
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS blog (
+        id SERIAL PRIMARY KEY,
+        title VARCHAR(255) NOT NULL,
+        image VARCHAR(255),
+        author VARCHAR(100) NOT NULL,
+        date DATE NOT NULL,
+        intro TEXT NOT NULL,
+        content_section TEXT NOT NULL,
+        list TEXT[],
+        conclusion TEXT,
+        views INTEGER DEFAULT 0,
+        likes INTEGER DEFAULT 0,
+        errors INTEGER DEFAULT 0,
+        dislikes INTEGER DEFAULT 0,
+        comments INTEGER DEFAULT 0,
+        search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(author, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(intro, '')), 'C')
+        ) STORED
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS blog_search_vector_idx ON blog USING GIN (search_vector)",
+    """
+    CREATE TABLE IF NOT EXISTS invoices (
+        id SERIAL PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        amount NUMERIC(10, 2) NOT NULL,
+        due_date DATE NOT NULL,
+        status VARCHAR(50) DEFAULT 'pending' NOT NULL,
+        user_id UUID
+    )
+    """,
+    "ALTER TABLE invoices ADD COLUMN IF NOT EXISTS user_id UUID",  # databases seeded before the column existed
+    "ALTER TABLE invoices ADD COLUMN IF NOT EXISTS paid_at TIMESTAMPTZ",
+    "CREATE INDEX IF NOT EXISTS invoices_user_id_idx ON invoices (user_id)",
+    """
+    CREATE TABLE IF NOT EXISTS invoice_totals (
+        status VARCHAR(50) NOT NULL,
+        month DATE NOT NULL,
+        invoice_count BIGINT DEFAULT 0 NOT NULL,
+        amount NUMERIC(16, 2) DEFAULT 0 NOT NULL,
+        PRIMARY KEY (status, month)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS invoice_status_totals (
+        status VARCHAR(50) PRIMARY KEY,
+        invoice_count BIGINT DEFAULT 0 NOT NULL,
+        amount NUMERIC(16, 2) DEFAULT 0 NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS invoice_paid_totals (
+        month DATE PRIMARY KEY,
+        invoice_count BIGINT DEFAULT 0 NOT NULL,
+        amount NUMERIC(16, 2) DEFAULT 0 NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS invoice_open_totals (
+        due_date DATE PRIMARY KEY,
+        invoice_count BIGINT DEFAULT 0 NOT NULL,
+        amount NUMERIC(16, 2) DEFAULT 0 NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS messages (
+        id SERIAL PRIMARY KEY,
+        uuid UUID NOT NULL UNIQUE,
+        email VARCHAR(255) NOT NULL,
+        content TEXT NOT NULL,
+        timestamp TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS bench_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )
+    """,
+]
+
+
+def connect(dbname=None):
+    from config import Config
+    return psycopg2.connect(dbname=dbname or Config.DB_NAME, user=Config.DB_USER, password=Config.DB_PASSWORD,
+                            host=Config.DB_HOST, port=Config.DB_PORT)
+
+
+def user_email(i):
+    return f'user{i}@bench.example'
+
+
+def user_phone(i):
+    return f'07{i:08d}'
+
+
+def blog_title(i):
+    return f'Bench post {i}'
+
+
+def _copy_field(value):
+    if value is None:
+        return r'\N'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+
+def _copy(cur, table, columns, rows):
+    """COPY ``rows`` into ``table`` in BATCH_ROWS slices, so memory stays flat."""
+    buffer, count = io.StringIO(), 0
+    for row in rows:
+        buffer.write('\t'.join(_copy_field(value) for value in row) + '\n')
+        count += 1
+        if count % BATCH_ROWS == 0:
+            buffer.seek(0)
+            cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+            buffer = io.StringIO()
+    if buffer.tell():
+        buffer.seek(0)
+        cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+    return count
+
+
+def _sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def _users(rng, count, password_hash, user_ids):
+    for i in range(count):
+        user_id = uuid.UUID(int=rng.getrandbits(128), version=4)
+        user_ids.append(user_id)
+        yield (user_id, f'Bench User {i}', user_email(i),
+               user_phone(i), password_hash, uuid.UUID(int=rng.getrandbits(128), version=4), '1')
+
+
+def _blogs(rng, count):
+    start = datetime.date(2015, 1, 1)
+    for i in range(count):
+        yield (blog_title(i) + ': ' + ' '.join(rng.sample(WORDS, 3)), f'/images/bench/{i % 500}.jpg',
+               rng.choice(AUTHORS), start + datetime.timedelta(days=rng.randrange(3650)),
+               _sentence(rng, 25), ' '.join(_sentence(rng, 20) for _ in range(15)),
+               '{' + ','.join(f'"{_sentence(rng, 5)}"' for _ in range(4)) + '}',
+               _sentence(rng, 30), rng.randrange(10000))
+
+
+def _invoices(rng, count, user_ids=()):
+    start = datetime.date(2024, 1, 1)
+    for i in range(count):
+        yield (f'INV-{i:07d}', f'{rng.uniform(5, 5000):.2f}',
+               start + datetime.timedelta(days=rng.randrange(730)), rng.choice(STATUSES),
+               rng.choice(user_ids) if user_ids else None)
+
+
+def _messages(rng, count, users):
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    for i in range(count):
+        yield (uuid.UUID(int=rng.getrandbits(128), version=4), user_email(rng.randrange(max(users, 1))),
+               _sentence(rng, rng.randrange(3, 30)), start + datetime.timedelta(seconds=i * 7))
+
+
+def seeded_volumes(cur):
+    cur.execute("SELECT value FROM bench_meta WHERE key = 'volumes'")
+    row = cur.fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def seed(conn, users, blogs, invoices, messages, rounds=12, random_seed=42):
+    """Replace the benchmark data with freshly generated rows; returns per-table timings."""
+    from invoice_totals import rebuild
+    from utils import initialize_db
+
+    with conn.cursor() as cur:
+        for statement in SCHEMA:
+            cur.execute(statement)
+    conn.commit()
+    initialize_db()
+    with conn.cursor() as cur:
+        cur.execute("ALTER TABLE userinfo1 ADD COLUMN IF NOT EXISTS invoice_balance NUMERIC(14, 2) DEFAULT 0 NOT NULL")
+
+    rng = random.Random(random_seed)
+    password_hash = bcrypt.hashpw(BENCH_PASSWORD.encode(), bcrypt.gensalt(rounds)).decode()
+    timings, user_ids = {}, []
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM userinfo1 WHERE email LIKE %s", ('%@bench.example',))
+        cur.execute("TRUNCATE blog, invoices, messages RESTART IDENTITY")
+        tables = [
+            ('userinfo1', ('id', 'name', 'email', 'phone_number', 'password', 'token', 'verified'),
+             _users(rng, users, password_hash, user_ids)),
+            ('blog', ('title', 'image', 'author', 'date', 'intro', 'content_section', 'list', 'conclusion', 'views'),
+             _blogs(rng, blogs)),
+            ('invoices', ('name', 'amount', 'due_date', 'status', 'user_id'), _invoices(rng, invoices, user_ids)),
+            ('messages', ('uuid', 'email', 'content', 'timestamp'), _messages(rng, messages, users)),
+        ]
+        for table, columns, rows in tables:
+            started = time.perf_counter()
+            count = _copy(cur, table, columns, rows)
+            elapsed = time.perf_counter() - started
+            timings[table] = {'rows': count, 'seconds': round(elapsed, 2),
+                              'rows_per_sec': round(count / elapsed) if elapsed else None}
+        rebuild(cur)  # invoice aggregates and balances for the copied invoices
+        volumes = {'users': users, 'blogs': blogs, 'invoices': invoices, 'messages': messages,
+                   'random_seed': random_seed}
+        cur.execute("""
+            INSERT INTO bench_meta (key, value) VALUES ('volumes', %s)
+            ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
+        """, (json.dumps(volumes),))
+    conn.commit()
+    # Fresh statistics, so the first scenario is not planned against empty tables.
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("VACUUM ANALYZE")
+    conn.autocommit = False
+    return timings
+
+
+def add_arguments(parser):
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--blogs', type=int, default=50000)
+    parser.add_argument('--invoices', type=int, default=100000)
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--random-seed', type=int, default=42)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    from config import Config
+
+    conn = connect()
+    try:
+        timings = seed(conn, args.users, args.blogs, args.invoices, args.messages,
+                       rounds=Config.BCRYPT_ROUNDS, random_seed=args.random_seed)
+    finally:
+        conn.close()
+    print(json.dumps(timings))
+
+
+if __name__ == '__main__':
+    main()
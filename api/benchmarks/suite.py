@@ -0,0 +1,380 @@
+"""Load-test suite for the API against a local Postgres.
+
+Boots create_app() on a dedicated benchmark database with mail delivered
+to an in-process LocalSMTPServer. It seeds the database (see seed.py)
+unless the requested volumes are already there. Then it drives each
+scenario from --concurrency threads for --duration seconds through the
+Flask and Socket.IO test clients and prints a JSON report. The report
+covers the full app stack (routing, pool, SQL, bcrypt, mail queue) but not
+the WSGI server or network.
+
+    DB_USER=postgres DB_PASSWORD=secret python benchmarks/suite.py --output baseline.json
+    python benchmarks/suite.py --scenarios login blog_list --compare baseline.json
+"""
+import argparse
+import collections
+import datetime
+import itertools
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from psycopg2 import sql
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import seed  # noqa: E402
+
+WRITE_SCENARIOS = ('invoice_create', 'invoice_update', 'invoice_delete', 'blog_view', 'chat_message')
+
+
+class Worker:
+    """One simulated client: a Flask test client plus a lazily connected Socket.IO client."""
+
+    def __init__(self, app, socketio, data, rng):
+        self.app = app
+        self.socketio = socketio
+        self.data = data
+        self.rng = rng
+        self.client = app.test_client()
+        self._socket = None
+
+    @property
+    def socket(self):
+        if self._socket is None:
+            self._socket = self.socketio.test_client(self.app, flask_test_client=self.client)
+            self._socket.get_received()
+        return self._socket
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.disconnect()
+
+    def user(self):
+        return seed.user_email(self.rng.randrange(self.data['users']))
+
+    def title(self):
+        return self.rng.choice(self.data['titles'])
+
+    def invoice_id(self):
+        return self.rng.randrange(1, self.data['invoices'] + 1)
+
+
+def _login(w):
+    return w.client.post('/api/auth/login', json={'emailOrPhone': w.user(), 'password': seed.BENCH_PASSWORD})
+
+
+def _blog_list(w):
+    response = w.client.get('/api/blog', query_string={'limit': 20})
+    # Follow the cursor a few pages deep, like a reader scrolling.
+    for _ in range(w.rng.randrange(3)):
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor or response.status_code != 200:
+            break
+        response = w.client.get('/api/blog', query_string={'limit': 20, 'cursor': cursor})
+    return response
+
+
+def _blog_search(w):
+    terms = w.rng.sample(seed.WORDS, w.rng.randrange(1, 3))
+    terms[-1] = terms[-1][:w.rng.randrange(3, len(terms[-1]) + 1)]  # a prefix still being typed
+    return w.client.get('/api/blog', query_string={'query': ' '.join(terms), 'limit': 10})
+
+
+def _blog_detail(w):
+    return w.client.get(f'/api/blog/{w.title()}')
+
+
+def _blog_view(w):
+    return w.client.put(f'/api/blog/views/{w.title()}')
+
+
+def _invoice_list(w):
+    return w.client.get('/api/list_invoices', query_string={'limit': 50})
+
+
+def _invoice_get(w):
+    return w.client.get(f'/api/get_invoice/{w.invoice_id()}')
+
+
+def _invoice_body(w):
+    return {'name': f'INV-bench-{w.rng.randrange(10 ** 6)}', 'amount': round(w.rng.uniform(5, 5000), 2),
+            'due_date': '2026-12-31', 'status': w.rng.choice(seed.STATUSES)}
+
+
+def _invoice_create(w):
+    return w.client.post('/api/list_invoices', json=_invoice_body(w))
+
+
+def _invoice_update(w):
+    return w.client.put(f'/api/get_invoice/{w.invoice_id()}', json=_invoice_body(w))
+
+
+def _invoice_delete(w):
+    # Deletes walk down from the highest seeded id, so reads and updates mostly still hit rows.
+    return w.client.delete(f"/api/get_invoice/{next(w.data['delete_ids'])}")
+
+
+def _chat_message(w):
+    client = w.socket
+    client.emit('message', {'email': w.user(), 'message': f'bench {w.rng.random()}'})
+    delivered = any(packet['name'] == 'message' for packet in client.get_received())
+    return 200 if delivered else 500
+
+
+# name -> (call, accepted status codes)
+SCENARIOS = {
+    'login': (_login, {200}),
+    'blog_list': (_blog_list, {200, 304}),
+    'blog_search': (_blog_search, {200}),
+    'blog_detail': (_blog_detail, {200, 304}),
+    'blog_view': (_blog_view, {200}),
+    'invoice_list': (_invoice_list, {200}),
+    'invoice_get': (_invoice_get, {200}),
+    'invoice_create': (_invoice_create, {201}),
+    'invoice_update': (_invoice_update, {200}),
+    'invoice_delete': (_invoice_delete, {200}),
+    'chat_message': (_chat_message, {200}),
+}
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_scenario(name, app, socketio, data, concurrency, duration, warmup):
+    call, accepted = SCENARIOS[name]
+    statuses = collections.Counter()
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    start = threading.Barrier(concurrency + 1)
+    timing = {}
+
+    def loop(index):
+        worker = Worker(app, socketio, data, random.Random(f'{name}-{index}'))
+        local_latencies, local_statuses, local_errors = [], collections.Counter(), []
+        start.wait()
+        try:
+            while True:
+                began = time.perf_counter()
+                if began >= timing['stop']:
+                    break
+                try:
+                    result = call(worker)
+                    status = result if isinstance(result, int) else result.status_code
+                except Exception as error:
+                    status = 'exception'
+                    if len(local_errors) < 5:
+                        local_errors.append(repr(error))
+                if began >= timing['measure']:
+                    local_latencies.append(time.perf_counter() - began)
+                    local_statuses[status] += 1
+        finally:
+            worker.close()
+        with lock:
+            latencies.extend(local_latencies)
+            statuses.update(local_statuses)
+            errors.extend(local_errors)
+
+    threads = [threading.Thread(target=loop, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    now = time.perf_counter()
+    timing['measure'] = now + warmup
+    timing['stop'] = now + warmup + duration
+    start.wait()
+    for thread in threads:
+        thread.join()
+
+    ordered = sorted(latencies) or [0.0]
+    ok = sum(count for status, count in statuses.items() if status in accepted)
+    return {
+        'requests': len(latencies),
+        'ok': ok,
+        'failed': len(latencies) - ok,
+        'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        'throughput_rps': round(len(latencies) / duration, 1),
+        'latency_ms': {
+            'mean': round(statistics.fmean(ordered) * 1000, 3),
+            'p50': round(_percentile(ordered, 0.50) * 1000, 3),
+            'p90': round(_percentile(ordered, 0.90) * 1000, 3),
+            'p95': round(_percentile(ordered, 0.95) * 1000, 3),
+            'p99': round(_percentile(ordered, 0.99) * 1000, 3),
+            'max': round(ordered[-1] * 1000, 3),
+        },
+        'sample_errors': errors[:5],
+    }
+
+
+def compare(report, baseline, threshold):
+    """Per-scenario changes against ``baseline``; a scenario regresses when throughput
+    drops or p95 latency grows by more than ``threshold`` percent."""
+    results = {}
+    for name, current in report['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before:
+            continue
+        rps_change = _change(before['throughput_rps'], current['throughput_rps'])
+        p95_change = _change(before['latency_ms']['p95'], current['latency_ms']['p95'])
+        results[name] = {
+            'throughput_change_pct': rps_change,
+            'p95_change_pct': p95_change,
+            'regressed': (rps_change is not None and rps_change < -threshold)
+                         or (p95_change is not None and p95_change > threshold),
+        }
+    return results
+
+
+def _change(before, after):
+    return round((after - before) / before * 100, 1) if before else None
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ensure_database(dbname):
+    conn = seed.connect('postgres')
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (dbname,))
+            if cur.fetchone() is None:
+                cur.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(dbname)))
+    finally:
+        conn.close()
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def configure_environment(args, smtp_port):
+    # Config reads the environment at import time, so this runs before the app is imported.
+    os.environ.update({
+        'DB_NAME': args.dbname,
+        'MAIL_SERVER': '127.0.0.1',
+        'MAIL_PORT': str(smtp_port),
+        'MAIL_USE_TLS': 'false',
+        'GMAIL_PASS': '',
+        'DB_POOL_MAX_SIZE': str(max(args.concurrency + 2, 10)),
+        'RATELIMIT_ENABLED': 'false',  # every simulated user shares one address
+    })
+    os.environ.pop('SOCKETIO_MESSAGE_QUEUE', None)  # the Socket.IO test client needs a local manager
+    os.environ.setdefault('GMAIL_USER', 'bench@bench.example')
+    os.environ.setdefault('DB_HOST', 'localhost')
+    os.environ.setdefault('DB_PORT', '5432')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--dbname', default='sautis_bench',
+                        help='benchmark database; created if missing and overwritten by seeding')
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20, help='measured seconds per scenario')
+    parser.add_argument('--warmup', type=float, default=3, help='unmeasured seconds before each scenario')
+    parser.add_argument('--reseed', action='store_true', help='seed even if the volumes already match')
+    parser.add_argument('--output', help='write the report here instead of stdout')
+    parser.add_argument('--compare', help='earlier report to compare against; exits 1 on a regression')
+    parser.add_argument('--threshold', type=float, default=10, help='allowed regression, in percent')
+    seed.add_arguments(parser)
+    args = parser.parse_args()
+    if 'bench' not in args.dbname:
+        parser.error("--dbname must contain 'bench'; seeding deletes and truncates data")
+
+    configure_environment(args, _free_port())
+    from mailer import LocalSMTPServer
+    smtp = LocalSMTPServer(port=int(os.environ['MAIL_PORT'])).start()
+    ensure_database(args.dbname)
+
+    from config import Config
+    volumes = {'users': args.users, 'blogs': args.blogs, 'invoices': args.invoices,
+               'messages': args.messages, 'random_seed': args.random_seed}
+    conn = seed.connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('bench_meta')")
+            current = seed.seeded_volumes(cur) if cur.fetchone()[0] else None
+        conn.rollback()
+        seeding = None
+        if args.reseed or current != volumes:
+            print(f'Seeding {args.dbname}: {volumes}', file=sys.stderr)
+            seeding = seed.seed(conn, args.users, args.blogs, args.invoices, args.messages,
+                                rounds=Config.BCRYPT_ROUNDS, random_seed=args.random_seed)
+        with conn.cursor() as cur:
+            cur.execute("SELECT title FROM blog ORDER BY random() LIMIT 2000")
+            titles = [row[0] for row in cur.fetchall()]
+            cur.execute("SELECT coalesce(max(id), 0) FROM invoices")
+            max_invoice = cur.fetchone()[0]
+        conn.rollback()
+    finally:
+        conn.close()
+
+    from app import app, socketio
+    from chat_store import get_message_buffer
+    from view_counter import get_view_counter
+
+    data = {'users': args.users, 'invoices': max_invoice, 'titles': titles,
+            'delete_ids': itertools.count(max_invoice, -1)}
+    # Writes go last so the read scenarios see the seeded data set.
+    order = sorted(args.scenarios, key=lambda name: name in WRITE_SCENARIOS)
+    report = {
+        'meta': {
+            'started_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'warmup_s': args.warmup,
+            'volumes': volumes,
+            'seeding': seeding,
+            'config': {key: getattr(Config, key) for key in (
+                'DB_POOL_MAX_SIZE', 'BCRYPT_ROUNDS', 'BCRYPT_WORKERS', 'CACHE_BACKEND', 'SEARCH_BACKEND',
+                'MAIL_QUEUE_ENABLED', 'PREPARED_STATEMENTS', 'METRICS_ENABLED')},
+        },
+        'scenarios': {},
+    }
+    for name in order:
+        print(f'Running {name}', file=sys.stderr)
+        report['scenarios'][name] = run_scenario(name, app, socketio, data, args.concurrency,
+                                                 args.duration, args.warmup)
+    get_view_counter().flush()
+    get_message_buffer().flush()
+    report['meta']['mails_delivered'] = len(smtp.messages)
+    smtp.stop()
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as f:
+            report['comparison'] = compare(report, json.load(f), args.threshold)
+        exit_code = int(any(result['regressed'] for result in report['comparison'].values()))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
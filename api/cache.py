@@ -0,0 +1,190 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from flask import current_app, make_response, request
+
+from config import Config
+
+
+class LocalCache:
+    """Thread-safe in-process LRU cache with per-entry TTL."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._counters = {}  # never evicted, so generations cannot silently reset
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._counters:
+                return self._counters[key]
+            item = self._data.get(key)
+            if item is None or (item[1] and item[1] < time.monotonic()):
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self._counters.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+
+class RedisCache:
+    """Cache shared between workers, backed by a Redis client (or FakeRedis)."""
+
+    def __init__(self, client, prefix='sautis:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        raw = json.dumps(value)
+        if ttl:
+            self.client.setex(self.prefix + key, int(ttl), raw)
+        else:
+            self.client.set(self.prefix + key, raw)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+
+class FakeRedis:
+    """Implements the handful of Redis commands the app uses, in memory."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        item = self._data.get(key)
+        if item is not None and item[1] and item[1] < time.monotonic():
+            del self._data[key]
+            return None
+        return item
+
+    def get(self, key):
+        with self._lock:
+            item = self._live(key)
+            return None if item is None else item[0]
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    def setex(self, key, seconds, value):
+        return self.set(key, value, ex=seconds)
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def incr(self, key, amount=1):
+        with self._lock:
+            item = self._live(key)
+            value = int(item[0]) + amount if item else amount
+            self._data[key] = (str(value), item[1] if item else None)  # Redis keeps counters as strings
+            return value
+
+    def expire(self, key, seconds):
+        with self._lock:
+            item = self._live(key)
+            if item is None:
+                return False
+            self._data[key] = (item[0], time.monotonic() + seconds)
+            return True
+
+
+def create_redis_client(url):
+    if url == 'memory://':
+        return FakeRedis()
+    import redis  # optional dependency, only needed for a shared backend
+    return redis.Redis.from_url(url)
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        if Config.CACHE_BACKEND == 'redis':
+            _cache = RedisCache(create_redis_client(Config.CACHE_REDIS_URL))
+        else:
+            _cache = LocalCache(Config.CACHE_MAX_ENTRIES)
+    return _cache
+
+
+def invalidate(namespace):
+    # Entries are keyed by a per-namespace generation; bumping it orphans them all.
+    get_cache().incr(f'{namespace}:generation')
+
+
+def cached_response(namespace, key, build, ttl=None):
+    """Serve a JSON GET from cache, answering If-None-Match with 304.
+
+    ``build`` is only called on a miss and returns ``(body, status, headers)``;
+    only 200 responses are stored.
+    """
+    cache = get_cache()
+    ttl = Config.CACHE_TTL if ttl is None else ttl
+    generation = cache.get(f'{namespace}:generation') or 0
+    cache_key = f'{namespace}:{generation}:{key}'
+
+    entry = cache.get(cache_key)
+    if entry is None:
+        body, status, headers = build()
+        if status != 200:
+            return body, status, headers
+        payload = json.dumps(body, sort_keys=True, default=str)
+        entry = {
+            'etag': hashlib.sha1(payload.encode()).hexdigest(),
+            'body': payload,
+            'headers': dict(headers or {}),
+        }
+        cache.set(cache_key, entry, ttl)
+
+    if request.if_none_match.contains(entry['etag']):
+        response = make_response('', 304)
+    else:
+        response = current_app.response_class(entry['body'], mimetype='application/json')
+    response.headers.update(entry['headers'])
+    response.set_etag(entry['etag'])
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def request_key():
+    args = sorted(request.args.items(multi=True))
+    return hashlib.sha1(urlencode(args).encode()).hexdigest()
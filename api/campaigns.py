@@ -0,0 +1,286 @@
+import json
+import logging
+import queue
+import smtplib
+import threading
+import time
+import uuid
+
+import click
+import jinja2
+from flask_mail import Message
+from markupsafe import escape
+
+from config import Config
+from mailer import _close_quietly, _send
+from ratelimit import TokenBucket
+from utils import db_connection, unsubscribe_link
+
+logger = logging.getLogger(__name__)
+
+# Stands in for the per-recipient unsubscribe URL while a template is rendered.
+_UNSUBSCRIBE_MARKER = '\x1funsubscribe\x1f'
+
+_text_env = jinja2.Environment(autoescape=False)
+_html_env = jinja2.Environment(autoescape=True)
+
+
+class CampaignError(Exception):
+    pass
+
+
+class RenderedCampaign:
+    """A campaign's templates rendered once; each recipient only gets its unsubscribe link filled in."""
+
+    def __init__(self, subject, body, html=None):
+        context = {'unsubscribe_url': _UNSUBSCRIBE_MARKER}
+        self.subject = _text_env.from_string(subject).render(context)
+        self.body = _text_env.from_string(body).render(context)
+        self.html = _html_env.from_string(html).render(context) if html else None
+
+    def message(self, email):
+        link = unsubscribe_link(email)
+        return Message(
+            subject=self.subject,
+            recipients=[email],
+            body=self.body.replace(_UNSUBSCRIBE_MARKER, link),
+            html=self.html.replace(_UNSUBSCRIBE_MARKER, str(escape(link))) if self.html else None,
+        )
+
+
+def create_campaign(cur, subject, body, html=None):
+    """Store a draft campaign; templates are Jinja and may use ``{{ unsubscribe_url }}``."""
+    try:
+        RenderedCampaign(subject, body, html)
+    except jinja2.TemplateError as e:
+        raise CampaignError(f"Invalid template: {e}")
+    campaign_id = str(uuid.uuid4())
+    cur.execute("INSERT INTO campaigns (id, subject, body, html) VALUES (%s, %s, %s, %s)",
+                (campaign_id, subject, body, html))
+    return campaign_id
+
+
+def _campaign_id(value):
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        raise CampaignError(f"Campaign {value} not found")
+
+
+def campaign_status(cur, campaign_id):
+    campaign_id = _campaign_id(campaign_id)
+    cur.execute("""
+        SELECT id, subject, status, sent, failed, last_email, created_at, started_at, finished_at
+        FROM campaigns WHERE id = %s
+    """, (campaign_id,))
+    row = cur.fetchone()
+    if row is None:
+        raise CampaignError(f"Campaign {campaign_id} not found")
+    keys = ('id', 'subject', 'status', 'sent', 'failed', 'last_email', 'created_at', 'started_at', 'finished_at')
+    return dict(zip(keys, row))
+
+
+class CampaignSender:
+    """Sends one campaign to every subscriber, resumable after a crash.
+
+    Subscribers are read in email order, ``batch_size`` at a time, each
+    page a keyset query in its own short transaction so no snapshot is held
+    open while mail goes out. Each batch is shared out to ``concurrency``
+    worker threads, each holding its own SMTP connection open for the whole
+    run, with a token bucket capping the total rate. After every batch the
+    last email, the counts and the failed addresses are committed, so a
+    restarted run continues after the last finished batch and at most one
+    batch is sent twice. An advisory lock keeps two senders off the same
+    campaign.
+    """
+
+    def __init__(self, app, campaign_id, concurrency=None, rate=None, burst=None, batch_size=None,
+                 max_retries=None):
+        self.app = app
+        self.campaign_id = _campaign_id(campaign_id)
+        self.concurrency = concurrency or Config.CAMPAIGN_CONCURRENCY
+        self.bucket = TokenBucket(Config.CAMPAIGN_RATE if rate is None else rate,
+                                  Config.CAMPAIGN_BURST if burst is None else burst)
+        self.batch_size = batch_size or Config.CAMPAIGN_BATCH_SIZE
+        self.max_retries = Config.CAMPAIGN_MAX_RETRIES if max_retries is None else max_retries
+        self.rendered = None
+        self.sent = self.failed = 0
+
+    def run(self):
+        started = time.perf_counter()
+        with db_connection() as state:
+            with state.cursor() as cur:
+                cur.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (f'campaign:{self.campaign_id}',))
+                locked = cur.fetchone()[0]
+            state.commit()
+            if not locked:
+                raise CampaignError(f"Campaign {self.campaign_id} is already being sent")
+            try:
+                self._run(state)
+            finally:
+                try:
+                    state.rollback()
+                    with state.cursor() as cur:
+                        cur.execute("UPDATE campaigns SET status = 'paused' WHERE id = %s AND status = 'sending'",
+                                    (self.campaign_id,))
+                        cur.execute("SELECT pg_advisory_unlock(hashtext(%s))", (f'campaign:{self.campaign_id}',))
+                    state.commit()
+                except Exception:
+                    logger.exception("Could not release campaign %s", self.campaign_id)
+            with state.cursor() as cur:
+                report = campaign_status(cur, self.campaign_id)
+            state.rollback()
+        elapsed = time.perf_counter() - started
+        report.update(this_run={'sent': self.sent, 'failed': self.failed, 'seconds': round(elapsed, 2),
+                                'per_sec': round((self.sent + self.failed) / elapsed, 1) if elapsed else None})
+        return report
+
+    def _run(self, state):
+        with state.cursor() as cur:
+            cur.execute("SELECT subject, body, html, status, last_email FROM campaigns WHERE id = %s",
+                        (self.campaign_id,))
+            row = cur.fetchone()
+            if row is None:
+                raise CampaignError(f"Campaign {self.campaign_id} not found")
+            subject, body, html, status, last_email = row
+            if status == 'done':
+                return
+            self.rendered = RenderedCampaign(subject, body, html)
+            cur.execute("""
+                UPDATE campaigns SET status = 'sending', started_at = coalesce(started_at, now())
+                WHERE id = %s
+            """, (self.campaign_id,))
+        state.commit()
+        if last_email:
+            logger.info("Resuming campaign %s after %s", self.campaign_id, last_email)
+
+        jobs, results = queue.Queue(), []
+        workers = [threading.Thread(target=self._worker, args=(jobs, results), name=f'campaign-{i}', daemon=True)
+                   for i in range(self.concurrency)]
+        for worker in workers:
+            worker.start()
+        try:
+            while True:
+                batch = self._next_batch(state, last_email)
+                if not batch:
+                    break
+                for email in batch:
+                    jobs.put(email)
+                jobs.join()
+                failures = [(email, str(error)) for email, error in results if error is not None]
+                self._checkpoint(state, batch[-1], len(results) - len(failures), failures)
+                self.sent += len(results) - len(failures)
+                self.failed += len(failures)
+                results.clear()
+                last_email = batch[-1]
+        finally:
+            for _ in workers:
+                jobs.put(None)
+            for worker in workers:
+                worker.join()
+
+        with state.cursor() as cur:
+            cur.execute("UPDATE campaigns SET status = 'done', finished_at = now() WHERE id = %s",
+                        (self.campaign_id,))
+        state.commit()
+
+    def _next_batch(self, state, last_email):
+        with state.cursor() as cur:
+            cur.execute("SELECT email FROM subscriptions WHERE email > %s ORDER BY email LIMIT %s",
+                        (last_email or '', self.batch_size))
+            batch = [row[0] for row in cur.fetchall()]
+        state.rollback()
+        return batch
+
+    def _checkpoint(self, state, last_email, sent, failures):
+        with state.cursor() as cur:
+            cur.execute("""
+                UPDATE campaigns SET last_email = %s, sent = sent + %s, failed = failed + %s WHERE id = %s
+            """, (last_email, sent, len(failures), self.campaign_id))
+            if failures:
+                cur.execute("""
+                    INSERT INTO campaign_failures (campaign_id, email, error)
+                    SELECT %s, * FROM unnest(%s::text[], %s::text[])
+                    ON CONFLICT (campaign_id, email) DO UPDATE SET error = EXCLUDED.error, failed_at = now()
+                """, (self.campaign_id, [email for email, _ in failures], [error for _, error in failures]))
+        state.commit()
+        logger.info("Campaign %s: sent %d, failed %d up to %s", self.campaign_id, sent, len(failures), last_email)
+
+    def _worker(self, jobs, results):
+        with self.app.app_context():
+            mail = self.app.extensions['mail']
+            connection = None
+            while True:
+                email = jobs.get()
+                if email is None:
+                    jobs.task_done()
+                    break
+                error = None
+                for attempt in range(self.max_retries + 1):
+                    self.bucket.acquire()
+                    try:
+                        if connection is None:
+                            connection = mail.connect().__enter__()
+                        _send(connection.send, self.rendered.message(email))
+                        error = None
+                        break
+                    except smtplib.SMTPRecipientsRefused as e:
+                        error = e  # the address is bad; retrying will not help
+                        break
+                    except (smtplib.SMTPException, OSError) as e:
+                        connection = _close_quietly(connection)
+                        error = e
+                        if attempt < self.max_retries:
+                            time.sleep(min(2 ** attempt, 30))
+                    except Exception as e:
+                        error = e
+                        break
+                results.append((email, error))
+                jobs.task_done()
+            _close_quietly(connection)
+
+
+def register_campaign_commands(app):
+    @app.cli.group('campaign')
+    def campaign():
+        """Newsletter campaigns to the subscriptions list."""
+
+    @campaign.command('create')
+    @click.option('--subject', required=True)
+    @click.option('--body-file', type=click.File(), required=True, help='Plain-text Jinja template.')
+    @click.option('--html-file', type=click.File(), help='Optional HTML Jinja template.')
+    def create(subject, body_file, html_file):
+        """Store a draft campaign and print its id."""
+        with db_connection() as conn, conn.cursor() as cur:
+            try:
+                campaign_id = create_campaign(cur, subject, body_file.read(), html_file.read() if html_file else None)
+            except CampaignError as e:
+                raise click.ClickException(str(e))
+            conn.commit()
+        click.echo(campaign_id)
+
+    @campaign.command('send')
+    @click.argument('campaign_id')
+    @click.option('--concurrency', type=int, help='SMTP connections (CAMPAIGN_CONCURRENCY).')
+    @click.option('--rate', type=float, help='Messages per second, 0 for unlimited (CAMPAIGN_RATE).')
+    @click.option('--batch-size', type=int, help='Subscribers between checkpoints (CAMPAIGN_BATCH_SIZE).')
+    def send(campaign_id, concurrency, rate, batch_size):
+        """Send a campaign, or resume it after the last checkpoint."""
+        sender = CampaignSender(app, campaign_id, concurrency=concurrency, rate=rate, batch_size=batch_size)
+        try:
+            report = sender.run()
+        except CampaignError as e:
+            raise click.ClickException(str(e))
+        click.echo(json.dumps(report, indent=2, default=str))
+
+    @campaign.command('status')
+    @click.argument('campaign_id')
+    def status(campaign_id):
+        """Show a campaign's progress and sent/failed counts."""
+        with db_connection() as conn, conn.cursor() as cur:
+            try:
+                report = campaign_status(cur, campaign_id)
+            except CampaignError as e:
+                raise click.ClickException(str(e))
+            conn.rollback()
+        click.echo(json.dumps(report, indent=2, default=str))
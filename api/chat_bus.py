@@ -0,0 +1,63 @@
+import queue
+import threading
+
+from socketio import PubSubManager
+
+LOBBY_ROOM = 'lobby'
+
+
+class LocalPubSubManager(PubSubManager):
+    """Socket.IO client manager whose pub/sub backend lives in this process.
+
+    Every manager created on the same channel receives what the others
+    publish, exactly as servers sharing a Redis or AMQP channel would, which
+    lets several Socket.IO servers run side by side in tests and benchmarks
+    without a broker. Messages are JSON-encoded on the way through, so
+    payloads a real queue could not carry fail here too.
+    """
+
+    name = 'local'
+    _channels = {}
+    _channels_lock = threading.Lock()
+
+    def __init__(self, channel='socketio', write_only=False, logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self._inbox = queue.SimpleQueue()
+        if not write_only:
+            with self._channels_lock:
+                self._channels.setdefault(channel, []).append(self._inbox)
+
+    def _publish(self, data):
+        raw = self.json.dumps(data)
+        with self._channels_lock:
+            inboxes = list(self._channels.get(self.channel, ()))
+        for inbox in inboxes:
+            inbox.put(raw)
+
+    def _listen(self):
+        while True:
+            yield self._inbox.get()
+
+    def close(self):
+        with self._channels_lock:
+            inboxes = self._channels.get(self.channel, [])
+            if self._inbox in inboxes:
+                inboxes.remove(self._inbox)
+
+
+def message_queue_options(url, channel):
+    """Keyword arguments for ``SocketIO.init_app`` selecting the chat backend.
+
+    No URL keeps the single-process default, ``memory://`` uses
+    LocalPubSubManager, and anything else (redis://, amqp://, kafka://, ...)
+    is handed to Flask-SocketIO, which picks the matching manager.
+    """
+    if not url:
+        return {}
+    if url == 'memory://':
+        return {'client_manager': LocalPubSubManager(channel=channel)}
+    return {'message_queue': url, 'channel': channel}
+
+
+def conversation_room(conversation):
+    return f'conversation:{conversation}'
@@ -0,0 +1,182 @@
+import atexit
+import logging
+import os
+import threading
+import time
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from config import Config
+from db_pool import get_pool
+
+logger = logging.getLogger(__name__)
+
+EMAIL_MAX_LENGTH = 255  # messages.email is VARCHAR(255)
+
+_INSERT_ONE = "INSERT INTO messages (uuid, email, content, timestamp) VALUES (%s, %s, %s, %s)"
+
+# Raised for a row the database will never accept. Anything else (a dropped
+# connection, a pool timeout) is assumed to be transient and the batch is retried.
+_DATA_ERRORS = (psycopg2.DataError, psycopg2.IntegrityError, psycopg2.ProgrammingError, ValueError)
+
+
+def invalid_message(email, content):
+    """Why a chat message could not be stored, or None if it can be buffered."""
+    if not isinstance(email, str) or not isinstance(content, str):
+        return "email and message must be strings"
+    if len(email) > EMAIL_MAX_LENGTH:
+        return f"email is longer than {EMAIL_MAX_LENGTH} characters"
+    if len(content) > Config.CHAT_MESSAGE_MAX_LENGTH:
+        return f"message is longer than {Config.CHAT_MESSAGE_MAX_LENGTH} characters"
+    if '\x00' in email or '\x00' in content:
+        return "message contains a NUL character"
+    return None
+
+
+class MessageBuffer:
+    """Batches chat messages into multi-row INSERTs.
+
+    Messages are written once ``flush_size`` are buffered and otherwise every
+    ``flush_interval`` seconds, plus on client disconnect and at exit. When
+    ``max_size`` messages are waiting, add() blocks for up to ``put_timeout``
+    seconds while the flusher catches up, and drops the message after that.
+
+    If a batch is rejected for its data, the rows are inserted one at a time
+    and any that still fail are logged and dropped, so one bad row cannot
+    hold up the rest. Only other failures (connection errors) put the batch
+    back, and the buffer never grows past ``max_size``.
+    """
+
+    def __init__(self, flush_size=200, flush_interval=1.0, max_size=10000, put_timeout=1.0):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self.put_timeout = put_timeout
+        self._rows = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._pid = None
+        self.enqueued = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.flush_failures = 0
+        self.backpressure_waits = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.max_depth = 0
+        self.last_flush_ms = 0.0
+        atexit.register(self.flush)
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._flush_loop, name='chat-flusher', daemon=True).start()
+
+    def add(self, message_id, email, content, timestamp):
+        self._ensure_started()
+        with self._cond:
+            if len(self._rows) >= self.max_size:
+                self.backpressure_waits += 1
+                self._cond.notify_all()
+                deadline = time.monotonic() + self.put_timeout
+                while len(self._rows) >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.dropped += 1
+                        logger.error("Chat buffer full, dropping message %s", message_id)
+                        return False
+                    self._cond.wait(remaining)
+            self._rows.append((message_id, email, content, timestamp))
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, len(self._rows))
+            if len(self._rows) >= self.flush_size:
+                self._cond.notify_all()
+        return True
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._rows) >= self.flush_size, self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._cond:
+                batch, self._rows = self._rows, []
+                self._cond.notify_all()
+            if not batch:
+                return 0
+            started = time.monotonic()
+            pending, rejected = batch, self.rejected
+            try:
+                with get_pool().connection() as conn, conn.cursor() as cur:
+                    try:
+                        execute_values(cur, "INSERT INTO messages (uuid, email, content, timestamp) VALUES %s",
+                                       batch, page_size=len(batch))
+                        conn.commit()
+                        pending = []
+                    except _DATA_ERRORS as e:
+                        conn.rollback()
+                        logger.warning("Batch of %d chat messages rejected (%s), inserting them one by one",
+                                       len(batch), e)
+                        while pending:
+                            self._insert_one(conn, cur, pending[0])
+                            pending = pending[1:]
+            except Exception:
+                self.flush_failures += 1
+                logger.exception("Failed to persist %d chat messages, will retry", len(pending))
+                with self._cond:
+                    # Keep arrival order and the buffer bound; the oldest overflow is lost.
+                    rows = pending + self._rows
+                    self.dropped += max(0, len(rows) - self.max_size)
+                    self._rows = rows[-self.max_size:]
+                return 0
+            self.last_flush_ms = (time.monotonic() - started) * 1000
+            self.flushes += 1
+            stored = len(batch) - (self.rejected - rejected)
+            self.flushed += stored
+            return stored
+
+    def _insert_one(self, conn, cur, row):
+        try:
+            cur.execute(_INSERT_ONE, row)
+            conn.commit()
+        except _DATA_ERRORS as e:
+            conn.rollback()
+            self.rejected += 1
+            logger.error("Dropping chat message %s that cannot be stored: %s", row[0], e)
+
+    def stats(self):
+        with self._cond:
+            depth = len(self._rows)
+        return {
+            "depth": depth,
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+            "backpressure_waits": self.backpressure_waits,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+
+_message_buffer = None
+
+
+def get_message_buffer():
+    global _message_buffer
+    if _message_buffer is None:
+        _message_buffer = MessageBuffer(
+            flush_size=Config.CHAT_FLUSH_SIZE,
+            flush_interval=Config.CHAT_FLUSH_INTERVAL,
+            max_size=Config.CHAT_BUFFER_MAX,
+            put_timeout=Config.CHAT_BUFFER_PUT_TIMEOUT,
+        )
+    return _message_buffer
@@ -11,16 +11,129 @@ class Config:
     DB_HOST = os.getenv('DB_HOST')
     DB_PORT = os.getenv('DB_PORT')
 
+    # Connection pool used by utils.connect_db and utils.get_db
+    DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 1))
+    DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))  # seconds to wait for a free connection
+    DB_POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', 3600))
+    DB_POOL_MAX_IDLE = float(os.getenv('DB_POOL_MAX_IDLE', 300))
+    DB_POOL_CHECK_INTERVAL = float(os.getenv('DB_POOL_CHECK_INTERVAL', 30))  # ping connections idle longer than this
+    DB_POOL_LEAK_THRESHOLD = float(os.getenv('DB_POOL_LEAK_THRESHOLD', 30))  # warn about checkouts held longer; 0 disables
+
+    # Run hot statements as server-side prepared statements, once per pooled connection
+    PREPARED_STATEMENTS = os.getenv('PREPARED_STATEMENTS', 'true').lower() == 'true'
+
+    # Logging: JSON lines written from a background thread; debug records are sampled
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG')
+    LOG_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', 0.01))
+    LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+    LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+
+    # Prometheus metrics; per-request timing is skipped entirely when disabled
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+    METRICS_PATH = os.getenv('METRICS_PATH', '/metrics')
+
+    # Optional asyncio mode: /api/async routes on asyncpg and aiosmtplib (see aio.py)
+    ASYNC_MODE = os.getenv('ASYNC_MODE', 'false').lower() == 'true'
+    ASYNC_DB_POOL_MIN_SIZE = int(os.getenv('ASYNC_DB_POOL_MIN_SIZE', 1))
+    ASYNC_DB_POOL_MAX_SIZE = int(os.getenv('ASYNC_DB_POOL_MAX_SIZE', 10))
+    ASYNC_SMTP_TIMEOUT = float(os.getenv('ASYNC_SMTP_TIMEOUT', 30))
+
     # Flask-Mail configuration
-    MAIL_SERVER = 'smtp.gmail.com'
-    MAIL_PORT = 587
-    MAIL_USE_TLS = True
+    MAIL_SERVER = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
+    MAIL_PORT = int(os.getenv('MAIL_PORT', 587))
+    MAIL_USE_TLS = os.getenv('MAIL_USE_TLS', 'true').lower() == 'true'
     MAIL_USERNAME = os.getenv('GMAIL_USER')
     MAIL_PASSWORD = os.getenv('GMAIL_PASS')
     MAIL_DEFAULT_SENDER = os.getenv('GMAIL_USER')
 
+    # Background mail delivery (see mailer.MailDispatcher)
+    MAIL_QUEUE_ENABLED = os.getenv('MAIL_QUEUE_ENABLED', 'true').lower() == 'true'
+    MAIL_QUEUE_WORKERS = int(os.getenv('MAIL_QUEUE_WORKERS', 2))
+    MAIL_QUEUE_BATCH_SIZE = int(os.getenv('MAIL_QUEUE_BATCH_SIZE', 20))
+    MAIL_QUEUE_MAX_RETRIES = int(os.getenv('MAIL_QUEUE_MAX_RETRIES', 5))
+    MAIL_QUEUE_RETRY_BACKOFF = float(os.getenv('MAIL_QUEUE_RETRY_BACKOFF', 2))  # seconds, doubled per attempt
+    MAIL_QUEUE_IDLE_TIMEOUT = float(os.getenv('MAIL_QUEUE_IDLE_TIMEOUT', 30))  # close idle SMTP connections
+    MAIL_QUEUE_LEASE = float(os.getenv('MAIL_QUEUE_LEASE', 300))  # seconds before another process resends claimed mail
+    MAIL_SPOOL_DIR = os.getenv('MAIL_SPOOL_DIR')
+
+    # Newsletter campaigns (see campaigns.py); the rate is messages per second across all connections
+    CAMPAIGN_CONCURRENCY = int(os.getenv('CAMPAIGN_CONCURRENCY', 4))  # persistent SMTP connections
+    CAMPAIGN_RATE = float(os.getenv('CAMPAIGN_RATE', 10))
+    CAMPAIGN_BURST = int(os.getenv('CAMPAIGN_BURST', 10))
+    CAMPAIGN_BATCH_SIZE = int(os.getenv('CAMPAIGN_BATCH_SIZE', 500))  # subscribers sent between checkpoints
+    CAMPAIGN_MAX_RETRIES = int(os.getenv('CAMPAIGN_MAX_RETRIES', 3))
+
+    # Password hashing (see hashing.PasswordHasher)
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+    BCRYPT_WORKERS = int(os.getenv('BCRYPT_WORKERS', os.cpu_count() or 1))  # 0 hashes on the request thread
+    BCRYPT_MAX_PENDING = int(os.getenv('BCRYPT_MAX_PENDING', 32))
+    BCRYPT_QUEUE_TIMEOUT = float(os.getenv('BCRYPT_QUEUE_TIMEOUT', 5))
+
+    # Rate limits ('N/period', per client address unless noted; see ratelimit.py)
+    RATELIMIT_ENABLED = os.getenv('RATELIMIT_ENABLED', 'true').lower() == 'true'
+    RATELIMIT_STORAGE = os.getenv('RATELIMIT_STORAGE', 'local')  # 'local' or 'redis' to share buckets between workers
+    RATELIMIT_REDIS_URL = os.getenv('RATELIMIT_REDIS_URL', os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0'))
+    RATELIMIT_LOGIN = os.getenv('RATELIMIT_LOGIN', '20/minute')
+    RATELIMIT_LOGIN_ACCOUNT = os.getenv('RATELIMIT_LOGIN_ACCOUNT', '10/minute')  # per email or phone number
+    RATELIMIT_REGISTER = os.getenv('RATELIMIT_REGISTER', '10/hour')
+    RATELIMIT_CONTACT = os.getenv('RATELIMIT_CONTACT', '5/minute')
+    RATELIMIT_SUBSCRIBE = os.getenv('RATELIMIT_SUBSCRIBE', '5/minute')
+
+    # Admission control: each rate-limited endpoint's in-flight requests per process, then a bounded queue
+    ADMISSION_MAX_IN_FLIGHT = int(os.getenv('ADMISSION_MAX_IN_FLIGHT', 8))  # per endpoint
+    ADMISSION_MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE', 16))
+    ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 2))  # seconds before a queued request gets 503
+
+    # Blog search: 'postgres' uses the search_vector GIN index, 'memory' an in-process index
+    SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'postgres')
+
+    # Response cache: 'local' (per-process LRU) or 'redis' (shared; CACHE_REDIS_URL=memory:// for a fake)
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'local')
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_TTL = int(os.getenv('CACHE_TTL', 60))
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 1024))
+
+    # Blog view counts are buffered in memory and flushed in batches
+    VIEW_FLUSH_INTERVAL = float(os.getenv('VIEW_FLUSH_INTERVAL', 5))
+    VIEW_FLUSH_THRESHOLD = int(os.getenv('VIEW_FLUSH_THRESHOLD', 500))
+
+    # Revoked JWTs (see revocation.TokenBlocklist)
+    JWT_BLOCKLIST_CAPACITY = int(os.getenv('JWT_BLOCKLIST_CAPACITY', 100000))
+    JWT_BLOCKLIST_SYNC_INTERVAL = float(os.getenv('JWT_BLOCKLIST_SYNC_INTERVAL', 5))  # pick up other workers' revocations
+    JWT_BLOCKLIST_COMPACT_INTERVAL = float(os.getenv('JWT_BLOCKLIST_COMPACT_INTERVAL', 3600))
+
+    # Chat messages are buffered and inserted in batches (see chat_store.MessageBuffer)
+    CHAT_FLUSH_SIZE = int(os.getenv('CHAT_FLUSH_SIZE', 200))
+    CHAT_FLUSH_INTERVAL = float(os.getenv('CHAT_FLUSH_INTERVAL', 1))
+    CHAT_BUFFER_MAX = int(os.getenv('CHAT_BUFFER_MAX', 10000))
+    CHAT_BUFFER_PUT_TIMEOUT = float(os.getenv('CHAT_BUFFER_PUT_TIMEOUT', 1))
+    CHAT_MESSAGE_MAX_LENGTH = int(os.getenv('CHAT_MESSAGE_MAX_LENGTH', 5000))  # longer messages are refused
+
+    # Socket.IO fan-out between workers: unset for a single process, memory:// for an in-process bus,
+    # or a redis://, amqp:// or kafka:// URL shared by every node
+    SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE')
+    SOCKETIO_CHANNEL = os.getenv('SOCKETIO_CHANNEL', 'sautis-chat')
+
+    # Uploaded files are stored by content hash (see storage.ContentStore)
+    UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', os.path.join(os.path.dirname(__file__), 'UPLOAD_FOLDER'))
+    UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 1024 * 1024))  # bytes read from the request at a time
+    UPLOAD_MAX_SIZE = int(os.getenv('UPLOAD_MAX_SIZE', 1024 ** 3))
+    UPLOAD_EXPIRY = float(os.getenv('UPLOAD_EXPIRY', 86400))  # seconds before an idle chunked upload is discarded
+    FILES_ACCEL_REDIRECT = os.getenv('FILES_ACCEL_REDIRECT')  # nginx internal location mapped to UPLOAD_FOLDER
+
+    # Image thumbnails (see thumbnails.ThumbnailPipeline; needs Pillow)
+    THUMBNAIL_SIZES = os.getenv('THUMBNAIL_SIZES', '64,128,256')
+    THUMBNAIL_FORMAT = os.getenv('THUMBNAIL_FORMAT', 'webp')  # webp, jpeg or png
+    THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', 2))
+    THUMBNAIL_TIMEOUT = float(os.getenv('THUMBNAIL_TIMEOUT', 10))  # seconds a request waits for a missing size
+
+    # Bulk invoice import: rows per COPY batch, and how many invalid rows the report lists
+    IMPORT_BATCH_ROWS = int(os.getenv('IMPORT_BATCH_ROWS', 5000))
+    IMPORT_MAX_ERRORS = int(os.getenv('IMPORT_MAX_ERRORS', 100))
+
     # SQLAlchemy configuration
-    SQLALCHEMY_DATABASE_URI = f'postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+    SQLALCHEMY_DATABASE_URI = f'postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
     # Other configurations
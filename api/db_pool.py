@@ -0,0 +1,346 @@
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+
+import metrics
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+_CHECKOUT_HELPERS = {'getconn', 'connection', 'connect_db', 'db_connection', 'get_db', '__enter__'}
+
+
+def _caller():
+    frame = sys._getframe(2)
+    while frame.f_back is not None and frame.f_code.co_name in _CHECKOUT_HELPERS:
+        frame = frame.f_back
+    return f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})"
+
+
+class _PoolEntry:
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.checked_out_at = None
+        self.owner = None
+        self.leak_reported = False
+
+
+class PooledConnection:
+    """Handle for a connection checked out of the pool.
+
+    Behaves like a psycopg2 connection, except that close() hands the
+    connection back to the pool instead of closing the socket.
+    """
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+
+    @property
+    def raw(self):
+        if self._entry is None:
+            raise psycopg2.InterfaceError("connection already returned to the pool")
+        return self._entry.raw
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def close(self):
+        if self._entry is not None:
+            entry, self._entry = self._entry, None
+            self._pool.release(entry)
+
+    def __del__(self):
+        # A handle dropped without close() would shrink the pool for good.
+        if self._entry is not None:
+            try:
+                logger.warning("Connection checked out by %s was never returned; reclaiming it", self._entry.owner)
+                self.close()
+            except Exception:
+                pass
+
+
+class ConnectionPool:
+    def __init__(self, dsn_kwargs, min_size=1, max_size=10, timeout=10.0,
+                 max_lifetime=3600.0, max_idle=300.0, check_interval=30.0, leak_threshold=30.0):
+        self.dsn_kwargs = dsn_kwargs
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check_interval = check_interval
+        self.leak_threshold = leak_threshold
+        self.pid = os.getpid()
+
+        self._idle = []
+        self._checked_out = set()
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._leaks = 0
+
+        self._reaper = threading.Thread(target=self._reap_loop, name='db-pool-reaper', daemon=True)
+        self._reaper.start()
+
+    def _connect(self):
+        return _PoolEntry(psycopg2.connect(**self.dsn_kwargs))
+
+    def _expired(self, entry, now):
+        return self.max_lifetime and now - entry.created_at > self.max_lifetime
+
+    def _healthy(self, entry, now):
+        raw = entry.raw
+        if raw.closed:
+            return False
+        if now - entry.last_used < self.check_interval:
+            return True
+        try:
+            with raw.cursor() as cur:
+                cur.execute("SELECT 1")
+            raw.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, entry):
+        try:
+            entry.raw.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._discarded += 1
+            self._cond.notify()
+
+    def getconn(self, timeout=None, owner=None):
+        """Check out a connection; ``owner`` names the holder in leak reports."""
+        if owner is None:
+            owner = _caller()
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        while True:
+            entry = None
+            with self._cond:
+                if self._closed:
+                    raise psycopg2.InterfaceError("connection pool is closed")
+                self._waiting += 1
+                try:
+                    while not self._idle and self._size >= self.max_size:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._timeouts += 1
+                            raise PoolTimeout(
+                                f"Timed out after {timeout}s waiting for a database connection")
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+                if self._idle:
+                    entry = self._idle.pop()
+                else:
+                    self._size += 1
+                self._in_use += 1
+
+            if entry is None:
+                try:
+                    entry = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._in_use -= 1
+                        self._cond.notify()
+                    raise
+            else:
+                now = time.monotonic()
+                if self._expired(entry, now) or not self._healthy(entry, now):
+                    with self._cond:
+                        self._in_use -= 1
+                    self._discard(entry)
+                    continue
+
+            now = time.monotonic()
+            waited = now - started
+            entry.checked_out_at, entry.owner, entry.leak_reported = now, owner, False
+            with self._cond:
+                self._checked_out.add(entry)
+                self._checkouts += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            if metrics.ENABLED:
+                metrics.POOL_WAIT_SECONDS.observe(waited)
+            return PooledConnection(self, entry)
+
+    def release(self, entry):
+        raw = entry.raw
+        keep = not raw.closed and not self._closed
+        if keep and raw.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                raw.rollback()
+            except psycopg2.Error:
+                keep = False
+        entry.last_used = time.monotonic()
+        if keep and self._expired(entry, entry.last_used):
+            keep = False
+
+        with self._cond:
+            self._in_use -= 1
+            self._checked_out.discard(entry)
+        if entry.leak_reported:
+            logger.warning("Connection held by %s returned after %.1fs", entry.owner, entry.last_used - entry.checked_out_at)
+        entry.checked_out_at = entry.owner = None
+        if not keep:
+            self._discard(entry)
+            return
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _reap_loop(self):
+        interval = max(1.0, min(self.max_idle or 60.0, self.leak_threshold or 60.0, 60.0) / 2)
+        while not self._closed:
+            time.sleep(interval)
+            self.reap()
+
+    def reap(self):
+        now = time.monotonic()
+        self.check_leaks(now)
+        stale = []
+        with self._cond:
+            keep = []
+            for entry in self._idle:
+                idle_for = now - entry.last_used
+                surplus = self._size - len(stale) > self.min_size
+                if self._expired(entry, now) or (surplus and self.max_idle and idle_for > self.max_idle):
+                    stale.append(entry)
+                else:
+                    keep.append(entry)
+            self._idle = keep
+            missing = self.min_size - (self._size - len(stale))
+        for entry in stale:
+            self._discard(entry)
+        for _ in range(max(0, missing)):
+            with self._cond:
+                if self._closed or self._size >= self.max_size:
+                    break
+                self._size += 1
+            try:
+                entry = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                break
+            with self._cond:
+                self._idle.append(entry)
+                self._cond.notify()
+
+    def check_leaks(self, now=None):
+        """Log every connection held longer than ``leak_threshold`` seconds, once per checkout."""
+        if not self.leak_threshold:
+            return []
+        now = time.monotonic() if now is None else now
+        with self._cond:
+            leaked = [entry for entry in self._checked_out
+                      if not entry.leak_reported and now - entry.checked_out_at > self.leak_threshold]
+            for entry in leaked:
+                entry.leak_reported = True
+            self._leaks += len(leaked)
+        for entry in leaked:
+            logger.warning("Possible connection leak: %s has held a connection for %.1fs",
+                           entry.owner, now - entry.checked_out_at)
+        return [entry.owner for entry in leaked]
+
+    def stats(self):
+        now = time.monotonic()
+        with self._cond:
+            longest = max((now - entry.checked_out_at for entry in self._checked_out), default=0.0)
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "discarded": self._discarded,
+                "checkout_wait_avg_ms": (self._wait_total / self._checkouts * 1000) if self._checkouts else 0.0,
+                "checkout_wait_max_ms": self._wait_max * 1000,
+                "longest_checkout_s": longest,
+                "leaks_detected": self._leaks,
+            }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for entry in idle:
+            self._discard(entry)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    # A pool inherited across fork() shares sockets with the parent; start fresh instead.
+    if _pool is None or _pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid():
+                _pool = ConnectionPool(
+                    dict(
+                        dbname=Config.DB_NAME,
+                        user=Config.DB_USER,
+                        password=Config.DB_PASSWORD,
+                        host=Config.DB_HOST,
+                        port=Config.DB_PORT,
+                        **({'cursor_factory': metrics.TimedCursor} if metrics.ENABLED else {}),
+                    ),
+                    min_size=Config.DB_POOL_MIN_SIZE,
+                    max_size=Config.DB_POOL_MAX_SIZE,
+                    timeout=Config.DB_POOL_TIMEOUT,
+                    max_lifetime=Config.DB_POOL_MAX_LIFETIME,
+                    max_idle=Config.DB_POOL_MAX_IDLE,
+                    check_interval=Config.DB_POOL_CHECK_INTERVAL,
+                    leak_threshold=Config.DB_POOL_LEAK_THRESHOLD,
+                )
+    return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
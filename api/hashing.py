@@ -0,0 +1,96 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+import metrics
+from config import Config
+
+
+class HashingBusy(Exception):
+    pass
+
+
+def _hashpw(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode()
+
+
+def _checkpw(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+
+class PasswordHasher:
+    """Runs bcrypt in a process pool so it never holds the request thread's GIL.
+
+    At most ``max_pending`` operations may be queued or running; callers beyond
+    that wait up to ``queue_timeout`` seconds and then get HashingBusy.
+    With ``workers=0`` hashing runs inline on the calling thread.
+    """
+
+    def __init__(self, rounds=12, workers=2, max_pending=32, queue_timeout=5.0):
+        self.rounds = rounds
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _run(self, operation, fn, *args):
+        if not metrics.ENABLED:
+            return self._call(fn, *args)
+        with metrics.BCRYPT_SECONDS.time(operation):
+            return self._call(fn, *args)
+
+    def _call(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise HashingBusy("Too many password hashing requests in flight")
+        try:
+            return self._get_executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run('hash', _hashpw, password.encode(), self.rounds)
+
+    def verify(self, password, hashed):
+        return self._run('verify', _checkpw, password.encode(), hashed.encode())
+
+    def needs_rehash(self, hashed):
+        # bcrypt hashes look like $2b$<cost>$<salt+digest>
+        try:
+            return int(hashed.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False)
+        self._executor = None
+        self._pid = None
+
+
+_hasher = None
+
+
+def get_hasher():
+    global _hasher
+    if _hasher is None:
+        _hasher = PasswordHasher(
+            rounds=Config.BCRYPT_ROUNDS,
+            workers=Config.BCRYPT_WORKERS,
+            max_pending=Config.BCRYPT_MAX_PENDING,
+            queue_timeout=Config.BCRYPT_QUEUE_TIMEOUT,
+        )
+    return _hasher
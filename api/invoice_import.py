@@ -0,0 +1,188 @@
+import codecs
+import csv
+import datetime
+import decimal
+import io
+import json
+import time
+import uuid
+
+from config import Config
+from invoice_totals import INVOICE_STATUSES, InvoiceDeltas
+
+IMPORT_COLUMNS = ('name', 'amount', 'due_date', 'status', 'user_id')
+MAX_AMOUNT = decimal.Decimal('100000000')  # invoices.amount is NUMERIC(10, 2)
+
+
+class ImportFormatError(ValueError):
+    """The upload as a whole cannot be read (unknown format, bad header, bad encoding)."""
+
+
+def import_format(request):
+    fmt = request.args.get('format')
+    if fmt is None:
+        fmt = {'text/csv': 'csv', 'application/x-ndjson': 'ndjson'}.get(request.mimetype)
+    if fmt not in ('csv', 'ndjson'):
+        raise ImportFormatError("Send text/csv or application/x-ndjson, or pass format=csv|ndjson")
+    return fmt
+
+
+def _lines(stream):
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    try:
+        for raw in stream:
+            yield decoder.decode(raw)
+        tail = decoder.decode(b'', final=True)
+    except UnicodeDecodeError as e:
+        raise ImportFormatError(f"Upload is not valid UTF-8: {e}")
+    if tail:
+        yield tail
+
+
+def read_records(stream, fmt):
+    """Yield ``(line, record)`` from a CSV or NDJSON byte stream, one line at a time.
+
+    ``record`` is a dict, or the parse error for that line as a string.
+    """
+    lines = _lines(stream)
+    if fmt == 'ndjson':
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield number, f"Invalid JSON: {e}"
+                continue
+            yield number, record if isinstance(record, dict) else "Expected a JSON object"
+        return
+
+    reader = csv.DictReader(lines, strict=True)
+    try:
+        header = reader.fieldnames
+    except csv.Error as e:
+        raise ImportFormatError(f"Invalid CSV header: {e}")
+    if not header:
+        return
+    unknown = set(header) - set(IMPORT_COLUMNS)
+    missing = {'name', 'amount', 'due_date'} - set(header)
+    if unknown or missing:
+        raise ImportFormatError(f"CSV header must contain name, amount, due_date and optionally status, user_id "
+                                f"(missing: {sorted(missing)}, unknown: {sorted(unknown)})")
+    while True:
+        try:
+            record = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            yield reader.line_num, f"Invalid CSV: {e}"
+            continue
+        if None in record:
+            yield reader.line_num, "Too many fields"
+        else:
+            yield reader.line_num, record
+
+
+def validate(record):
+    """The ``IMPORT_COLUMNS`` tuple for a record, or ValueError naming the bad field."""
+    name = record.get('name')
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("name is required")
+    name = name.strip()
+    if len(name) > 255:
+        raise ValueError("name is longer than 255 characters")
+
+    raw_amount = record.get('amount')
+    if isinstance(raw_amount, bool) or raw_amount in (None, ''):
+        raise ValueError("amount is required")
+    try:
+        amount = decimal.Decimal(str(raw_amount).strip())
+    except decimal.InvalidOperation:
+        raise ValueError(f"amount is not a number: {raw_amount!r}")
+    if not amount.is_finite() or abs(amount) >= MAX_AMOUNT or amount.as_tuple().exponent < -2:
+        raise ValueError(f"amount must have at most 8 digits and 2 decimal places: {raw_amount!r}")
+
+    try:
+        due_date = datetime.date.fromisoformat(str(record.get('due_date') or '').strip())
+    except ValueError:
+        raise ValueError(f"due_date must be YYYY-MM-DD: {record.get('due_date')!r}")
+
+    status = record.get('status') or 'pending'
+    if not isinstance(status, str) or status.strip() not in INVOICE_STATUSES:
+        raise ValueError(f"status must be one of {', '.join(INVOICE_STATUSES)}: {status!r}")
+
+    user_id = record.get('user_id') or None
+    if user_id is not None:
+        try:
+            user_id = uuid.UUID(str(user_id).strip())
+        except ValueError:
+            raise ValueError(f"user_id is not a UUID: {user_id!r}")
+    return name, amount, due_date, status.strip(), user_id
+
+
+def _copy_field(value):
+    if value is None:
+        return r'\N'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def import_invoices(cur, stream, fmt, skip_invalid=False):
+    """COPY valid invoices from an uploaded stream into ``invoices``.
+
+    Rows are validated as they are read and sent in COPY batches of
+    ``IMPORT_BATCH_ROWS``, so memory stays flat for any upload size. Invalid
+    rows are reported by line number (the first ``IMPORT_MAX_ERRORS`` of
+    them). Unless ``skip_invalid`` is set, one invalid row stops further
+    COPYs and the caller is expected to roll back; the rest of the upload is
+    still validated so the report is complete. The imported rows' invoice
+    totals and user balances are updated once, after the last batch.
+    Imported invoices carry no paid_at, so paid ones count towards the
+    status totals but not towards any month's paid totals.
+    """
+    started = time.perf_counter()
+    statement = f"COPY invoices ({', '.join(IMPORT_COLUMNS)}) FROM STDIN"
+    buffer, pending, imported, rejected, errors = io.StringIO(), 0, 0, 0, []
+    deltas = InvoiceDeltas()
+
+    def flush():
+        nonlocal buffer, pending, imported
+        if pending:
+            buffer.seek(0)
+            cur.copy_expert(statement, buffer)
+            imported += pending
+        buffer, pending = io.StringIO(), 0
+
+    processed = 0
+    for line, record in read_records(stream, fmt):
+        processed += 1
+        try:
+            if isinstance(record, str):
+                raise ValueError(record)
+            row = validate(record)
+        except ValueError as e:
+            rejected += 1
+            if len(errors) < Config.IMPORT_MAX_ERRORS:
+                errors.append({'line': line, 'error': str(e)})
+            if not skip_invalid:
+                buffer, pending = io.StringIO(), 0
+            continue
+        if rejected and not skip_invalid:
+            continue
+        buffer.write('\t'.join(_copy_field(value) for value in row) + '\n')
+        name, amount, due_date, status, user_id = row
+        deltas.add(user_id, amount, due_date, status)
+        pending += 1
+        if pending >= Config.IMPORT_BATCH_ROWS:
+            flush()
+    if skip_invalid or not rejected:
+        flush()
+        deltas.apply(cur)
+
+    elapsed = time.perf_counter() - started
+    return {
+        'imported': imported if skip_invalid or not rejected else 0,
+        'rejected': rejected,
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'rows_per_sec': round(processed / elapsed) if elapsed else None,
+    }
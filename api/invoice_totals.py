@@ -0,0 +1,202 @@
+import datetime
+import decimal
+import logging
+
+import click
+
+import queries
+from utils import db_connection
+
+logger = logging.getLogger(__name__)
+
+INVOICE_STATUSES = ('pending', 'overdue', 'paid', 'cancelled')
+# Invoices in these statuses no longer count towards a user's balance, and are never overdue.
+SETTLED_STATUSES = ('paid', 'cancelled')
+
+
+def _month(day):
+    if isinstance(day, str):
+        day = datetime.date.fromisoformat(day)
+    if isinstance(day, datetime.datetime):
+        day = day.date()
+    return day.replace(day=1)
+
+
+def _bump(buckets, key, sign, amount):
+    count, total = buckets.get(key, (0, decimal.Decimal(0)))
+    buckets[key] = (count + sign, total + amount)
+
+
+def _columns(buckets):
+    """Sorted (keys, counts, amounts) arrays for the changed buckets; concurrent writers lock rows in key order."""
+    changed = sorted((key, value) for key, value in buckets.items() if value != (0, 0))
+    return ([key for key, _ in changed], [count for _, (count, _) in changed],
+            [amount for _, (_, amount) in changed])
+
+
+class InvoiceDeltas:
+    """Changes to the invoice aggregates and userinfo1.invoice_balance, applied in one go.
+
+    The aggregates are small tables the summary reads directly:
+    invoice_totals (count and sum per status and due month),
+    invoice_status_totals (per status), invoice_paid_totals (per month an
+    invoice was paid, from paid_at) and invoice_open_totals (unsettled
+    invoices per due date, so overdue is the rows before today). A user's
+    balance is the sum of their unsettled invoices. Every write to invoices
+    records the rows it removed and added here. apply() then moves only the
+    buckets and balances those rows touched, in the same transaction, so
+    nothing ever needs a scan of invoices.
+    """
+
+    def __init__(self):
+        self.totals = {}
+        self.statuses = {}
+        self.paid = {}
+        self.open = {}
+        self.balances = {}
+
+    def add(self, user_id, amount, due_date, status, paid_at=None, sign=1):
+        amount = decimal.Decimal(amount) * sign
+        if isinstance(due_date, str):
+            due_date = datetime.date.fromisoformat(due_date)
+        _bump(self.totals, (status, _month(due_date)), sign, amount)
+        _bump(self.statuses, status, sign, amount)
+        if status == 'paid' and paid_at is not None:
+            _bump(self.paid, _month(paid_at), sign, amount)
+        if status not in SETTLED_STATUSES:
+            _bump(self.open, due_date, sign, amount)
+            if user_id is not None:
+                user_id = str(user_id)
+                self.balances[user_id] = self.balances.get(user_id, decimal.Decimal(0)) + amount
+
+    def remove(self, user_id, amount, due_date, status, paid_at=None):
+        self.add(user_id, amount, due_date, status, paid_at, sign=-1)
+
+    def apply(self, cur):
+        totals = sorted((key, value) for key, value in self.totals.items() if value != (0, 0))
+        if totals:
+            queries.execute(cur, queries.INVOICE_TOTALS_ADD, (
+                [status for (status, _), _ in totals], [month for (_, month), _ in totals],
+                [count for _, (count, _) in totals], [amount for _, (_, amount) in totals]))
+        for statement, buckets in ((queries.INVOICE_STATUS_TOTALS_ADD, self.statuses),
+                                   (queries.INVOICE_PAID_TOTALS_ADD, self.paid),
+                                   (queries.INVOICE_OPEN_TOTALS_ADD, self.open)):
+            keys, counts, amounts = _columns(buckets)
+            if keys:
+                queries.execute(cur, statement, (keys, counts, amounts))
+        if self.open:
+            # Days with nothing left open would otherwise pile up in the overdue range.
+            queries.execute(cur, queries.INVOICE_OPEN_TOTALS_PRUNE, (sorted(self.open),))
+        balances = sorted((user_id, delta) for user_id, delta in self.balances.items() if delta)
+        if balances:
+            queries.execute(cur, queries.USER_BALANCE_ADD,
+                            ([user_id for user_id, _ in balances], [delta for _, delta in balances]))
+        self.totals, self.statuses, self.paid, self.open, self.balances = {}, {}, {}, {}, {}
+
+
+def record_change(cur, old=None, new=None):
+    """Apply one invoice write; ``old``/``new`` are (user_id, amount, due_date, status, paid_at) or None."""
+    deltas = InvoiceDeltas()
+    if old is not None:
+        deltas.remove(*old)
+    if new is not None:
+        deltas.add(*new)
+    deltas.apply(cur)
+
+
+def summary(cur, user_id=None):
+    """Dashboard totals read from the aggregate tables (and one userinfo1 row), not invoices.
+
+    ``paid_this_month`` buckets paid invoices by paid_at; ``overdue`` is every
+    unsettled invoice whose due date has passed, whatever its status says.
+    """
+    zero = decimal.Decimal(0)
+    empty = {'count': 0, 'amount': zero}
+    by_status, result = {}, {'overdue': empty, 'paid_this_month': empty}
+    queries.execute(cur, queries.INVOICE_SUMMARY, ())
+    for kind, status, count, amount in cur.fetchall():
+        bucket = {'count': count, 'amount': amount}
+        if kind == 'status':
+            if count:
+                by_status[status] = bucket
+        else:
+            result[kind] = bucket
+    result['outstanding'] = {
+        'count': sum(b['count'] for s, b in by_status.items() if s not in SETTLED_STATUSES),
+        'amount': sum((b['amount'] for s, b in by_status.items() if s not in SETTLED_STATUSES), zero),
+    }
+    result['by_status'] = by_status
+    if user_id is not None:
+        queries.execute(cur, queries.USER_BALANCE, (user_id,))
+        row = cur.fetchone()
+        result['balance'] = row[0] if row else None
+    return result
+
+
+# Each aggregate table with the key columns and the query that recomputes it from invoices.
+_AGGREGATES = (
+    ('invoice_totals', ('status', 'month'), """
+        SELECT status, date_trunc('month', due_date)::date AS month,
+               count(*) AS invoice_count, sum(amount) AS amount
+        FROM invoices GROUP BY 1, 2
+    """),
+    ('invoice_status_totals', ('status',), """
+        SELECT status, count(*) AS invoice_count, sum(amount) AS amount FROM invoices GROUP BY 1
+    """),
+    ('invoice_paid_totals', ('month',), """
+        SELECT date_trunc('month', paid_at)::date AS month, count(*) AS invoice_count, sum(amount) AS amount
+        FROM invoices WHERE status = 'paid' AND paid_at IS NOT NULL GROUP BY 1
+    """),
+    ('invoice_open_totals', ('due_date',), """
+        SELECT due_date, count(*) AS invoice_count, sum(amount) AS amount
+        FROM invoices WHERE status <> ALL(%(settled)s) GROUP BY 1
+    """),
+)
+
+
+def rebuild(cur):
+    """Recompute every aggregate table and invoice_balance from invoices.
+
+    Writes to invoices are blocked meanwhile, so no delta is lost between the
+    scan and the swap. Returns how many aggregate rows and balances were wrong.
+    """
+    cur.execute("LOCK TABLE invoices IN SHARE MODE")
+    totals_fixed = 0
+    for table, keys, select in _AGGREGATES:
+        cur.execute(f"CREATE TEMP TABLE fresh_{table} ON COMMIT DROP AS {select}", {'settled': list(SETTLED_STATUSES)})
+        cur.execute(f"""
+            SELECT count(*) FROM fresh_{table} f FULL JOIN {table} t USING ({', '.join(keys)})
+            WHERE f.invoice_count IS DISTINCT FROM nullif(t.invoice_count, 0)
+               OR f.amount IS DISTINCT FROM (CASE WHEN t.invoice_count = 0 THEN NULL ELSE t.amount END)
+        """)
+        totals_fixed += cur.fetchone()[0]
+        cur.execute(f"LOCK TABLE {table} IN EXCLUSIVE MODE")
+        cur.execute(f"DELETE FROM {table}")
+        columns = ', '.join(keys + ('invoice_count', 'amount'))
+        cur.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM fresh_{table}")
+    cur.execute("""
+        UPDATE userinfo1 SET invoice_balance = b.balance
+        FROM (
+            SELECT u.id, coalesce(sum(i.amount), 0) AS balance
+            FROM userinfo1 u LEFT JOIN invoices i ON i.user_id = u.id AND i.status <> ALL(%s)
+            GROUP BY u.id
+        ) b
+        WHERE userinfo1.id = b.id AND userinfo1.invoice_balance IS DISTINCT FROM b.balance
+    """, (list(SETTLED_STATUSES),))
+    return {'totals_fixed': totals_fixed, 'balances_fixed': cur.rowcount}
+
+
+def register_commands(app):
+    @app.cli.command('rebuild-invoice-totals')
+    @click.option('--dry-run', is_flag=True, help='Report the drift without fixing it.')
+    def rebuild_invoice_totals(dry_run):
+        """Recompute invoice totals and user balances from the invoices table."""
+        with db_connection() as conn, conn.cursor() as cur:
+            result = rebuild(cur)
+            if dry_run:
+                conn.rollback()
+            else:
+                conn.commit()
+        logger.info("Invoice totals rebuilt%s: %s", " (dry run)" if dry_run else "", result)
+        click.echo(f"{'Would fix' if dry_run else 'Fixed'} {result['totals_fixed']} totals rows "
+                   f"and {result['balances_fixed']} balances")
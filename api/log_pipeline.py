@@ -0,0 +1,152 @@
+import atexit
+import datetime
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import uuid
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from flask import g, has_request_context, request
+from flask.logging import default_handler
+
+from config import Config
+
+# Attributes every LogRecord has; anything else was passed via ``extra=`` and goes into the JSON.
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id', 'method', 'path'}
+_REQUEST_ID_RE = re.compile(r'[\w.:-]{1,128}')
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key in ('request_id', 'method', 'path'):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.levelno >= logging.WARNING:
+            entry['source'] = f'{record.pathname}:{record.lineno}'
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class PipelineHandler(QueueHandler):
+    """Hands records to a background QueueListener instead of writing them inline.
+
+    On the calling thread the record only gets its message resolved, its
+    request id and path attached, and debug records are sampled down to
+    ``debug_sample_rate``. Formatting and file I/O happen on the listener
+    thread. The listener is restarted after a fork.
+    """
+
+    def __init__(self, handlers, debug_sample_rate=1.0):
+        super().__init__(queue.SimpleQueue())
+        self.handlers = handlers
+        self.debug_sample_rate = debug_sample_rate
+        self._listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+                self._listener.start()
+                self._pid = os.getpid()
+
+    def filter(self, record):
+        if record.levelno <= logging.DEBUG and self.debug_sample_rate < 1 and random.random() >= self.debug_sample_rate:
+            return False
+        return super().filter(record)
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.method = request.method
+            record.path = request.path
+        return record
+
+    def enqueue(self, record):
+        self._ensure_started()
+        super().enqueue(record)
+
+    def stop(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+        self._listener = None
+        self._pid = None
+
+
+_pipeline = None
+
+
+def setup_logging(app):
+    """Route the app's and every module logger's records through one background pipeline.
+
+    Records are written as JSON lines to logs/sautis.log (except in debug
+    mode) and to stderr, as plain text in debug mode. Each request gets an
+    id, taken from the X-Request-ID header when the client sends one. The
+    id is echoed in the response and attached to the request's records.
+    """
+    global _pipeline
+    level = logging.DEBUG if app.debug else getattr(logging, Config.LOG_LEVEL.upper(), logging.INFO)
+
+    console = logging.StreamHandler(sys.stderr)
+    console.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s')
+                         if app.debug else JsonFormatter())
+    handlers = [console]
+    if not app.debug:
+        log_dir = app.config['logs']
+        os.makedirs(log_dir, exist_ok=True)
+        file_handler = RotatingFileHandler(os.path.join(log_dir, 'sautis.log'),
+                                           maxBytes=Config.LOG_MAX_BYTES, backupCount=Config.LOG_BACKUP_COUNT)
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+
+    root = logging.getLogger()
+    if _pipeline is not None:
+        root.removeHandler(_pipeline)
+        _pipeline.stop()
+    else:
+        atexit.register(lambda: _pipeline is not None and _pipeline.stop())
+    _pipeline = PipelineHandler(handlers, 1.0 if app.debug else Config.LOG_DEBUG_SAMPLE_RATE)
+    root.addHandler(_pipeline)
+    root.setLevel(max(level, logging.INFO))  # third-party debug chatter stays off
+    app.logger.removeHandler(default_handler)
+    app.logger.setLevel(level)
+
+    @app.before_request
+    def assign_request_id():
+        request_id = request.headers.get('X-Request-ID', '')
+        g.request_id = request_id if _REQUEST_ID_RE.fullmatch(request_id) else uuid.uuid4().hex
+
+    @app.after_request
+    def echo_request_id(response):
+        request_id = g.get('request_id')
+        if request_id:
+            response.headers['X-Request-ID'] = request_id
+        return response
+
+    app.logger.info('Sautis startup')
@@ -0,0 +1,360 @@
+import heapq
+import json
+import os
+import queue
+import smtplib
+import socketserver
+import threading
+import time
+import uuid
+
+from flask import current_app
+from flask_mail import Message
+
+import metrics
+
+_MESSAGE_FIELDS = ('subject', 'recipients', 'body', 'html', 'sender', 'cc', 'bcc', 'reply_to')
+
+
+class MailDispatcher:
+    """Delivers Flask-Mail messages from background workers.
+
+    Messages are written to an on-disk spool before enqueue_mail() returns, so a
+    crash or restart only delays delivery. Each worker keeps its SMTP connection
+    open while there is work and sends queued messages in batches over it.
+
+    A claimed message sits in ``inflight`` under the claiming process's boot
+    nonce, with its mtime as a lease. Any process returns inflight files that
+    are not its own and older than ``lease`` seconds to ``pending``. It does
+    so when it starts and then every ``lease`` seconds, so mail claimed by a
+    process that died is sent even if that process's pid has been reused.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._queue = queue.Queue()
+        self._retry_heap = []
+        self._retry_cond = threading.Condition()
+        self._threads = []
+        self._pid = None
+        self._nonce = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('MAIL_QUEUE_ENABLED', True)
+        self.workers = app.config.get('MAIL_QUEUE_WORKERS', 2)
+        self.batch_size = app.config.get('MAIL_QUEUE_BATCH_SIZE', 20)
+        self.max_retries = app.config.get('MAIL_QUEUE_MAX_RETRIES', 5)
+        self.retry_backoff = app.config.get('MAIL_QUEUE_RETRY_BACKOFF', 2.0)
+        self.idle_timeout = app.config.get('MAIL_QUEUE_IDLE_TIMEOUT', 30.0)
+        self.lease = app.config.get('MAIL_QUEUE_LEASE', 300.0)
+        self.spool_dir = app.config.get('MAIL_SPOOL_DIR') or os.path.join(app.root_path, 'mail_spool')
+        for sub in ('pending', 'inflight', 'failed'):
+            os.makedirs(os.path.join(self.spool_dir, sub), exist_ok=True)
+        app.extensions['mail_dispatcher'] = self
+        if self.enabled:
+            # Deliver what the spool already holds without waiting for this process to enqueue.
+            # Forked workers have no threads yet, so each one starts its own on its first request.
+            self._ensure_started()
+            app.before_request(self._ensure_started)
+
+    # -- producer side -------------------------------------------------------
+
+    def enqueue(self, msg):
+        if not self.enabled:
+            _send(self.app.extensions['mail'].send, msg)
+            return None
+        self._ensure_started()
+        job = {field: getattr(msg, field) for field in _MESSAGE_FIELDS}
+        job.update(id=f"{time.time():.6f}-{uuid.uuid4().hex}", attempts=0, not_before=0)
+        self._write_job('pending', job)
+        self._queue.put(job['id'])
+        return job['id']
+
+    def _ensure_started(self):
+        # Worker threads do not survive fork(), so start them in whichever process sends first.
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._retry_heap = []
+            self._threads = [
+                threading.Thread(target=self._worker, name=f'mail-worker-{i}', daemon=True)
+                for i in range(self.workers)
+            ]
+            self._threads.append(threading.Thread(target=self._retry_loop, name='mail-retry', daemon=True))
+            self._nonce = uuid.uuid4().hex
+            self._pid = os.getpid()
+            self._recover_spool()
+            for thread in self._threads:
+                thread.start()
+
+    # -- spool ---------------------------------------------------------------
+
+    def _path(self, state, job_id):
+        return os.path.join(self.spool_dir, state, f'{job_id}.json')
+
+    def _write_job(self, state, job):
+        path = self._path(state, job['id'])
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(job, f)
+        os.replace(tmp, path)
+
+    def _inflight_path(self, job_id):
+        return self._path('inflight', f'{job_id}.{self._nonce}')
+
+    def _claim(self, job_id):
+        inflight = self._inflight_path(job_id)
+        try:
+            os.rename(self._path('pending', job_id), inflight)
+        except FileNotFoundError:
+            return None  # already sent, or claimed by another process
+        os.utime(inflight)  # start the lease
+        with open(inflight) as f:
+            return json.load(f)
+
+    def _recover_spool(self):
+        """Reclaim expired inflight mail, then schedule everything pending."""
+        self._reclaim_expired()
+        pending_dir = os.path.join(self.spool_dir, 'pending')
+        for name in sorted(os.listdir(pending_dir)):
+            if name.endswith('.json'):
+                self._schedule_file(os.path.join(pending_dir, name))
+
+    def _reclaim_expired(self):
+        """Move inflight mail whose lease has run out back to pending; returns the new pending paths."""
+        inflight_dir = os.path.join(self.spool_dir, 'inflight')
+        expired = time.time() - self.lease
+        reclaimed = []
+        for name in os.listdir(inflight_dir):
+            if not name.endswith('.json'):
+                continue
+            job_id, _, owner = name[:-len('.json')].rpartition('.')
+            if owner == self._nonce:
+                continue
+            path = os.path.join(inflight_dir, name)
+            try:
+                if os.path.getmtime(path) < expired:
+                    os.replace(path, self._path('pending', job_id))
+                    reclaimed.append(self._path('pending', job_id))
+            except FileNotFoundError:
+                continue  # sent, or reclaimed by another process
+        return reclaimed
+
+    def _schedule_file(self, path):
+        try:
+            with open(path) as f:
+                job = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._schedule(job)
+
+    # -- consumer side -------------------------------------------------------
+
+    def _schedule(self, job):
+        if job.get('not_before', 0) <= time.time():
+            self._queue.put(job['id'])
+            return
+        with self._retry_cond:
+            heapq.heappush(self._retry_heap, (job['not_before'], job['id']))
+            self._retry_cond.notify()
+
+    def _retry_loop(self):
+        next_recovery = time.time() + self.lease
+        while True:
+            job_id = None
+            with self._retry_cond:
+                while time.time() < next_recovery:
+                    if self._retry_heap and self._retry_heap[0][0] <= time.time():
+                        _, job_id = heapq.heappop(self._retry_heap)
+                        break
+                    wake = min(self._retry_heap[0][0], next_recovery) if self._retry_heap else next_recovery
+                    self._retry_cond.wait(wake - time.time())
+            if job_id is None:
+                # Pick up mail whose claiming process died while this one was running.
+                try:
+                    for path in self._reclaim_expired():
+                        self._schedule_file(path)
+                except OSError:
+                    self.app.logger.exception("Could not reclaim expired mail from the spool")
+                next_recovery = time.time() + self.lease
+            else:
+                self._queue.put(job_id)
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.idle_timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        with self.app.app_context():
+            mail = self.app.extensions['mail']
+            connection = None
+            while True:
+                batch = self._next_batch()
+                if not batch:
+                    connection = _close_quietly(connection)
+                    continue
+                for job_id in batch:
+                    job = self._claim(job_id)
+                    if job is None:
+                        continue
+                    try:
+                        if connection is None:
+                            connection = mail.connect().__enter__()
+                        _send(connection.send, self._build_message(job))
+                    except (smtplib.SMTPException, OSError) as error:
+                        connection = _close_quietly(connection)
+                        self._failed(job, error)
+                    except Exception as error:
+                        # Malformed message: retrying will not help.
+                        self._failed(job, error, permanent=True)
+                    else:
+                        os.remove(self._inflight_path(job['id']))
+                        with self._stats_lock:
+                            self.sent += 1
+
+    def _build_message(self, job):
+        return Message(**{field: job.get(field) for field in _MESSAGE_FIELDS})
+
+    def _failed(self, job, error, permanent=False):
+        inflight = self._inflight_path(job['id'])
+        job['attempts'] += 1
+        job['last_error'] = str(error)
+        if permanent or job['attempts'] > self.max_retries:
+            self.app.logger.error("Giving up on mail %s to %s: %s", job['id'], job['recipients'], error)
+            self._write_job('failed', job)
+            os.remove(inflight)
+            with self._stats_lock:
+                self.failed += 1
+            return
+        job['not_before'] = time.time() + self.retry_backoff * 2 ** (job['attempts'] - 1)
+        self.app.logger.warning("Mail %s failed (attempt %s), retrying: %s", job['id'], job['attempts'], error)
+        self._write_job('pending', job)
+        os.remove(inflight)
+        with self._stats_lock:
+            self.retried += 1
+        self._schedule(job)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "queued": self._queue.qsize(),
+                "scheduled_retries": len(self._retry_heap),
+                "sent": self.sent,
+                "failed": self.failed,
+                "retried": self.retried,
+            }
+
+
+def _send(send, msg):
+    if not metrics.ENABLED:
+        return send(msg)
+    started, outcome = time.perf_counter(), 'error'
+    try:
+        send(msg)
+        outcome = 'sent'
+    finally:
+        metrics.SMTP_SECONDS.observe(time.perf_counter() - started, outcome)
+
+
+def _close_quietly(connection):
+    if connection is not None:
+        try:
+            connection.__exit__(None, None, None)
+        except (smtplib.SMTPException, OSError):
+            pass
+    return None
+
+
+def enqueue_mail(msg):
+    dispatcher = current_app.extensions.get('mail_dispatcher')
+    if dispatcher is None:
+        _send(current_app.extensions['mail'].send, msg)
+    else:
+        dispatcher.enqueue(msg)
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.reply('220 localhost local SMTP sink')
+        envelope = {'from': None, 'to': []}
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command[:4].upper()
+            if verb in ('HELO', 'EHLO'):
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                envelope = {'from': command.split(':', 1)[1].strip(), 'to': []}
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                envelope['to'].append(command.split(':', 1)[1].strip())
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                for raw in iter(self.rfile.readline, b''):
+                    if raw in (b'.\r\n', b'.\n'):
+                        break
+                    data.append(raw[1:] if raw.startswith(b'..') else raw)
+                self.server.messages.append(dict(envelope, data=b''.join(data)))
+                self.reply('250 OK')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    """Minimal SMTP sink for tests and local development.
+
+    Point MAIL_SERVER/MAIL_PORT at it with MAIL_USE_TLS off; every accepted
+    message is kept in ``messages`` as a dict with from, to and raw data.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super().__init__((host, port), _SMTPHandler)
+        self.messages = []
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='local-smtp', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,216 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import Response, g, has_app_context, request
+from psycopg2.extensions import cursor as _cursor
+
+from config import Config
+
+ENABLED = Config.METRICS_ENABLED
+
+# Upper bounds, in seconds.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f'{self.name}{_labels(self.labels, labels)} {_number(value)}'
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 3)
+            series[bisect_left(self.buckets, value)] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            running = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                running += count
+                le = f'le="{bound}"'
+                yield f'{self.name}_bucket{_labels(self.labels, labels, le)} {running}'
+            yield f'{self.name}_sum{_labels(self.labels, labels)} {_number(series[-2])}'
+            yield f'{self.name}_count{_labels(self.labels, labels)} {series[-1]}'
+
+
+class Gauge:
+    """A value read at scrape time from ``read()``, which returns {label values: value}."""
+    kind = 'gauge'
+
+    def __init__(self, name, help, read, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.read = read
+
+    def samples(self):
+        for labels, value in sorted(self.read().items()):
+            yield f'{self.name}{_labels(self.labels, labels)} {_number(value)}'
+
+
+REGISTRY = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+REQUESTS = register(Counter(
+    'http_requests_total', 'Requests handled, by endpoint and status.', ('endpoint', 'method', 'status')))
+REQUEST_SECONDS = register(Histogram(
+    'http_request_duration_seconds', 'Time spent handling a request.', ('endpoint', 'method')))
+DB_QUERY_SECONDS = register(Histogram(
+    'db_query_duration_seconds', 'Time spent in a single database statement.'))
+DB_QUERIES_PER_REQUEST = register(Histogram(
+    'db_queries_per_request', 'Database statements run by one request.', ('endpoint',), COUNT_BUCKETS))
+DB_SECONDS_PER_REQUEST = register(Histogram(
+    'db_time_per_request_seconds', 'Time one request spent in database statements.', ('endpoint',)))
+POOL_WAIT_SECONDS = register(Histogram(
+    'db_pool_wait_seconds', 'Time spent waiting to check out a pooled connection.'))
+SMTP_SECONDS = register(Histogram(
+    'smtp_send_duration_seconds', 'Time spent handing one message to the SMTP server.', ('outcome',)))
+BCRYPT_SECONDS = register(Histogram(
+    'bcrypt_duration_seconds', 'Time spent hashing or verifying a password, queueing included.', ('operation',)))
+ADMISSION_REJECTED = register(Counter(
+    'admission_rejected_total', 'Requests turned away by a rate or concurrency limit.', ('limiter', 'reason')))
+
+
+def _pool_connections():
+    from db_pool import get_pool
+    stats = get_pool().stats()
+    return {(state,): stats[state] for state in ('size', 'idle', 'in_use', 'waiting')}
+
+
+POOL_CONNECTIONS = register(Gauge(
+    'db_pool_connections', 'Pooled connections by state.', _pool_connections, ('state',)))
+
+
+class TimedCursor(_cursor):
+    """psycopg2 cursor that records every statement's duration.
+
+    Installed as the pool's cursor_factory only when metrics are enabled.
+    Inside an app context the statement is also charged to the current
+    request.
+    """
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            _record_query(time.perf_counter() - started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            _record_query(time.perf_counter() - started)
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            _record_query(time.perf_counter() - started)
+
+
+def _record_query(elapsed):
+    DB_QUERY_SECONDS.observe(elapsed)
+    if has_app_context() and 'metrics_started' in g:
+        g.metrics_queries += 1
+        g.metrics_db_time += elapsed
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+def register_metrics(app):
+    """Time every request and serve the metrics at ``/metrics`` when METRICS_ENABLED is set.
+
+    Counts are per process; scrape each worker separately.
+    """
+    if not ENABLED:
+        return
+
+    @app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_db_time = 0.0
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        endpoint = request.url_rule.endpoint if request.url_rule is not None else 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint, request.method)
+        REQUESTS.inc(endpoint, request.method, str(response.status_code))
+        DB_QUERIES_PER_REQUEST.observe(g.metrics_queries, endpoint)
+        DB_SECONDS_PER_REQUEST.observe(g.metrics_db_time, endpoint)
+        return response
+
+    @app.route(Config.METRICS_PATH)
+    def metrics():
+        return Response(render(), mimetype='text/plain; version=0.0.4')
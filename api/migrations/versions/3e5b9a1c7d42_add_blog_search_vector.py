@@ -0,0 +1,34 @@
+"""Add full-text search vector and GIN index to blog
+
+Revision ID: 3e5b9a1c7d42
+Revises: 7c0dfc08ab3a
+Create Date: 2026-10-18 09:12:04.118233
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e5b9a1c7d42'
+down_revision = '7c0dfc08ab3a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Weights mirror search.FIELD_WEIGHTS: title (A) > author (B) > intro (C).
+    op.execute("""
+        ALTER TABLE blog ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(author, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(intro, '')), 'C')
+        ) STORED
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS blog_search_vector_idx ON blog USING GIN (search_vector)")
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS blog_search_vector_idx")
+    op.execute("ALTER TABLE blog DROP COLUMN IF EXISTS search_vector")
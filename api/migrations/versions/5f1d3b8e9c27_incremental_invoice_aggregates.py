@@ -0,0 +1,49 @@
+"""Invoice owner, per-user balance and incrementally maintained invoice totals
+
+Revision ID: 5f1d3b8e9c27
+Revises: e2b7c9d4a610
+Create Date: 2026-10-18 17:41:06.512873
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f1d3b8e9c27'
+down_revision = 'e2b7c9d4a610'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # No foreign key: bulk imports COPY user ids straight in, and an unknown
+    # id only means no balance is kept for it.
+    with op.batch_alter_table('invoices', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('user_id', sa.UUID(), nullable=True))
+        batch_op.create_index('invoices_user_id_idx', ['user_id'])
+    with op.batch_alter_table('userinfo1', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('invoice_balance', sa.Numeric(precision=14, scale=2),
+                                      server_default=sa.text('0'), nullable=False))
+    op.create_table('invoice_totals',
+        sa.Column('status', sa.String(length=50), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('invoice_count', sa.BigInteger(), server_default=sa.text('0'), nullable=False),
+        sa.Column('amount', sa.Numeric(precision=16, scale=2), server_default=sa.text('0'), nullable=False),
+        sa.PrimaryKeyConstraint('status', 'month')
+    )
+    # Existing invoices have no owner yet, so only the totals need a backfill.
+    op.execute("""
+        INSERT INTO invoice_totals (status, month, invoice_count, amount)
+        SELECT status, date_trunc('month', due_date)::date, count(*), sum(amount)
+        FROM invoices GROUP BY 1, 2
+    """)
+
+
+def downgrade():
+    op.drop_table('invoice_totals')
+    with op.batch_alter_table('userinfo1', schema=None) as batch_op:
+        batch_op.drop_column('invoice_balance')
+    with op.batch_alter_table('invoices', schema=None) as batch_op:
+        batch_op.drop_index('invoices_user_id_idx')
+        batch_op.drop_column('user_id')
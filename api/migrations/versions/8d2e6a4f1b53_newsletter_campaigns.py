@@ -0,0 +1,46 @@
+"""Newsletter campaigns with a resume checkpoint and per-address failures
+
+Revision ID: 8d2e6a4f1b53
+Revises: 5f1d3b8e9c27
+Create Date: 2026-10-18 19:02:37.144928
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2e6a4f1b53'
+down_revision = '5f1d3b8e9c27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('campaigns',
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('subject', sa.Text(), nullable=False),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('html', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(length=20), server_default=sa.text("'draft'"), nullable=False),
+        sa.Column('last_email', sa.String(length=100), nullable=True),
+        sa.Column('sent', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.Column('failed', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('campaign_failures',
+        sa.Column('campaign_id', sa.UUID(), nullable=False),
+        sa.Column('email', sa.String(length=100), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('failed_at', sa.DateTime(timezone=True), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+        sa.ForeignKeyConstraint(['campaign_id'], ['campaigns.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('campaign_id', 'email')
+    )
+
+
+def downgrade():
+    op.drop_table('campaign_failures')
+    op.drop_table('campaigns')
@@ -0,0 +1,35 @@
+"""Track revoked tokens by jti with an expiry
+
+Revision ID: 9a4d6f2e8b17
+Revises: 3e5b9a1c7d42
+Create Date: 2026-10-18 11:40:27.503911
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4d6f2e8b17'
+down_revision = '3e5b9a1c7d42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('blacklist_tokens', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('jti', sa.String(length=36), nullable=True))
+        batch_op.add_column(sa.Column('expires_at', sa.DateTime(), nullable=True))
+        batch_op.alter_column('token', existing_type=sa.TEXT(), nullable=True)
+        batch_op.create_unique_constraint('blacklist_tokens_jti_key', ['jti'])
+        batch_op.create_index('blacklist_tokens_expires_at_idx', ['expires_at'])
+
+
+def downgrade():
+    op.execute("DELETE FROM blacklist_tokens WHERE token IS NULL")
+    with op.batch_alter_table('blacklist_tokens', schema=None) as batch_op:
+        batch_op.drop_index('blacklist_tokens_expires_at_idx')
+        batch_op.drop_constraint('blacklist_tokens_jti_key', type_='unique')
+        batch_op.alter_column('token', existing_type=sa.TEXT(), nullable=False)
+        batch_op.drop_column('expires_at')
+        batch_op.drop_column('jti')
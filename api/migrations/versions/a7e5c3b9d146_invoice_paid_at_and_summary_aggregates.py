@@ -0,0 +1,51 @@
+"""Invoice paid_at and the aggregates behind the O(1) invoice summary
+
+Revision ID: a7e5c3b9d146
+Revises: d8c1f4a7e392
+Create Date: 2026-10-18 22:41:55.180934
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7e5c3b9d146'
+down_revision = 'd8c1f4a7e392'
+branch_labels = None
+depends_on = None
+
+
+def _totals_table(name, *keys):
+    op.create_table(name,
+        *keys,
+        sa.Column('invoice_count', sa.BigInteger(), server_default=sa.text('0'), nullable=False),
+        sa.Column('amount', sa.Numeric(precision=16, scale=2), server_default=sa.text('0'), nullable=False),
+        sa.PrimaryKeyConstraint(*(key.name for key in keys))
+    )
+
+
+def upgrade():
+    # When existing paid invoices were paid is unknown, so they start without paid_at.
+    with op.batch_alter_table('invoices', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('paid_at', sa.TIMESTAMP(timezone=True), nullable=True))
+    _totals_table('invoice_status_totals', sa.Column('status', sa.String(length=50), nullable=False))
+    _totals_table('invoice_paid_totals', sa.Column('month', sa.Date(), nullable=False))
+    _totals_table('invoice_open_totals', sa.Column('due_date', sa.Date(), nullable=False))
+    op.execute("""
+        INSERT INTO invoice_status_totals (status, invoice_count, amount)
+        SELECT status, count(*), sum(amount) FROM invoices GROUP BY 1
+    """)
+    op.execute("""
+        INSERT INTO invoice_open_totals (due_date, invoice_count, amount)
+        SELECT due_date, count(*), sum(amount) FROM invoices
+        WHERE status NOT IN ('paid', 'cancelled') GROUP BY 1
+    """)
+
+
+def downgrade():
+    op.drop_table('invoice_open_totals')
+    op.drop_table('invoice_paid_totals')
+    op.drop_table('invoice_status_totals')
+    with op.batch_alter_table('invoices', schema=None) as batch_op:
+        batch_op.drop_column('paid_at')
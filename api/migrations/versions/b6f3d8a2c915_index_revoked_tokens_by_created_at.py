@@ -0,0 +1,26 @@
+"""Index revoked tokens by created_at for the blocklist sync
+
+Revision ID: b6f3d8a2c915
+Revises: 8d2e6a4f1b53
+Create Date: 2026-10-18 21:14:52.318407
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6f3d8a2c915'
+down_revision = '8d2e6a4f1b53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('blacklist_tokens', schema=None) as batch_op:
+        batch_op.create_index('blacklist_tokens_created_at_idx', ['created_at'])
+
+
+def downgrade():
+    with op.batch_alter_table('blacklist_tokens', schema=None) as batch_op:
+        batch_op.drop_index('blacklist_tokens_created_at_idx')
@@ -0,0 +1,34 @@
+"""Add size, content hash and type to files
+
+Revision ID: c4e8a2f61b93
+Revises: 9a4d6f2e8b17
+Create Date: 2026-10-18 13:05:12.318410
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8a2f61b93'
+down_revision = '9a4d6f2e8b17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('size', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('sha256', sa.CHAR(length=64), nullable=True))
+        batch_op.add_column(sa.Column('content_type', sa.String(length=255), nullable=True))
+        batch_op.alter_column('filepath', existing_type=sa.VARCHAR(length=255), type_=sa.Text())
+        batch_op.create_index('files_sha256_idx', ['sha256'])
+
+
+def downgrade():
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.drop_index('files_sha256_idx')
+        batch_op.alter_column('filepath', existing_type=sa.Text(), type_=sa.VARCHAR(length=255))
+        batch_op.drop_column('content_type')
+        batch_op.drop_column('sha256')
+        batch_op.drop_column('size')
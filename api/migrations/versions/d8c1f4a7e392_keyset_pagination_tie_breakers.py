@@ -0,0 +1,40 @@
+"""Unique keyset order for the blog and contact listings
+
+Revision ID: d8c1f4a7e392
+Revises: b6f3d8a2c915
+Create Date: 2026-10-18 22:03:17.604211
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8c1f4a7e392'
+down_revision = 'b6f3d8a2c915'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Blog pages are ordered by (date, title, id); titles repeat, the id does not.
+    op.execute("CREATE INDEX IF NOT EXISTS blog_date_title_id_idx ON blog (date DESC, title DESC, id DESC)")
+
+    # Contact pages compare (contact_timestamp, uuid) rows, which never match a NULL.
+    # Rows saved without a timestamp go to the end of the newest-first listing.
+    op.execute("UPDATE contact SET uuid = gen_random_uuid() WHERE uuid IS NULL")
+    op.execute("UPDATE contact SET contact_timestamp = 'epoch' WHERE contact_timestamp IS NULL")
+    with op.batch_alter_table('contact', schema=None) as batch_op:
+        batch_op.alter_column('uuid', existing_type=sa.UUID(), nullable=False,
+                              server_default=sa.text('gen_random_uuid()'))
+        batch_op.alter_column('contact_timestamp', existing_type=sa.TIMESTAMP(), nullable=False,
+                              server_default=sa.text("(now() AT TIME ZONE 'utc')"))
+    op.execute("CREATE INDEX IF NOT EXISTS contact_timestamp_uuid_idx ON contact (contact_timestamp DESC, uuid DESC)")
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS contact_timestamp_uuid_idx")
+    with op.batch_alter_table('contact', schema=None) as batch_op:
+        batch_op.alter_column('contact_timestamp', existing_type=sa.TIMESTAMP(), nullable=True, server_default=None)
+        batch_op.alter_column('uuid', existing_type=sa.UUID(), nullable=True, server_default=None)
+    op.execute("DROP INDEX IF EXISTS blog_date_title_id_idx")
@@ -0,0 +1,36 @@
+"""Covering unique indexes for login lookups on userinfo1
+
+Revision ID: e2b7c9d4a610
+Revises: c4e8a2f61b93
+Create Date: 2026-10-18 14:22:48.907315
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b7c9d4a610'
+down_revision = 'c4e8a2f61b93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Login looks users up by email or phone number and only needs these
+    # columns, so both unique indexes carry them for index-only scans.
+    # Fails if phone numbers are already duplicated; resolve those first.
+    op.execute("""
+        ALTER TABLE userinfo1
+            DROP CONSTRAINT IF EXISTS userinfo1_email_key,
+            ADD CONSTRAINT userinfo1_email_key UNIQUE (email) INCLUDE (id, password, verified),
+            ADD CONSTRAINT userinfo1_phone_number_key UNIQUE (phone_number) INCLUDE (id, email, password, verified)
+    """)
+
+
+def downgrade():
+    op.execute("""
+        ALTER TABLE userinfo1
+            DROP CONSTRAINT userinfo1_phone_number_key,
+            DROP CONSTRAINT userinfo1_email_key,
+            ADD CONSTRAINT userinfo1_email_key UNIQUE (email)
+    """)
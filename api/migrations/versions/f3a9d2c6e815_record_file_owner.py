@@ -0,0 +1,32 @@
+"""Record who uploaded each file
+
+Revision ID: f3a9d2c6e815
+Revises: a7e5c3b9d146
+Create Date: 2026-10-18 23:52:37.604118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a9d2c6e815'
+down_revision = 'a7e5c3b9d146'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('owner', sa.UUID(), nullable=True))
+    # Profile images are the only uploads whose owner can be recovered; the
+    # rest stay reachable by content hash only.
+    op.execute("""
+        UPDATE files SET owner = u.id FROM userinfo1 u
+        WHERE files.owner IS NULL AND files.sha256 = u.profile_image
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.drop_column('owner')
@@ -0,0 +1,76 @@
+import base64
+import datetime
+import json
+from urllib.parse import urlencode
+
+from flask import request
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+class InvalidPageRequest(ValueError):
+    pass
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), default=_json_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidPageRequest("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidPageRequest("Invalid cursor")
+    return values
+
+
+def get_page_args(key_size):
+    """Read ``limit`` and ``cursor`` from the query string.
+
+    Returns the clamped limit and the decoded keyset values of the last row of
+    the previous page (or None for the first page).
+    """
+    limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+    limit = max(1, min(limit, MAX_LIMIT))
+    cursor = request.args.get('cursor')
+    return limit, decode_cursor(cursor, key_size) if cursor else None
+
+
+def get_fields(allowed):
+    """Parse ``fields=a,b`` against the allowed field names, keeping their order."""
+    raw = request.args.get('fields')
+    if not raw:
+        return list(allowed)
+    requested = {name.strip() for name in raw.split(',') if name.strip()}
+    unknown = requested - set(allowed)
+    if unknown:
+        raise InvalidPageRequest(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return [name for name in allowed if name in requested]
+
+
+def paginate(rows, limit, key):
+    """Trim a ``limit + 1`` row fetch to one page and build the next cursor."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(key(rows[-1]))
+
+
+def page_headers(next_cursor):
+    if not next_cursor:
+        return {}
+    args = request.args.to_dict()
+    args['cursor'] = next_cursor
+    next_url = f"{request.base_url}?{urlencode(args)}"
+    return {'X-Next-Cursor': next_cursor, 'Link': f'<{next_url}>; rel="next"'}
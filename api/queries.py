@@ -0,0 +1,208 @@
+import bisect
+import re
+import threading
+import time
+import weakref
+
+import psycopg2
+
+from config import Config
+from search import BLOG_COLUMNS
+
+STATEMENTS = {}
+
+# Upper bounds of the timing histogram buckets, in milliseconds.
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000)
+
+_PARAM_RE = re.compile(r'\$(\d+)')
+
+
+def register(name, sql):
+    """Add a statement to the registry; ``sql`` uses $1, $2... placeholders."""
+    if not name.isidentifier() or name in STATEMENTS:
+        raise ValueError(f"Invalid or duplicate statement name: {name}")
+    STATEMENTS[name] = sql
+    return name
+
+
+LOGIN_LOOKUP = register('login_lookup', """
+    (SELECT id, email, password, verified FROM userinfo1 WHERE email = $1)
+    UNION ALL
+    (SELECT id, email, password, verified FROM userinfo1 WHERE phone_number = $1)
+    LIMIT 1
+""")
+USERINFO_BY_ID = register('userinfo_by_id', """
+    SELECT id, name, email, phone_number, token, verified FROM userinfo1 WHERE id = $1
+""")
+# Titles are not unique, so id breaks ties; it is selected last for the cursor.
+BLOG_PAGE = register('blog_page', f"""
+    SELECT {BLOG_COLUMNS}, id FROM blog ORDER BY date DESC, title DESC, id DESC LIMIT $1
+""")
+BLOG_PAGE_AFTER = register('blog_page_after', f"""
+    SELECT {BLOG_COLUMNS}, id FROM blog WHERE (date, title, id) < ($1, $2, $3)
+    ORDER BY date DESC, title DESC, id DESC LIMIT $4
+""")
+BLOG_BY_TITLE = register('blog_by_title', f"""
+    SELECT {BLOG_COLUMNS} FROM blog WHERE title = $1
+""")
+BLOG_VIEWS = register('blog_views', """
+    SELECT views FROM blog WHERE title = $1
+""")
+BLOG_ADD_VIEWS = register('blog_add_views', """
+    UPDATE blog SET views = blog.views + v.n
+    FROM unnest($1::text[], $2::int[]) AS v(title, n)
+    WHERE blog.title = v.title
+    RETURNING blog.title, blog.views
+""")
+INVOICE_BY_ID = register('invoice_by_id', """
+    SELECT id, name, amount, due_date, status FROM invoices WHERE id = $1
+""")
+# Keys are sorted so concurrent writers lock totals rows in the same order.
+INVOICE_TOTALS_ADD = register('invoice_totals_add', """
+    INSERT INTO invoice_totals (status, month, invoice_count, amount)
+    SELECT * FROM unnest($1::text[], $2::date[], $3::bigint[], $4::numeric[]) ORDER BY 1, 2
+    ON CONFLICT (status, month) DO UPDATE
+    SET invoice_count = invoice_totals.invoice_count + EXCLUDED.invoice_count,
+        amount = invoice_totals.amount + EXCLUDED.amount
+""")
+INVOICE_STATUS_TOTALS_ADD = register('invoice_status_totals_add', """
+    INSERT INTO invoice_status_totals (status, invoice_count, amount)
+    SELECT * FROM unnest($1::text[], $2::bigint[], $3::numeric[])
+    ON CONFLICT (status) DO UPDATE
+    SET invoice_count = invoice_status_totals.invoice_count + EXCLUDED.invoice_count,
+        amount = invoice_status_totals.amount + EXCLUDED.amount
+""")
+INVOICE_PAID_TOTALS_ADD = register('invoice_paid_totals_add', """
+    INSERT INTO invoice_paid_totals (month, invoice_count, amount)
+    SELECT * FROM unnest($1::date[], $2::bigint[], $3::numeric[])
+    ON CONFLICT (month) DO UPDATE
+    SET invoice_count = invoice_paid_totals.invoice_count + EXCLUDED.invoice_count,
+        amount = invoice_paid_totals.amount + EXCLUDED.amount
+""")
+INVOICE_OPEN_TOTALS_ADD = register('invoice_open_totals_add', """
+    INSERT INTO invoice_open_totals (due_date, invoice_count, amount)
+    SELECT * FROM unnest($1::date[], $2::bigint[], $3::numeric[])
+    ON CONFLICT (due_date) DO UPDATE
+    SET invoice_count = invoice_open_totals.invoice_count + EXCLUDED.invoice_count,
+        amount = invoice_open_totals.amount + EXCLUDED.amount
+""")
+INVOICE_OPEN_TOTALS_PRUNE = register('invoice_open_totals_prune', """
+    DELETE FROM invoice_open_totals WHERE due_date = ANY($1::date[]) AND invoice_count = 0
+""")
+USER_BALANCE_ADD = register('user_balance_add', """
+    UPDATE userinfo1 SET invoice_balance = userinfo1.invoice_balance + d.delta
+    FROM unnest($1::text[], $2::numeric[]) AS d(id, delta)
+    WHERE userinfo1.id = d.id::uuid
+""")
+# Four status rows, one paid month and the open days already past due; never a scan of invoices.
+INVOICE_SUMMARY = register('invoice_summary', """
+    SELECT 'status', status, invoice_count, amount FROM invoice_status_totals
+    UNION ALL
+    SELECT 'paid_this_month', NULL, invoice_count, amount FROM invoice_paid_totals
+    WHERE month = date_trunc('month', CURRENT_DATE)::date
+    UNION ALL
+    SELECT 'overdue', NULL, coalesce(sum(invoice_count), 0)::bigint, coalesce(sum(amount), 0)
+    FROM invoice_open_totals WHERE due_date < CURRENT_DATE
+""")
+USER_BALANCE = register('user_balance', """
+    SELECT invoice_balance FROM userinfo1 WHERE id = $1
+""")
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+
+    def to_dict(self):
+        buckets, running = {}, 0
+        for bound, count in zip(BUCKETS_MS + ('+Inf',), self.counts):
+            running += count
+            buckets[str(bound)] = running
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "buckets": buckets,
+        }
+
+
+class StatementRegistry:
+    """Runs registered statements through server-side prepared statements.
+
+    Each statement is PREPAREd the first time it is used on a connection and
+    EXECUTEd by name afterwards, so Postgres parses and plans it once per
+    pooled connection instead of once per call. Prepared names are tracked
+    per connection and vanish with it. Timings are kept per statement and
+    phase: ``prepare``, ``execute``, or ``plain`` when preparation is off,
+    which makes the planner savings directly comparable.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._prepared = weakref.WeakKeyDictionary()
+        self._timings = {}
+        self._lock = threading.Lock()
+
+    def _observe(self, name, phase, started):
+        ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            histogram = self._timings.setdefault((name, phase), Histogram())
+            histogram.observe(ms)
+
+    def execute(self, cur, name, params=()):
+        sql = STATEMENTS[name]
+        if not self.enabled:
+            started = time.perf_counter()
+            cur.execute(_PARAM_RE.sub(r'%(p\1)s', sql), {f'p{i}': value for i, value in enumerate(params, 1)})
+            self._observe(name, 'plain', started)
+            return cur
+
+        conn = cur.connection
+        with self._lock:
+            prepared = self._prepared.setdefault(conn, set())
+        if name not in prepared:
+            started = time.perf_counter()
+            cur.execute(f"PREPARE {name} AS {sql}")
+            prepared.add(name)
+            self._observe(name, 'prepare', started)
+
+        started = time.perf_counter()
+        try:
+            if params:
+                cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+            else:
+                cur.execute(f"EXECUTE {name}")
+        except psycopg2.errors.InvalidSqlStatementName:
+            # The session lost it (DISCARD ALL, a pooler in between); prepare again next time.
+            prepared.discard(name)
+            raise
+        self._observe(name, 'execute', started)
+        return cur
+
+    def stats(self):
+        with self._lock:
+            result = {}
+            for (name, phase), histogram in sorted(self._timings.items()):
+                result.setdefault(name, {})[phase] = histogram.to_dict()
+            return {"enabled": self.enabled, "statements": result}
+
+
+_registry = None
+
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        _registry = StatementRegistry(enabled=Config.PREPARED_STATEMENTS)
+    return _registry
+
+
+def execute(cur, name, params=()):
+    return get_registry().execute(cur, name, params)
@@ -0,0 +1,283 @@
+import asyncio
+import functools
+import inspect
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from flask import jsonify, make_response, request
+
+import metrics
+from cache import create_redis_client
+from config import Config
+
+_PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+_SPEC_RE = re.compile(r'^\s*(\d+)\s*/\s*(\d*)\s*(second|minute|hour|day)s?\s*$')
+
+
+def parse_rate(spec):
+    """``'10/minute'`` or ``'5/15minutes'`` -> (tokens per second, burst)."""
+    match = _SPEC_RE.match(spec or '')
+    if not match:
+        raise ValueError(f"Invalid rate limit {spec!r}; expected e.g. '10/minute'")
+    count, multiple, period = int(match[1]), int(match[2] or 1), _PERIODS[match[3]]
+    return count / (multiple * period), count
+
+
+class TokenBucket:
+    """Allows ``rate`` acquisitions per second on average and ``burst`` at once."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """Take a token and return 0, or return the seconds until one is available."""
+        if self.rate <= 0:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+class LocalStore:
+    """Token buckets for this process only, least recently used evicted first."""
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(rate, burst)
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+        return bucket.try_acquire()
+
+
+class RedisStore:
+    """Token buckets shared by every worker, kept in Redis (or FakeRedis).
+
+    Each key holds the bucket's "theoretical arrival time" in milliseconds
+    (GCRA, which is equivalent to a token bucket). It is advanced with INCRBY,
+    so no script or transaction is needed. Only an idle key's reset to now is
+    a separate write, and racing resets at worst let one extra request in.
+    """
+
+    def __init__(self, client, prefix='sautis:ratelimit:'):
+        self.client = client
+        self.prefix = prefix
+
+    def take(self, key, rate, burst):
+        if rate <= 0:
+            return 0
+        key = self.prefix + key
+        interval = max(int(1000 / rate), 1)
+        now = int(time.time() * 1000)
+        tat = self.client.incr(key, interval)
+        if tat - interval < now:
+            # Idle long enough for the bucket to be full again.
+            tat = now + interval
+            self.client.set(key, tat, ex=interval // 1000 + 1)
+            return 0
+        if tat - now <= interval * burst:
+            # The key is only needed until the bucket has refilled.
+            self.client.expire(key, (tat - now) // 1000 + 1)
+            return 0
+        self.client.incr(key, -interval)
+        return (tat - now - interval * burst) / 1000
+
+
+class Overloaded(Exception):
+    pass
+
+
+class ConcurrencyLimiter:
+    """At most ``max_in_flight`` callers at once, then a bounded wait.
+
+    Up to ``max_queue`` more callers wait up to ``timeout`` seconds for a
+    slot. Anyone beyond that, or still waiting at the timeout, gets
+    Overloaded straight away instead of piling up on the worker's threads.
+    """
+
+    def __init__(self, max_in_flight, max_queue=0, timeout=1.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            if self.in_flight < self.max_in_flight:
+                self.in_flight += 1
+                return
+            if self.waiting >= self.max_queue:
+                raise Overloaded("Admission queue is full")
+            self.waiting += 1
+            try:
+                if not self._cond.wait_for(lambda: self.in_flight < self.max_in_flight, self.timeout):
+                    raise Overloaded("Timed out waiting for a free slot")
+                self.in_flight += 1
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {"in_flight": self.in_flight, "waiting": self.waiting, "max_in_flight": self.max_in_flight,
+                    "max_queue": self.max_queue}
+
+
+_store = None
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        if Config.RATELIMIT_STORAGE == 'redis':
+            _store = RedisStore(create_redis_client(Config.RATELIMIT_REDIS_URL))
+        else:
+            _store = LocalStore()
+    return _store
+
+
+def get_concurrency_limiter(name):
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = _limiters[name] = ConcurrencyLimiter(
+                Config.ADMISSION_MAX_IN_FLIGHT, Config.ADMISSION_MAX_QUEUE, Config.ADMISSION_QUEUE_TIMEOUT)
+        return limiter
+
+
+def client_ip():
+    return request.remote_addr or 'unknown'
+
+
+def json_field(field):
+    """Key function for limiting by a submitted identity (email, phone) instead of by address."""
+    def key():
+        data = request.get_json(silent=True)
+        value = data.get(field) if isinstance(data, dict) else None
+        return str(value).strip().lower() if value else None
+    return key
+
+
+def _rejected(name, reason, status, message, retry_after):
+    if metrics.ENABLED:
+        metrics.ADMISSION_REJECTED.inc(name, reason)
+    response = make_response(jsonify({"error": message}), status)
+    response.headers['Retry-After'] = str(max(math.ceil(retry_after), 1))
+    return response
+
+
+def rate_limit(name, spec, key=client_ip):
+    """Resource method decorator: one token bucket per ``key()`` value, 429 when it is empty.
+
+    ``spec`` is a rate such as ``'10/minute'``; requests whose key is None
+    are not limited. ``async def`` methods are wrapped with a coroutine that
+    takes the token off the event loop, since the Redis store does network I/O.
+    """
+    rate, burst = parse_rate(spec)
+
+    def check():
+        if Config.RATELIMIT_ENABLED:
+            identity = key()
+            if identity is not None:
+                wait = get_store().take(f'{name}:{identity}', rate, burst)
+                if wait:
+                    return _rejected(name, 'rate', 429, "Too many requests. Please try again later.", wait)
+        return None
+
+    def decorator(method):
+        if inspect.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def async_wrapper(*args, **kwargs):
+                rejected = await asyncio.to_thread(check)
+                if rejected is not None:
+                    return rejected
+                return await method(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            rejected = check()
+            if rejected is not None:
+                return rejected
+            return method(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _overloaded(name, limiter):
+    return _rejected(name, 'concurrency', 503, "Server is busy. Please try again shortly.", limiter.timeout)
+
+
+def limit_concurrency(name):
+    """Resource method decorator: bounded in-flight requests for ``name`` in this process, 503 beyond.
+
+    For ``async def`` methods the bounded wait for a slot happens on a worker
+    thread, not on the shared event loop.
+    """
+    def decorator(method):
+        if inspect.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def async_wrapper(*args, **kwargs):
+                if not Config.RATELIMIT_ENABLED:
+                    return await method(*args, **kwargs)
+                limiter = get_concurrency_limiter(name)
+                try:
+                    await asyncio.to_thread(limiter.acquire)
+                except Overloaded:
+                    return _overloaded(name, limiter)
+                try:
+                    return await method(*args, **kwargs)
+                finally:
+                    limiter.release()
+            return async_wrapper
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            if not Config.RATELIMIT_ENABLED:
+                return method(*args, **kwargs)
+            limiter = get_concurrency_limiter(name)
+            try:
+                limiter.acquire()
+            except Overloaded:
+                return _overloaded(name, limiter)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                limiter.release()
+        return wrapper
+    return decorator
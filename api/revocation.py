@@ -0,0 +1,179 @@
+import datetime
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from cache import LocalCache
+from config import Config
+from utils import db_connection
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.sha256(item.encode()).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:16], 'big') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item):
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class TokenBlocklist:
+    """Revoked JWT lookups that almost never touch the database.
+
+    A bloom filter holds every unexpired revoked jti this process knows of, so
+    the common case (token not revoked) is answered from memory. Bloom hits
+    are confirmed through an LRU and then the database, which also answers
+    every lookup until a first sync has succeeded. Revocations made by
+    other workers are pulled in incrementally every ``sync_interval`` seconds,
+    and expired rows are purged every ``compact_interval`` seconds.
+
+    Each sync re-reads rows created in the last ``sync_overlap`` seconds. A
+    row's created_at is its transaction's start, so a revocation that commits
+    after a sync but is stamped before it is still picked up, as long as its
+    transaction took less than the overlap.
+    """
+
+    def __init__(self, capacity=100000, error_rate=0.01, lru_size=10000,
+                 sync_interval=5.0, compact_interval=3600.0, sync_overlap=60.0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.compact_interval = compact_interval
+        self.sync_overlap = datetime.timedelta(seconds=sync_overlap)
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._lru = LocalCache(lru_size)
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._synced_since = None  # database time the next incremental sync reads from
+        self._revoked_during_rebuild = None
+        self._next_sync = 0.0
+        self._next_compact = time.monotonic() + compact_interval
+        self.db_lookups = 0
+
+    def _ttl(self, expires_at):
+        if expires_at is None:
+            return None
+        now = datetime.datetime.now(datetime.timezone.utc)
+        return max(1.0, (expires_at.replace(tzinfo=datetime.timezone.utc) - now).total_seconds())
+
+    def revoke(self, jti, expires_at):
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO blacklist_tokens (jti, expires_at) VALUES (%s, %s)
+                ON CONFLICT (jti) DO NOTHING
+            """, (jti, expires_at))
+            conn.commit()
+        with self._lock:
+            self._bloom.add(jti)
+            if self._revoked_during_rebuild is not None:
+                self._revoked_during_rebuild.append(jti)
+        self._lru.set(jti, True, self._ttl(expires_at))
+
+    def is_revoked(self, jti):
+        self._maybe_sync()
+        with self._lock:
+            # Until the first sync has loaded the table the filter proves nothing; ask the database.
+            if self._synced_since is not None and jti not in self._bloom:
+                return False
+        cached = self._lru.get(jti)
+        if cached is not None:
+            return cached
+        self.db_lookups += 1
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT expires_at FROM blacklist_tokens
+                WHERE jti = %s AND (expires_at IS NULL OR expires_at > (now() AT TIME ZONE 'utc'))
+            """, (jti,))
+            row = cur.fetchone()
+        if row is None:
+            # Bloom false positive (or not synced yet); a later revocation reaches us through _sync().
+            self._lru.set(jti, False, self.sync_interval)
+            return False
+        self._lru.set(jti, True, self._ttl(row[0]))
+        return True
+
+    def _maybe_sync(self):
+        now = time.monotonic()
+        if now < self._next_sync or not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            if now >= self._next_compact:
+                self.compact()
+                self._next_compact = now + self.compact_interval
+            self._sync()
+            self._next_sync = now + self.sync_interval
+        except Exception:
+            logger.exception("Failed to sync the token blocklist")
+            self._next_sync = now + self.sync_interval
+        finally:
+            self._sync_lock.release()
+
+    def _sync(self, full=False):
+        if full:
+            with self._lock:
+                self._revoked_during_rebuild = []
+        since = None if full else self._synced_since
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT localtimestamp")
+            synced_at = cur.fetchone()[0]
+            cur.execute("""
+                SELECT jti, expires_at FROM blacklist_tokens
+                WHERE (%(since)s::timestamp IS NULL OR created_at >= %(since)s) AND jti IS NOT NULL
+                AND (expires_at IS NULL OR expires_at > (now() AT TIME ZONE 'utc'))
+            """, {'since': since})
+            rows = cur.fetchall()
+        if full:
+            # Bloom filters cannot forget, so build a fresh one and swap it in.
+            bloom = BloomFilter(self.capacity, self.error_rate)
+            for jti, expires_at in rows:
+                bloom.add(jti)
+            with self._lock:
+                for jti in self._revoked_during_rebuild:
+                    bloom.add(jti)
+                self._revoked_during_rebuild = None
+                self._bloom = bloom
+        else:
+            with self._lock:
+                for jti, expires_at in rows:
+                    self._bloom.add(jti)
+        self._synced_since = synced_at - self.sync_overlap
+        for jti, expires_at in rows:
+            self._lru.set(jti, True, self._ttl(expires_at))
+
+    def compact(self):
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM blacklist_tokens WHERE expires_at <= (now() AT TIME ZONE 'utc')")
+            purged = cur.rowcount
+            conn.commit()
+        self._sync(full=True)
+        logger.info("Purged %d expired revoked tokens", purged)
+        return purged
+
+
+_blocklist = None
+
+
+def get_blocklist():
+    global _blocklist
+    if _blocklist is None:
+        _blocklist = TokenBlocklist(
+            capacity=Config.JWT_BLOCKLIST_CAPACITY,
+            sync_interval=Config.JWT_BLOCKLIST_SYNC_INTERVAL,
+            compact_interval=Config.JWT_BLOCKLIST_COMPACT_INTERVAL,
+        )
+    return _blocklist
@@ -9,6 +9,9 @@ from .feedback_blog_routes import feedback_ns
 from .userinfo_routes import user_ns
 from .invoice_routes import invoice_ns
 from .chat_routes import chat_ns
+from .file_routes import files_ns
+from config import Config
+import aio
 
 def initialize_routes(api, app, mail):
     api.add_namespace(auth_ns, path='/api/auth')
@@ -40,3 +43,14 @@ def initialize_routes(api, app, mail):
 
     api.add_namespace(chat_ns, path='/api')
     chat_ns.context = {'app': app, 'mail': mail}
+
+    api.add_namespace(files_ns, path='/api/files')
+    files_ns.context = {'app': app, 'mail': mail}
+
+    if Config.ASYNC_MODE:
+        if not aio.available():
+            app.logger.warning("ASYNC_MODE is set but asyncpg or aiosmtplib is not installed; /api/async is disabled")
+            return
+        from .async_routes import async_ns
+        api.add_namespace(async_ns, path='/api/async')
+        async_ns.context = {'app': app, 'mail': mail}
@@ -0,0 +1,111 @@
+import asyncio
+import datetime
+import uuid
+
+from flask import current_app, jsonify, request
+from flask_restx import Namespace, marshal
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+
+import queries
+from aio import AsyncResource, get_async_db, send_mail
+from config import Config
+from hashing import HashingBusy
+from mailer import enqueue_mail
+from pagination import InvalidPageRequest, get_page_args, page_headers, paginate
+from ratelimit import json_field, limit_concurrency, rate_limit
+from utils import check_password, hash_password, password_needs_rehash
+from .auth_routes import login_confirmation, login_response
+from .blog_routes import blog_model, blog_to_dict
+
+async_ns = Namespace('async', description='Asyncio versions of the I/O-bound endpoints (ASYNC_MODE)')
+
+
+@async_ns.route('/auth/login')
+class AsyncLogin(AsyncResource):
+    @rate_limit('login', Config.RATELIMIT_LOGIN)
+    @rate_limit('login-account', Config.RATELIMIT_LOGIN_ACCOUNT, key=json_field('emailOrPhone'))
+    @limit_concurrency('login')
+    async def post(self):
+        data = request.get_json(silent=True) or {}
+        if 'emailOrPhone' not in data or 'password' not in data:
+            return {"error": "Invalid request format. Missing required field."}, 400
+        password = data['password']
+
+        db = get_async_db()
+        rows = await db.statement(queries.LOGIN_LOOKUP, data['emailOrPhone'])
+        if not rows:
+            return {"error": "Invalid email/phone number"}, 401
+        user_id, email, hashed_password, verified = rows[0]
+        if verified != '1':
+            return {"error": "Account not verified. Please confirm your account using the instructions sent to your email."}, 403
+
+        try:
+            # bcrypt already runs in a process pool; the thread only waits for it.
+            if not await asyncio.to_thread(check_password, password, hashed_password):
+                return {"error": "Invalid password"}, 401
+            if password_needs_rehash(hashed_password):
+                new_hash = await asyncio.to_thread(hash_password, password)
+                await db.execute("UPDATE userinfo1 SET password = $1 WHERE id = $2", new_hash, user_id)
+        except HashingBusy:
+            return {"error": "Server is busy. Please try again shortly."}, 503
+
+        # With the queue off, enqueue_mail() would send over blocking SMTP on the shared loop.
+        dispatcher = current_app.extensions.get('mail_dispatcher')
+        if dispatcher is not None and dispatcher.enabled:
+            enqueue_mail(login_confirmation(email))
+        else:
+            await send_mail(login_confirmation(email))
+        return login_response(create_access_token(identity=str(user_id)))
+
+
+@async_ns.route('/userinfo')
+class AsyncUserInfo(AsyncResource):
+    @jwt_required()
+    async def get(self):
+        # asyncpg binds parameters by type and does not cast text the way psycopg2's literals do.
+        try:
+            user_id = uuid.UUID(get_jwt_identity())
+        except ValueError:
+            return {"error": "User not found"}, 404
+        rows = await get_async_db().statement(queries.USERINFO_BY_ID, user_id)
+        if not rows:
+            return {"error": "User not found"}, 404
+        user_id, name, email, phone_number, token, verified = rows[0]
+        return {"user_id": str(user_id), "name": name, "email": email, "phone_number": phone_number,
+                "token": token, "verified": verified}
+
+
+@async_ns.route('/blog')
+class AsyncBlogList(AsyncResource):
+    async def get(self):
+        try:
+            limit, after = get_page_args(3)
+            if after:
+                after = [datetime.date.fromisoformat(after[0]), after[1], int(after[2])]
+        except (InvalidPageRequest, TypeError, ValueError):
+            return {"error": "Invalid cursor"}, 400
+        db = get_async_db()
+        if after:
+            rows = await db.statement(queries.BLOG_PAGE_AFTER, *after, limit + 1)
+        else:
+            rows = await db.statement(queries.BLOG_PAGE, limit + 1)
+        rows, next_cursor = paginate(rows, limit, key=lambda row: (row['date'], row['title'], row['id']))
+        return marshal([blog_to_dict(row) for row in rows], blog_model), 200, page_headers(next_cursor)
+
+
+@async_ns.route('/blog/<string:title>')
+class AsyncBlog(AsyncResource):
+    async def get(self, title):
+        rows = await get_async_db().statement(queries.BLOG_BY_TITLE, title)
+        if not rows:
+            return {"error": "Blog post not found"}, 404
+        return marshal(blog_to_dict(rows[0]), blog_model)
+
+
+@async_ns.route('/get_invoice/<int:id>')
+class AsyncInvoice(AsyncResource):
+    async def get(self, id):
+        rows = await get_async_db().statement(queries.INVOICE_BY_ID, id)
+        if not rows:
+            return {'message': 'Invoice not found'}, 404
+        return jsonify(dict(rows[0]))
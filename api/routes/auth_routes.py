@@ -1,12 +1,18 @@
-from flask import jsonify, make_response, request, current_app
+from flask import jsonify, make_response, request, current_app, url_for
 from flask_restx import Namespace, Resource, fields
 from flask_mail import Message
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from mailer import enqueue_mail
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
 import psycopg2
-from utils import connect_db, check_password, hash_password
+import queries
+from utils import get_db, release_db, check_password, hash_password, password_needs_rehash, add_to_blacklist
+from hashing import HashingBusy
+from config import Config
+from ratelimit import json_field, limit_concurrency, rate_limit
+from storage import get_store
+from thumbnails import get_thumbnailer
+from uploads import cancel_upload, receive_upload, start_upload, upload_chunk, upload_status
 from datetime import datetime, timedelta
-from werkzeug.utils import secure_filename
-import os
 
 auth_ns = Namespace('auth', description='Authentication related operations')
 
@@ -15,72 +21,83 @@ login_model = auth_ns.model('Login', {
     'password': fields.String(required=True, description='Password of the user')
 })
 
+def login_confirmation(email):
+    return Message(
+        subject='Login Confirmation',
+        recipients=[email],
+        body='You have successfully logged in!'
+    )
+
+def login_response(access_token):
+    response_data = {"message": "Login successful", "access_token": access_token}
+    resp = make_response(jsonify(response_data), 200)
+
+    theme_cookie_value = 'light'
+    expires_date = datetime.utcnow() + timedelta(days=365)
+    resp.set_cookie('theme', value=theme_cookie_value, httponly=True, path='/', max_age=60*60*24*365, expires=expires_date)
+    resp.set_cookie('session', value=access_token, httponly=True, path='/', max_age=60*60*24*365, expires=expires_date)
+    return resp
+
 @auth_ns.route('/login')
 class LoginUser(Resource):
+    @rate_limit('login', Config.RATELIMIT_LOGIN)
+    @rate_limit('login-account', Config.RATELIMIT_LOGIN_ACCOUNT, key=json_field('emailOrPhone'))
+    @limit_concurrency('login')
     @auth_ns.expect(login_model)
     def post(self):
         try:
             data = request.get_json()
-            current_app.logger.debug(f"Login data received: {data}")
             email_or_phone = data['emailOrPhone']
             password = data['password']
+            current_app.logger.debug("Login attempt for %s", email_or_phone)
 
-            conn = connect_db()
-            cur = conn.cursor()
-
-            cur.execute("SELECT * FROM userinfo1 WHERE email = %s OR phone_number = %s", (email_or_phone, email_or_phone))
-            user = cur.fetchone()
-            current_app.logger.debug(f"User fetched from database: {user}")
+            with get_db().cursor() as cur:
+                # Two single-index lookups instead of an OR; both are answered from
+                # the covering unique indexes on email and phone_number.
+                queries.execute(cur, queries.LOGIN_LOOKUP, (email_or_phone,))
+                user = cur.fetchone()
+            release_db()  # don't hold a pooled connection through bcrypt
+            current_app.logger.debug("Login lookup found user: %s", user[0] if user else None)
 
             if not user:
                 current_app.logger.warning("Invalid email/phone number")
                 return make_response(jsonify({"error": "Invalid email/phone number"}), 401)
+            user_id, email, hashed_password, verified = user
 
-            if user[6] != '1':
+            if verified != '1':
                 current_app.logger.warning("Account not verified")
                 return make_response(jsonify({"error": "Account not verified. Please confirm your account using the instructions sent to your email."}), 403)
 
-            current_app.logger.debug(f"Hashed password in DB: {user[4]}")
-            if check_password(password, user[4]):
+            if not check_password(password, hashed_password):
                 current_app.logger.debug("Invalid password")
                 return make_response(jsonify({"error": "Invalid password"}), 401)
 
-            cur.close()
-            conn.close()
-
-            access_token = create_access_token(identity=user[0])
-            current_app.logger.debug(f"Access token created: {access_token}")
-
-            mail = current_app.extensions.get('mail')
-            if mail:
-                msg = Message(
-                    subject='Login Confirmation',
-                    recipients=[user[2]],
-                    body='You have successfully logged in!'
-                )
-                mail.send(msg)
-                current_app.logger.info("Login confirmation email sent successfully to: %s", user[2])
-            else:
-                current_app.logger.warning("Mail extension not found in app context")
-
-            response_data = {"message": "Login successful", "access_token": access_token}
-            resp = make_response(jsonify(response_data), 200)
+            if password_needs_rehash(hashed_password):
+                with get_db().cursor() as cur:
+                    cur.execute("UPDATE userinfo1 SET password = %s WHERE id = %s", (hash_password(password), user_id))
+                current_app.logger.info("Rehashed password for user %s with the configured bcrypt cost", user_id)
 
-            theme_cookie_value = 'light'
-            expires_date = datetime.utcnow() + timedelta(days=365)
-            resp.set_cookie('theme', value=theme_cookie_value, httponly=True, path='/', max_age=60*60*24*365, expires=expires_date)
-            resp.set_cookie('session', value=access_token, httponly=True, path='/', max_age=60*60*24*365, expires=expires_date)
+            access_token = create_access_token(identity=user_id)
 
-            current_app.logger.debug(f"Response prepared with cookies: {resp.headers.get('Set-Cookie')}")
+            if current_app.extensions.get('mail'):
+                enqueue_mail(login_confirmation(email))
+                current_app.logger.info("Login confirmation email queued for: %s", email)
+            else:
+                current_app.logger.warning("Mail extension not found in app context")
 
-            return resp
+            current_app.logger.debug("Login succeeded for user %s", user_id)
+            return login_response(access_token)
 
         except KeyError as key_error:
-            current_app.logger.error(f"KeyError during login: {str(key_error)}")
+            current_app.logger.error("KeyError during login: %s", key_error)
             return make_response(jsonify({"error": "Invalid request format. Missing required field."}), 400)
 
+        except HashingBusy:
+            current_app.logger.warning("Password hashing queue is full, rejecting login")
+            return make_response(jsonify({"error": "Server is busy. Please try again shortly."}), 503)
+
         except Exception as error:
-            current_app.logger.error(f"Error during login: {str(error)}")
+            current_app.logger.error("Error during login: %s", error)
             return make_response(jsonify({"error": "An internal error occurred. Please try again later."}), 500)
 
 @auth_ns.route('/logout')
@@ -88,16 +105,21 @@ class LogoutUser(Resource):
     @jwt_required() 
     def post(self):
         try:
+            token = get_jwt()
+            expires_at = datetime.utcfromtimestamp(token['exp']) if 'exp' in token else None
+            add_to_blacklist(token['jti'], expires_at)
+
             cookies_to_clear = ['theme', 'session']
             resp = make_response(jsonify({"message": "Logout successful"}), 200)
             for cookie in cookies_to_clear:
                 resp.set_cookie(cookie, '', expires=0)
-            current_app.logger.debug(f"Cookies cleared: {cookies_to_clear}")
+            current_app.logger.debug("Cookies cleared: %s", cookies_to_clear)
             return resp
 
         except Exception as error:
-            current_app.logger.error(f"Error during logout: {str(error)}")
-            return jsonify({"error": str(error)}), 500
+            # The token is still valid, so the client must not be told it logged out.
+            current_app.logger.error("Error during logout: %s", error)
+            return make_response(jsonify({"error": "Could not log out. Please try again later."}), 500)
 
 
 password_change_model = auth_ns.model('PasswordChange', {
@@ -116,35 +138,38 @@ class PasswordChange(Resource):
             email = data['email']
             current_password = data['current_password']
             new_password = data['new_password']
-            current_app.logger.debug(f"Password change request received: {data}")
 
             user_id = get_jwt_identity()
-            current_app.logger.debug(f"User ID from JWT: {user_id}")
+            current_app.logger.debug("User ID from JWT: %s", user_id)
 
-            conn = connect_db()
-            cur = conn.cursor()
-
-            cur.execute("SELECT password FROM userinfo1 WHERE email = %s", (email,))
-            user = cur.fetchone()
-            current_app.logger.debug(f"User fetched from database for password change: {user}")
+            with get_db().cursor() as cur:
+                cur.execute("SELECT password FROM userinfo1 WHERE email = %s", (email,))
+                user = cur.fetchone()
+            release_db()  # don't hold a pooled connection through bcrypt
+            current_app.logger.debug("Password change lookup found user: %s", user is not None)
 
             if not user or not check_password(current_password, user[0]):
                 current_app.logger.warning("Invalid current password")
-                return jsonify({"error": "Invalid current password"}), 401
+                return make_response(jsonify({"error": "Invalid current password"}), 401)
 
             new_password_hashed = hash_password(new_password)
-            cur.execute("UPDATE userinfo1 SET password = %s WHERE email = %s", (new_password_hashed, email))
+            with get_db().cursor() as cur:
+                # Only if the password is still the one just verified.
+                cur.execute("UPDATE userinfo1 SET password = %s WHERE email = %s AND password = %s",
+                            (new_password_hashed, email, user[0]))
+                if cur.rowcount == 0:
+                    return make_response(jsonify({"error": "Password was changed by another request. Please try again."}), 409)
 
-            conn.commit()
-            cur.close()
-            conn.close()
+            current_app.logger.debug("Password changed successfully for email: %s", email)
+            return make_response(jsonify({"message": "Password changed successfully"}), 200)
 
-            current_app.logger.debug(f"Password changed successfully for email: {email}")
-            return jsonify({"message": "Password changed successfully"}), 200
+        except HashingBusy:
+            current_app.logger.warning("Password hashing queue is full, rejecting password change")
+            return make_response(jsonify({"error": "Server is busy. Please try again shortly."}), 503)
 
         except Exception as error:
-            current_app.logger.error(f"Error during password change: {str(error)}")
-            return jsonify({"error": str(error)}), 500
+            current_app.logger.error("Error during password change: %s", error)
+            return make_response(jsonify({"error": str(error)}), 500)
 
 delete_model = auth_ns.model('DeleteUser', {
     'password': fields.String(required=True, description='Password of the user')
@@ -161,66 +186,76 @@ class DeleteAccount(Resource):
             password = data.get('password')
             
             if not password:
-                current_app.logger.warning(f"User {user_id} did not provide a password for deletion.")
+                current_app.logger.warning("User %s did not provide a password for deletion.", user_id)
                 return make_response(jsonify({"error": "Password is required"}), 400)
 
-            conn = connect_db()
-            cur = conn.cursor()
-            
-            cur.execute("SELECT password FROM userinfo1 WHERE id = %s", (user_id,))
-            user = cur.fetchone()
-            
+            with get_db().cursor() as cur:
+                cur.execute("SELECT password FROM userinfo1 WHERE id = %s", (user_id,))
+                user = cur.fetchone()
+            release_db()  # don't hold a pooled connection through bcrypt
+
             if not user:
-                current_app.logger.warning(f"User {user_id} not found in the database.")
+                current_app.logger.warning("User %s not found in the database.", user_id)
                 return make_response(jsonify({"error": "User not found"}), 404)
 
             if not check_password(password, user[0]):
-                current_app.logger.warning(f"User {user_id} provided an invalid password.")
+                current_app.logger.warning("User %s provided an invalid password.", user_id)
                 return make_response(jsonify({"error": "Invalid password"}), 401)
+
+            with get_db().cursor() as cur:
+                cur.execute("DELETE FROM userinfo1 WHERE id = %s AND password = %s", (user_id, user[0]))
+                if cur.rowcount == 0:
+                    return make_response(jsonify({"error": "Password was changed by another request. Please try again."}), 409)
             
-            cur.execute("DELETE FROM userinfo1 WHERE id = %s", (user_id,))
-            conn.commit()
-            
-            cur.close()
-            conn.close()
-            
-            current_app.logger.info(f"User {user_id} deleted their account successfully.")
-            return jsonify({"message": "Account deleted successfully"}), 200
+            current_app.logger.info("User %s deleted their account successfully.", user_id)
+            return make_response(jsonify({"message": "Account deleted successfully"}), 200)
+
+        except HashingBusy:
+            current_app.logger.warning("Password hashing queue is full, rejecting account deletion")
+            return make_response(jsonify({"error": "Server is busy. Please try again shortly."}), 503)
 
         except psycopg2.Error as db_error:
-            current_app.logger.error(f"Database error during account deletion for user {user_id}: {str(db_error)}")
+            current_app.logger.error("Database error during account deletion for user %s: %s", user_id, db_error)
             return make_response(jsonify({"error": "A database error occurred. Please try again later."}), 500)
         
         except Exception as error:
-            current_app.logger.error(f"Error during account deletion for user {user_id}: {str(error)}")
+            current_app.logger.error("Error during account deletion for user %s: %s", user_id, error)
             return make_response(jsonify({"error": "An internal error occurred. Please try again later."}), 500)
 
+def set_profile_image(cur, file_id, digest, content_type):
+    if not (content_type or '').startswith('image/'):
+        return None
+    cur.execute("UPDATE userinfo1 SET profile_image = %s WHERE id = %s", (digest, get_jwt_identity()))
+    thumbnailer = get_thumbnailer()
+    thumbnailer.generate_all(get_store().path_for(digest), digest)
+    return {"thumbnails": {size: url_for('files_thumbnail_download', digest=digest, size=size)
+                           for size in thumbnailer.sizes}}
+
+
 @auth_ns.route('/profile/upload')
 class FileUpload(Resource):
-    @jwt_required() 
+    @jwt_required()
     def post(self):
-        print('Received file upload request')
-        if 'file' not in request.files:
-            print('No file part in request')
-            return make_response(jsonify({"error": "No file part"}), 400)
-        file = request.files['file']
-        if file.filename == '':
-            print('No selected file in request')
-            return make_response(jsonify({"error": "No selected file"}), 400)
-        if file:
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
-            print(f'File saved to {filepath}')
-
-            conn = connect_db()
-            cur = conn.cursor()
-            try:
-                cur.execute("INSERT INTO files (filename, filepath) VALUES (%s, %s)", (filename, filepath))
-                conn.commit()
-                print('File details saved to database')
-            finally:
-                cur.close()
-                conn.close()
-
-            return make_response(jsonify({"message": "File uploaded successfully"}), 201)
+        return receive_upload(owner=get_jwt_identity(), on_stored=set_profile_image)
+
+
+@auth_ns.route('/profile/uploads')
+class ChunkedUploadList(Resource):
+    @jwt_required()
+    def post(self):
+        return start_upload('auth_chunked_upload', owner=get_jwt_identity())
+
+
+@auth_ns.route('/profile/uploads/<string:upload_id>')
+class ChunkedUpload(Resource):
+    @jwt_required()
+    def get(self, upload_id):
+        return upload_status(upload_id, owner=get_jwt_identity())
+
+    @jwt_required()
+    def patch(self, upload_id):
+        return upload_chunk(upload_id, owner=get_jwt_identity(), on_stored=set_profile_image)
+
+    @jwt_required()
+    def delete(self, upload_id):
+        return cancel_upload(upload_id, owner=get_jwt_identity())
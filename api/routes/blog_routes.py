@@ -1,7 +1,14 @@
 import datetime
 from flask import jsonify, request
-from flask_restx import Namespace, Resource, fields
-from utils import connect_db
+from flask_restx import Namespace, Resource, fields, marshal
+import queries
+from utils import get_db
+from search import BLOG_COLUMNS, get_blog_search
+from pagination import InvalidPageRequest, encode_cursor, get_fields, get_page_args, page_headers, paginate
+from streaming import export_format, stream_query
+from flask_jwt_extended import jwt_required
+from cache import cached_response, invalidate, request_key
+from view_counter import get_view_counter
 
 blog_ns = Namespace('blog', description='Blog operations')
 
@@ -18,122 +25,146 @@ blog_model = blog_ns.model('Blog', {
     'views': fields.Integer(description='The number of views of the blog post')
 })
 
+BLOG_FIELDS = BLOG_COLUMNS.split(', ')
+
+def blog_to_dict(blog, columns=BLOG_FIELDS):
+    blog = dict(zip(columns, blog))
+    if blog.get('date') is not None:
+        blog['date'] = blog['date'].strftime('%Y-%m-%d')
+    return blog
+
 @blog_ns.route('/blog')
 class BlogList(Resource):
-    @blog_ns.marshal_list_with(blog_model)
+    @blog_ns.doc(params={
+        'query': 'Search terms (prefix matched, results ranked)',
+        'limit': 'Page size',
+        'cursor': 'X-Next-Cursor value from the previous page',
+        'fields': 'Comma-separated fields to return, e.g. title,author,intro',
+    })
+    @blog_ns.response(200, 'Success', [blog_model])
+    @blog_ns.response(304, 'Not modified (If-None-Match matched the ETag)')
     def get(self):
+        return cached_response('blog', f'list:{request_key()}', self._list)
+
+    def _list(self):
         try:
             query = request.args.get('query', '')
-            conn = connect_db()
-            cur = conn.cursor()
-            if query:
-                cur.execute("""
-                    SELECT title, image, author, date, intro, content_section, list, conclusion, views 
-                    FROM blog 
-                    WHERE title ILIKE %s 
-                    OR author ILIKE %s 
-                    OR intro ILIKE %s
-                """, (f'%{query}%', f'%{query}%', f'%{query}%'))
-            else:
-                cur.execute("SELECT title, image, author, date, intro, content_section, list, conclusion, views FROM blog")
-
-            blogs = cur.fetchall()
-            cur.close()
-            conn.close()
-
-            blog_list = [
-                {
-                    "title": blog[0],
-                    "image": blog[1],
-                    "author": blog[2],
-                    "date": blog[3].strftime('%Y-%m-%d'),
-                    "intro": blog[4],
-                    "content_section": blog[5],
-                    "list": blog[6],
-                    "conclusion": blog[7],
-                    "views": blog[8]
-                }
-                for blog in blogs
-            ]
-
-            return blog_list
+            fields = get_fields(BLOG_FIELDS)
+            with get_db().cursor() as cur:
+                if query:
+                    # Ranked results have no stable key, so the cursor is an offset.
+                    limit, after = get_page_args(1)
+                    offset = after[0] if after else 0
+                    if not isinstance(offset, int) or offset < 0:
+                        raise InvalidPageRequest("Invalid cursor")
+                    rows, total = get_blog_search().search(cur, query, limit, offset)
+                    next_cursor = encode_cursor([offset + limit]) if offset + limit < total else None
+                    blogs = [blog_to_dict(row) for row in rows]
+                    headers = {'X-Total-Count': str(total), **page_headers(next_cursor)}
+                else:
+                    limit, after = get_page_args(3)
+                    if after and not isinstance(after[2], int):
+                        raise InvalidPageRequest("Invalid cursor")
+                    columns = [f for f in BLOG_FIELDS if f in fields or f in ('title', 'date')]
+                    if columns == BLOG_FIELDS:
+                        queries.execute(cur, queries.BLOG_PAGE_AFTER if after else queries.BLOG_PAGE,
+                                        (*(after or ()), limit + 1))
+                    else:
+                        where = "WHERE (date, title, id) < (%s, %s, %s)" if after else ""
+                        cur.execute(
+                            f"SELECT {', '.join(columns)}, id FROM blog {where} "
+                            f"ORDER BY date DESC, title DESC, id DESC LIMIT %s",
+                            (*(after or ()), limit + 1))
+                    # Rows end with the id, which blog_to_dict leaves out.
+                    rows, next_cursor = paginate(cur.fetchall(), limit,
+                                                 key=lambda row: (row[columns.index('date')], row[0], row[-1]))
+                    blogs = [blog_to_dict(row, columns) for row in rows]
+                    headers = page_headers(next_cursor)
+
+            return marshal(blogs, {f: blog_model[f] for f in fields}), 200, headers
+
+        except InvalidPageRequest as e:
+            return {"error": str(e)}, 400, {}
 
         except Exception as e:
-            return {"error": "An unexpected error occurred"}, 500
+            return {"error": "An unexpected error occurred"}, 500, {}
 
     @blog_ns.expect(blog_model)
     @blog_ns.marshal_with(blog_model)
     def post(self):
         try:
             data = request.json
-            conn = connect_db()
-            cur = conn.cursor()
-            cur.execute("""
-                INSERT INTO blog (title, image, author, date, intro, content_section, list, conclusion)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING title, image, author, date, intro, content_section, list, conclusion, views
-            """, (
-                data['title'], data['image'], data['author'], datetime.datetime.now(), 
-                data['intro'], data['content_section'], data['list'], data['conclusion']
-            ))
-            new_blog = cur.fetchone()
-            conn.commit()
-            cur.close()
-            conn.close()
+            with get_db().cursor() as cur:
+                cur.execute("""
+                    INSERT INTO blog (title, image, author, date, intro, content_section, list, conclusion)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    RETURNING title, image, author, date, intro, content_section, list, conclusion, views
+                """, (
+                    data['title'], data['image'], data['author'], datetime.datetime.now(), 
+                    data['intro'], data['content_section'], data['list'], data['conclusion']
+                ))
+                new_blog = cur.fetchone()
+                get_db().commit()
 
             if new_blog:
-                return {
-                    "title": new_blog[0],
-                    "image": new_blog[1],
-                    "author": new_blog[2],
-                    "date": new_blog[3].strftime('%Y-%m-%d'),
-                    "intro": new_blog[4],
-                    "content_section": new_blog[5],
-                    "list": new_blog[6],
-                    "conclusion": new_blog[7],
-                    "views": new_blog[8]
-                }, 201
+                get_blog_search().index(new_blog)
+                invalidate('blog')
+                return blog_to_dict(new_blog), 201
             else:
                 return {"error": "Failed to create blog post"}, 500
 
         except Exception as e:
             return {"error": "An unexpected error occurred"}, 500
 
+@blog_ns.route('/export/blog')
+class BlogExport(Resource):
+    @blog_ns.doc(params={'format': 'json (default), ndjson or csv'})
+    @jwt_required()
+    def get(self):
+        return stream_query(
+            f"SELECT {BLOG_COLUMNS} FROM blog ORDER BY date DESC, title DESC",
+            (), blog_to_dict, export_format(), filename='blog')
+
 @blog_ns.route('/blog/<string:title>')
 class BlogUpdate(Resource):
+    @blog_ns.response(200, 'Success', blog_model)
+    @blog_ns.response(304, 'Not modified (If-None-Match matched the ETag)')
+    def get(self, title):
+        return cached_response('blog', f'detail:{title}', lambda: self._detail(title))
+
+    def _detail(self, title):
+        try:
+            with get_db().cursor() as cur:
+                queries.execute(cur, queries.BLOG_BY_TITLE, (title,))
+                blog = cur.fetchone()
+            if blog:
+                return marshal(blog_to_dict(blog), blog_model), 200, {}
+            return {"error": "Blog post not found"}, 404, {}
+        except Exception as e:
+            return {"error": "An unexpected error occurred"}, 500, {}
+
     @blog_ns.expect(blog_model)
     @blog_ns.marshal_with(blog_model)
     def put(self, title):
         try:
             data = request.json
-            conn = connect_db()
-            cur = conn.cursor()
-            cur.execute("""
-                UPDATE blog 
-                SET image = %s, author = %s, date = %s, intro = %s, content_section = %s, list = %s, conclusion = %s
-                WHERE title = %s
-                RETURNING title, image, author, date, intro, content_section, list, conclusion, views
-            """, (
-                data['image'], data['author'], datetime.datetime.now(), 
-                data['intro'], data['content_section'], data['list'], data['conclusion'], title
-            ))
-            updated_blog = cur.fetchone()
-            conn.commit()
-            cur.close()
-            conn.close()
+            with get_db().cursor() as cur:
+                cur.execute("""
+                    UPDATE blog 
+                    SET image = %s, author = %s, date = %s, intro = %s, content_section = %s, list = %s, conclusion = %s
+                    WHERE title = %s
+                    RETURNING title, image, author, date, intro, content_section, list, conclusion, views
+                """, (
+                    data['image'], data['author'], datetime.datetime.now(), 
+                    data['intro'], data['content_section'], data['list'], data['conclusion'], title
+                ))
+                updated_blog = cur.fetchone()
+                get_db().commit()
 
             if updated_blog:
-                return {
-                    "title": updated_blog[0],
-                    "image": updated_blog[1],
-                    "author": updated_blog[2],
-                    "date": updated_blog[3].strftime('%Y-%m-%d'),
-                    "intro": updated_blog[4],
-                    "content_section": updated_blog[5],
-                    "list": updated_blog[6],
-                    "conclusion": updated_blog[7],
-                    "views": updated_blog[8]
-                }
+                get_blog_search().index(updated_blog)
+                invalidate('blog')
+                return blog_to_dict(updated_blog)
             else:
                 return {"error": "Blog post not found"}, 404
 
@@ -142,12 +173,12 @@ class BlogUpdate(Resource):
 
     def delete(self, title):
         try:
-            conn = connect_db()
-            cur = conn.cursor()
-            cur.execute("DELETE FROM blog WHERE title = %s", (title,))
-            conn.commit()
-            cur.close()
-            conn.close()
+            with get_db().cursor() as cur:
+                cur.execute("DELETE FROM blog WHERE title = %s", (title,))
+                get_db().commit()
+            get_blog_search().remove(title)
+            get_view_counter().forget(title)
+            invalidate('blog')
             return {"message": f"Blog post '{title}' deleted successfully"}, 200
         except Exception as e:
             return {"error": "An unexpected error occurred"}, 500
@@ -156,21 +187,9 @@ class BlogUpdate(Resource):
 class BlogViews(Resource):
     def put(self, title):
         try:
-            conn = connect_db()
-            cur = conn.cursor()
-            cur.execute("""
-                UPDATE blog 
-                SET views = views + 1 
-                WHERE title = %s
-                RETURNING views
-            """, (title,))
-            updated_views = cur.fetchone()
-            conn.commit()
-            cur.close()
-            conn.close()
-
-            if updated_views:
-                return {"views": updated_views[0]}, 200
+            views = get_view_counter().increment(title)
+            if views is not None:
+                return {"views": views}, 200
             else:
                 return {"error": "Blog post not found"}, 404
 
@@ -1,10 +1,16 @@
 import datetime
 import uuid
 from typing import Any, Dict, Union
-from flask import jsonify, request, current_app, Response
+from flask import jsonify, make_response, request, current_app, Response
 from flask_restx import Namespace, Resource, fields
 from flask_mail import Message
-from utils import connect_db  # Adjust imports based on your project structure
+from mailer import enqueue_mail
+from utils import get_db  # Adjust imports based on your project structure
+from pagination import InvalidPageRequest, get_fields, get_page_args, page_headers, paginate
+from streaming import export_format, stream_query
+from flask_jwt_extended import jwt_required
+from config import Config
+from ratelimit import limit_concurrency, rate_limit
 
 contact_ns: Namespace = Namespace('contactus', description='Contact form submission operations')
 
@@ -19,6 +25,8 @@ def get_current_utc_time() -> datetime.datetime:
 
 @contact_ns.route('/contact')
 class ContactSubmit(Resource):
+    @rate_limit('contact', Config.RATELIMIT_CONTACT)
+    @limit_concurrency('contact')
     @contact_ns.marshal_list_with(contact_model)
     def post(self) -> Union[Response, Any]:
         try:
@@ -31,17 +39,13 @@ class ContactSubmit(Resource):
             if not name or not email or not message:
                 raise ValueError("Name, Email, or Message is missing")
 
-            conn = connect_db()
-            cur = conn.cursor()
+            with get_db().cursor() as cur:
+                cur.execute("""
+                    INSERT INTO contact (email, message, uuid, contact_timestamp)
+                    VALUES (%s, %s, %s, %s)
+                """, (email, message, str(uuid.uuid4()), get_current_utc_time()))
 
-            cur.execute("""
-                INSERT INTO contact (email, message, uuid, contact_timestamp)
-                VALUES (%s, %s, %s, %s)
-            """, (email, message, str(uuid.uuid4()), get_current_utc_time()))
-
-            conn.commit()
-            cur.close()
-            conn.close()
+                get_db().commit()
 
             mail = current_app.extensions.get('mail')
             if not mail:
@@ -57,7 +61,7 @@ class ContactSubmit(Resource):
                 recipients=[contact_email],
                 body=f'Name: {name}\nEmail: {email}\nMessage:\n{message}'
             )
-            mail.send(msg)
+            enqueue_mail(msg)
 
             # Send confirmation email to the submitter
             confirm_msg = Message(
@@ -65,7 +69,7 @@ class ContactSubmit(Resource):
                 recipients=[email],
                 body=f'Thank you {name},\n\nWe have received your message and will get back to you shortly.\n\nYour message:\n{message}'
             )
-            mail.send(confirm_msg)
+            enqueue_mail(confirm_msg)
 
             current_app.logger.info("Contact form submitted successfully by: %s", email)
 
@@ -84,41 +88,65 @@ class ContactSubmit(Resource):
             response.status_code = 500
             return response
 
+MESSAGE_FIELDS = ['uuid', 'email', 'message', 'contact_timestamp']
+
 @contact_ns.route('/messages')
 class GetMessages(Resource):
+    @contact_ns.doc(params={
+        'limit': 'Page size',
+        'cursor': 'X-Next-Cursor value from the previous page',
+        'fields': 'Comma-separated fields to return',
+    })
     def get(self):
         try:
-            conn = connect_db()
-            cur = conn.cursor()
-            cur.execute("SELECT uuid, email, message, contact_timestamp FROM contact ORDER BY contact_timestamp DESC")
-            messages = cur.fetchall()
-            cur.close()
-            conn.close()
-
-            result = [
-                {
-                    "uuid": str(row[0]),
-                    "email": row[1],
-                    "message": row[2],
-                    "contact_timestamp": row[3].isoformat()
-                } for row in messages
-            ]
-            return jsonify(result)
+            fields = get_fields(MESSAGE_FIELDS)
+            limit, after = get_page_args(2)
+            where = "WHERE (contact_timestamp, uuid) < (%s, %s)" if after else ""
+            with get_db().cursor() as cur:
+                cur.execute(f"""
+                    SELECT uuid, email, message, contact_timestamp FROM contact {where}
+                    ORDER BY contact_timestamp DESC, uuid DESC LIMIT %s
+                """, (*(after or ()), limit + 1))
+                messages, next_cursor = paginate(cur.fetchall(), limit, key=lambda row: (row[3], str(row[0])))
+
+            result = [message_to_dict(row) for row in messages]
+            if len(fields) < len(MESSAGE_FIELDS):
+                result = [{f: item[f] for f in fields} for item in result]
+            response = jsonify(result)
+            response.headers.update(page_headers(next_cursor))
+            return response
+        except InvalidPageRequest as e:
+            response = jsonify({"error": str(e)})
+            response.status_code = 400
+            return response
         except Exception as e:
             current_app.logger.exception("Failed to fetch messages")
-            return jsonify({"error": "Failed to fetch messages"}), 500
+            return make_response(jsonify({"error": "Failed to fetch messages"}), 500)
+
+def message_to_dict(row):
+    return {
+        "uuid": str(row[0]),
+        "email": row[1],
+        "message": row[2],
+        "contact_timestamp": row[3].isoformat()
+    }
+
+@contact_ns.route('/export/messages')
+class ExportMessages(Resource):
+    @contact_ns.doc(params={'format': 'json (default), ndjson or csv'})
+    @jwt_required()
+    def get(self):
+        return stream_query(
+            "SELECT uuid, email, message, contact_timestamp FROM contact ORDER BY contact_timestamp DESC",
+            (), message_to_dict, export_format(), filename='messages')
 
 @contact_ns.route('/message/<string:message_id>')
 class DeleteMessage(Resource):
     def delete(self, message_id):
         try:
-            conn = connect_db()
-            cur = conn.cursor()
-            cur.execute("DELETE FROM contact WHERE uuid = %s", (message_id,))
-            conn.commit()
-            cur.close()
-            conn.close()
+            with get_db().cursor() as cur:
+                cur.execute("DELETE FROM contact WHERE uuid = %s", (message_id,))
             return jsonify({"message": "Message deleted successfully"})
         except Exception as e:
             current_app.logger.exception("Failed to delete message")
-            return jsonify({"error": "Failed to delete message"}), 500
+            return make_response(jsonify({"error": "Failed to delete message"}), 500)
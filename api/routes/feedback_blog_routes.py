@@ -1,7 +1,7 @@
-from flask import jsonify, request, current_app
+from flask import jsonify, make_response, request, current_app
 from flask_restx import Namespace, Resource, fields
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from utils import connect_db
+from utils import get_db
 
 feedback_ns = Namespace('feedback', description='Feedback related operations')
 
@@ -27,24 +27,19 @@ class FeedbackBlog(Resource):
             comment = data.get('comment', None)
             user_id = get_jwt_identity()
 
-            conn = connect_db()
-            cur = conn.cursor()
+            with get_db().cursor() as cur:
+                cur.execute("""
+                    INSERT INTO feedback_blog (blog_id, user_id, like, dislike, error, comment)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    RETURNING id
+                """, (blog_id, user_id, like, dislike, error, comment))
 
-            cur.execute("""
-                INSERT INTO feedback_blog (blog_id, user_id, like, dislike, error, comment)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                RETURNING id
-            """, (blog_id, user_id, like, dislike, error, comment))
+                feedback_id = cur.fetchone()[0]
 
-            feedback_id = cur.fetchone()[0]
-            conn.commit()
-            cur.close()
-            conn.close()
-
-            return jsonify({"message": "Feedback submitted successfully", "feedback_id": feedback_id}), 200
+            return make_response(jsonify({"message": "Feedback submitted successfully", "feedback_id": feedback_id}), 200)
 
         except Exception as e:
             current_app.logger.error("Error submitting feedback: %s", str(e))
-            return jsonify({"error": "An unexpected error occurred"}), 500
+            return make_response(jsonify({"error": "An unexpected error occurred"}), 500)
 
 
@@ -0,0 +1,105 @@
+# routes/file_routes.py
+import os
+from flask import current_app, jsonify, make_response, request, send_file
+from flask_jwt_extended import get_jwt_identity, jwt_required
+from flask_restx import Namespace, Resource
+from config import Config
+from storage import get_store
+from thumbnails import ThumbnailUnavailable, get_thumbnailer
+from utils import get_db
+
+files_ns = Namespace('files', description='Serve uploaded files')
+
+FILE_MAX_AGE = 365 * 24 * 3600
+
+
+def serve_file(path, etag=None, filename=None, content_type=None, last_modified=None):
+    """Send a stored file with Range, ETag and Last-Modified support.
+
+    The body is handed to the server's ``wsgi.file_wrapper`` (sendfile under
+    gunicorn) rather than read into Python. Anything addressed by content
+    hash (``etag``) never changes, so it is cacheable for a year. With
+    FILES_ACCEL_REDIRECT set the response carries only headers and nginx
+    sends the file itself.
+    """
+    if not os.path.isfile(path):
+        return make_response(jsonify({"error": "File not found"}), 404)
+    as_attachment = request.args.get('download') == '1'
+
+    accel_prefix = Config.FILES_ACCEL_REDIRECT
+    store = get_store()
+    relpath = os.path.relpath(path, store.root)
+    if accel_prefix and etag and not relpath.startswith(os.pardir):
+        response = current_app.response_class(mimetype=content_type or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + relpath
+        if as_attachment or filename:
+            response.headers.set('Content-Disposition', 'attachment' if as_attachment else 'inline',
+                                 filename=filename or os.path.basename(path))
+        response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        response.make_conditional(request)  # ranges are left to nginx
+    else:
+        response = send_file(path, mimetype=content_type, as_attachment=as_attachment,
+                             download_name=filename, conditional=True,
+                             etag=etag or True, last_modified=last_modified,
+                             max_age=FILE_MAX_AGE if etag else None)
+    if etag:
+        response.cache_control.public = True
+        response.cache_control.max_age = FILE_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+
+def stored_file(digest):
+    if len(digest) != 64 or not all(c in '0123456789abcdef' for c in digest):
+        return None
+    with get_db().cursor() as cur:
+        cur.execute("""
+            SELECT filename, content_type, timestamp FROM files
+            WHERE sha256 = %s ORDER BY id LIMIT 1
+        """, (digest,))
+        return cur.fetchone()
+
+
+@files_ns.route('/<int:file_id>')
+class FileDownload(Resource):
+    @jwt_required()
+    def get(self, file_id):
+        # Ids are sequential, so they are only good for the uploader; share the /sha256/ URL instead.
+        with get_db().cursor() as cur:
+            cur.execute("""
+                SELECT filename, filepath, sha256, content_type, timestamp FROM files
+                WHERE id = %s AND owner = %s
+            """, (file_id, get_jwt_identity()))
+            row = cur.fetchone()
+        if row is None:
+            return make_response(jsonify({"error": "File not found"}), 404)
+        filename, filepath, digest, content_type, timestamp = row
+        return serve_file(filepath, digest, filename, content_type, timestamp)
+
+
+@files_ns.route('/sha256/<string:digest>')
+class ContentDownload(Resource):
+    def get(self, digest):
+        row = stored_file(digest)
+        if row is None:
+            return make_response(jsonify({"error": "File not found"}), 404)
+        filename, content_type, timestamp = row
+        return serve_file(get_store().path_for(digest), digest, filename, content_type, timestamp)
+
+
+@files_ns.route('/sha256/<string:digest>/thumbnail/<int:size>')
+class ThumbnailDownload(Resource):
+    def get(self, digest, size):
+        row = stored_file(digest)
+        if row is None:
+            return make_response(jsonify({"error": "File not found"}), 404)
+        filename, content_type, timestamp = row
+        thumbnailer = get_thumbnailer()
+        try:
+            path = thumbnailer.get(get_store().path_for(digest), digest, size)
+        except ThumbnailUnavailable as error:
+            return make_response(jsonify({"error": str(error)}), error.status)
+        name = f'{os.path.splitext(filename)[0]}-{size}.{thumbnailer.extension}'
+        return serve_file(path, f'{digest}-{size}', name, thumbnailer.content_type, timestamp)
@@ -1,5 +1,8 @@
 from flask_restx import Namespace, Resource
+from flask_jwt_extended import jwt_required
 from utils import initialize_db
+from db_pool import get_pool
+from queries import get_registry
 from flask import jsonify
 
 
@@ -19,6 +22,18 @@ class DBData(Resource):
         except Exception as error:
             return {'error': str(error)}
 
+@home_ns.route('/db_pool')
+class DBPoolStats(Resource):
+    @jwt_required()
+    def get(self):
+        return get_pool().stats()
+
+@home_ns.route('/queries')
+class QueryStats(Resource):
+    @jwt_required()
+    def get(self):
+        return get_registry().stats()
+
 @home_ns.route('/python')
 class PythonVersion(Resource):
     def get(self):
@@ -1,6 +1,14 @@
-from flask import Blueprint, request, jsonify
+import uuid
+
+from flask import Blueprint, current_app, request, jsonify, make_response
 from flask_restx import Namespace, Resource, fields
-from utils import connect_db
+import queries
+from invoice_import import ImportFormatError, import_format, import_invoices, validate
+from invoice_totals import INVOICE_STATUSES, record_change, summary
+from utils import get_db
+from pagination import InvalidPageRequest, get_fields, get_page_args, page_headers, paginate
+from streaming import export_format, stream_query
+from flask_jwt_extended import jwt_required
 
 invoice_ns = Namespace('invoices', description='Invoice operations')
 
@@ -9,56 +17,120 @@ invoice_model = invoice_ns.model('Invoice', {
     'name': fields.String(required=True, description='Name of the invoice'),
     'amount': fields.Float(required=True, description='Amount of the invoice'),
     'due_date': fields.String(required=True, description='Due date of the invoice'),
-    'status': fields.String(description='Status of the invoice')
+    'status': fields.String(description='Status of the invoice; pending when omitted', enum=list(INVOICE_STATUSES)),
+    'user_id': fields.String(description='ID of the user the invoice is billed to')
 })
 
+INVOICE_FIELDS = ['id', 'name', 'amount', 'due_date', 'status']
+
+def _user_id(data):
+    user_id = data.get('user_id')
+    return None if user_id is None else str(uuid.UUID(str(user_id)))
+
+def _invoice_values(data, status_required):
+    """(name, amount, due_date, status, user_id) checked like imported rows; ValueError says what is wrong.
+
+    Runs before anything is written, since the invoice aggregates are keyed by status and date.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
+    if (status_required or 'status' in data) and not data.get('status'):
+        raise ValueError("status is required")
+    name, amount, due_date, status, user_id = validate(data)
+    return name, amount, due_date, status, None if user_id is None else str(user_id)
+
 @invoice_ns.route('/list_invoices')
 class InvoiceList(Resource):
+    @invoice_ns.doc(params={
+        'limit': 'Page size',
+        'cursor': 'X-Next-Cursor value from the previous page',
+        'fields': 'Comma-separated fields to return',
+    })
     def get(self):
-        conn = connect_db()
-        cur = conn.cursor()
-        cur.execute("SELECT id, name, amount, due_date, status FROM invoices")
-        rows = cur.fetchall()
-        invoices = [
-            {
-                'id': row[0],
-                'name': row[1],
-                'amount': row[2],
-                'due_date': row[3],
-                'status': row[4]
-            }
-            for row in rows
-        ]
-        cur.close()
-        conn.close()
-        return jsonify(invoices)
+        try:
+            fields = get_fields(INVOICE_FIELDS)
+            limit, after = get_page_args(1)
+        except InvalidPageRequest as e:
+            return make_response(jsonify({'message': str(e)}), 400)
+
+        columns = fields if 'id' in fields else ['id'] + fields
+        where = "WHERE id > %s" if after else ""
+        with get_db().cursor() as cur:
+            cur.execute(f"SELECT {', '.join(columns)} FROM invoices {where} ORDER BY id LIMIT %s",
+                        (*(after or ()), limit + 1))
+            rows, next_cursor = paginate(cur.fetchall(), limit, key=lambda row: (row[0],))
+            invoices = [
+                {column: value for column, value in zip(columns, row) if column in fields}
+                for row in rows
+            ]
+        response = jsonify(invoices)
+        response.headers.update(page_headers(next_cursor))
+        return response
 
     @invoice_ns.expect(invoice_model)
     def post(self):
-        data = request.json
-        name = data['name']
-        amount = data['amount']
-        due_date = data['due_date']
-        status = data.get('status', 'pending')
-
-        conn = connect_db()
-        cur = conn.cursor()
-        cur.execute("INSERT INTO invoices (name, amount, due_date, status) VALUES (%s, %s, %s, %s)",
-                    (name, amount, due_date, status))
-        conn.commit()
-        cur.close()
-        conn.close()
-        return jsonify({'message': 'Invoice created successfully'}), 201
+        try:
+            name, amount, due_date, status, user_id = _invoice_values(request.get_json(silent=True), False)
+        except ValueError as e:
+            return make_response(jsonify({'message': str(e)}), 400)
+
+        with get_db().cursor() as cur:
+            cur.execute("""
+                INSERT INTO invoices (name, amount, due_date, status, user_id, paid_at)
+                VALUES (%s, %s, %s, %s, %s, CASE WHEN %s = 'paid' THEN now() END)
+                RETURNING user_id, amount, due_date, status, paid_at
+            """, (name, amount, due_date, status, user_id, status))
+            record_change(cur, new=cur.fetchone())
+        return make_response(jsonify({'message': 'Invoice created successfully'}), 201)
+
+@invoice_ns.route('/import/invoices')
+class InvoiceImport(Resource):
+    @invoice_ns.doc(params={
+        'format': 'csv or ndjson; defaults from the Content-Type',
+        'on_error': 'abort (default) imports nothing if any row is invalid; skip imports the valid rows',
+    })
+    @jwt_required()
+    def post(self):
+        skip_invalid = request.args.get('on_error', 'abort') == 'skip'
+        try:
+            fmt = import_format(request)
+            with get_db().cursor() as cur:
+                report = import_invoices(cur, request.stream, fmt, skip_invalid)
+        except ImportFormatError as e:
+            return make_response(jsonify({'message': str(e)}), 400)
+        current_app.logger.info("Imported %d invoices (%d rejected) in %.2fs, %s rows/sec",
+                                report['imported'], report['rejected'], report['seconds'], report['rows_per_sec'])
+        if report['rejected'] and not skip_invalid:
+            # The error status rolls back the batches already copied.
+            return make_response(jsonify({'message': 'Invalid rows; nothing was imported', **report}), 422)
+        return make_response(jsonify({'message': 'Invoices imported successfully', **report}), 201)
+
+@invoice_ns.route('/export/invoices')
+class InvoiceExport(Resource):
+    @invoice_ns.doc(params={'format': 'json (default), ndjson or csv'})
+    @jwt_required()
+    def get(self):
+        return stream_query(
+            "SELECT id, name, amount, due_date, status FROM invoices ORDER BY id",
+            (), lambda row: dict(zip(INVOICE_FIELDS, row)), export_format(), filename='invoices')
+
+@invoice_ns.route('/invoices/summary')
+class InvoiceSummary(Resource):
+    @invoice_ns.doc(params={'user_id': 'Also return this user\'s outstanding balance'})
+    def get(self):
+        try:
+            user_id = _user_id(request.args)
+        except ValueError:
+            return make_response(jsonify({'message': 'Invalid user_id'}), 400)
+        with get_db().cursor() as cur:
+            return jsonify(summary(cur, user_id))
 
 @invoice_ns.route('/get_invoice/<int:id>')
 class Invoice(Resource):
     def get(self, id):
-        conn = connect_db()
-        cur = conn.cursor()
-        cur.execute("SELECT id, name, amount, due_date, status FROM invoices WHERE id = %s", (id,))
-        row = cur.fetchone()
-        cur.close()
-        conn.close()
+        with get_db().cursor() as cur:
+            queries.execute(cur, queries.INVOICE_BY_ID, (id,))
+            row = cur.fetchone()
         if row:
             invoice = {
                 'id': row[0],
@@ -68,30 +140,37 @@ class Invoice(Resource):
                 'status': row[4]
             }
             return jsonify(invoice)
-        return jsonify({'message': 'Invoice not found'}), 404
+        return make_response(jsonify({'message': 'Invoice not found'}), 404)
 
     def delete(self, id):
-        conn = connect_db()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM invoices WHERE id = %s", (id,))
-        conn.commit()
-        cur.close()
-        conn.close()
-        return jsonify({'message': 'Invoice deleted successfully'}), 200
+        with get_db().cursor() as cur:
+            cur.execute("DELETE FROM invoices WHERE id = %s RETURNING user_id, amount, due_date, status, paid_at",
+                        (id,))
+            old = cur.fetchone()
+            if old:
+                record_change(cur, old=old)
+        return make_response(jsonify({'message': 'Invoice deleted successfully'}), 200)
 
     @invoice_ns.expect(invoice_model)
     def put(self, id):
-        data = request.json
-        name = data['name']
-        amount = data['amount']
-        due_date = data['due_date']
-        status = data['status']
-
-        conn = connect_db()
-        cur = conn.cursor()
-        cur.execute("UPDATE invoices SET name = %s, amount = %s, due_date = %s, status = %s WHERE id = %s",
-                    (name, amount, due_date, status, id))
-        conn.commit()
-        cur.close()
-        conn.close()
-        return jsonify({'message': 'Invoice updated successfully'}), 200
+        try:
+            name, amount, due_date, status, user_id = _invoice_values(request.get_json(silent=True), True)
+        except ValueError as e:
+            return make_response(jsonify({'message': str(e)}), 400)
+
+        with get_db().cursor() as cur:
+            # The locked subquery yields the row as it was, for the totals delta. paid_at is
+            # kept while the invoice stays paid and set when it first becomes paid.
+            cur.execute("""
+                UPDATE invoices SET name = %s, amount = %s, due_date = %s, status = %s,
+                                    user_id = coalesce(%s, invoices.user_id),
+                                    paid_at = CASE WHEN %s = 'paid' THEN coalesce(old.paid_at, now()) END
+                FROM (SELECT id, user_id, amount, due_date, status, paid_at FROM invoices WHERE id = %s FOR UPDATE) old
+                WHERE invoices.id = old.id
+                RETURNING old.user_id, old.amount, old.due_date, old.status, old.paid_at,
+                          invoices.user_id, invoices.amount, invoices.due_date, invoices.status, invoices.paid_at
+            """, (name, amount, due_date, status, user_id, status, id))
+            row = cur.fetchone()
+            if row:
+                record_change(cur, old=row[:5], new=row[5:])
+        return make_response(jsonify({'message': 'Invoice updated successfully'}), 200)
@@ -3,11 +3,21 @@ import uuid
 from flask import request, current_app, jsonify
 from flask_restx import Namespace, Resource, fields
 from flask_mail import Message
+from mailer import enqueue_mail
 from typing import Dict, Any
-from utils import connect_db, user_exists, phone_exists, create_user, hash_password, generate_magic_link, update_user_registration_status
+import psycopg2
+from utils import get_db, hash_password, insert_user, generate_magic_link, update_user_registration_status
+from hashing import HashingBusy
+from config import Config
+from ratelimit import limit_concurrency, rate_limit
 
 registration_ns = Namespace('registration', description='User registration operations')
 
+DUPLICATE_USER_ERRORS = {
+    'userinfo1_email_key': "User with this email already exists",
+    'userinfo1_phone_number_key': "User with this phone number already exists",
+}
+
 # Define the user model for registration
 user_model = registration_ns.model('User', {
     'name': fields.String(required=True, description='User name'),
@@ -18,6 +28,8 @@ user_model = registration_ns.model('User', {
 
 @registration_ns.route('/register')
 class RegisterUser(Resource):
+    @rate_limit('register', Config.RATELIMIT_REGISTER)
+    @limit_concurrency('register')
     @registration_ns.expect(user_model, validate=True)
     def post(self) -> Dict[str, Any]:
         try:
@@ -31,22 +43,17 @@ class RegisterUser(Resource):
             if len(password) < 8:
                 return {"error": "Password must be at least 8 characters long"}, 400
 
-            conn = connect_db()
-            cur = conn.cursor()
-
-            if user_exists(cur, email):
-                return {"error": "User with this email already exists"}, 400
-
-            if phone_exists(cur, phone_number):
-                return {"error": "User with this phone number already exists"}, 400
-
             token = str(uuid.uuid4())  # Generate a unique token
-            hashed_password = hash_password(password)
-            create_user(cur, name, email, phone_number, hashed_password, token)  # Pass token to create_user
+            hashed_password = hash_password(password)  # before get_db(), so no connection is held through bcrypt
+            with get_db().cursor() as cur:
+                try:
+                    # A single INSERT; the unique constraints decide which key already exists.
+                    insert_user(cur, name, email, phone_number, hashed_password, token)
+                except psycopg2.errors.UniqueViolation as e:
+                    message = DUPLICATE_USER_ERRORS.get(e.diag.constraint_name, "User already exists")
+                    return {"error": message}, 400
 
-            conn.commit()
-            cur.close()
-            conn.close()
+                get_db().commit()
 
             # Generate and send magic link via email
             magic_link = generate_magic_link(token)
@@ -58,20 +65,23 @@ class RegisterUser(Resource):
             confirmation_url = f'{frontend_base_url}/confirm/{token}'
 
             app = current_app._get_current_object()  # Access Flask app instance
-            mail = registration_ns.context['mail']  # Access mail instance
             msg = Message(
                 subject='Confirm Registration',
                 recipients=[email],
                 body=f'Click the following link to confirm your registration: {confirmation_url}'
             )
-            mail.send(msg)
-            app.logger.info("Magic link sent successfully to: %s", email)
+            enqueue_mail(msg)
+            app.logger.info("Magic link queued for: %s", email)
 
             return {"message": "User registered successfully. Check your email for confirmation instructions."}, 201
 
         except KeyError as e:
             return {"error": f"Missing key in request data: {str(e)}"}, 400
 
+        except HashingBusy:
+            current_app.logger.warning("Password hashing queue is full, rejecting registration")
+            return {"error": "Server is busy. Please try again shortly."}, 503
+
         except Exception as e:
             current_app.logger.error("Error during registration: %s", str(e))
             return {"error": str(e)}, 500
@@ -93,10 +103,9 @@ class ConfirmRegistration(Resource):
 class ResendConfirmationEmail(Resource):
     def post(self, token: str) -> Dict[str, Any]:
         try:
-            conn = connect_db()
-            cur = conn.cursor()
-            cur.execute("SELECT email FROM userinfo1 WHERE token = %s", (token,))
-            user = cur.fetchone()
+            with get_db().cursor() as cur:
+                cur.execute("SELECT email FROM userinfo1 WHERE token = %s", (token,))
+                user = cur.fetchone()
 
             if not user:
                 return {"error": "Invalid token"}, 400
@@ -105,13 +114,12 @@ class ResendConfirmationEmail(Resource):
 
             email = user[0]
             confirmation_url = f'{frontend_base_url}/confirm/{token}'
-            mail = registration_ns.context['mail']  # Access mail instance
             msg = Message(
                 subject='Confirm Registration',
                 recipients=[email],
                 body=f'Click the following link to confirm your registration: {confirmation_url}'
             )
-            mail.send(msg)
+            enqueue_mail(msg)
             return {"message": "Confirmation email resent successfully!"}, 200
 
         except Exception as e:
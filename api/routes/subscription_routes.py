@@ -1,7 +1,10 @@
 from flask import jsonify, request, current_app
 from flask_restx import Namespace, Resource
 from flask_mail import Message
-from utils import connect_db, subscribe_user, unsubscribe_user
+from mailer import enqueue_mail
+from utils import get_db, subscribe_user, unsubscribe_link, unsubscribe_user
+from config import Config
+from ratelimit import limit_concurrency, rate_limit
 import re
 import nh3
 
@@ -22,6 +25,8 @@ def sanitize_feedback(feedback):
 
 @subscription_ns.route('/subscribe')
 class Subscribe(Resource):
+    @rate_limit('subscribe', Config.RATELIMIT_SUBSCRIBE)
+    @limit_concurrency('subscribe')
     def post(self):
         try:
             if request.is_json:
@@ -33,26 +38,21 @@ class Subscribe(Resource):
             if not email or not validate_email(email):
                 raise ValueError("Email address is missing or invalid")
 
-            conn = connect_db()
-            cur = conn.cursor()
-
-            subscribe_user(cur, email)
-            conn.commit()
-            cur.close()
-            conn.close()
+            with get_db().cursor() as cur:
+                subscribe_user(cur, email)
+                get_db().commit()
 
             mail = current_app.extensions.get('mail')
             if not mail:
                 raise Exception("Mail extension is not initialized")
 
-            unsubscribe_link = f'http://localhost:3000/unsubscribe?email={email}'
             msg = Message(
                 subject='Subscription Confirmation',
                 recipients=[email],
-                body=f'Thank you for subscribing. If you wish to unsubscribe, click here: {unsubscribe_link}'
+                body=f'Thank you for subscribing. If you wish to unsubscribe, click here: {unsubscribe_link(email)}'
             )
-            mail.send(msg)
-            current_app.logger.info("Email sent successfully to: %s", email)
+            enqueue_mail(msg)
+            current_app.logger.info("Subscription confirmation queued for: %s", email)
 
             response = jsonify({"message": "Subscribed successfully"})
             response.status_code = 201
@@ -81,32 +81,23 @@ class Unsubscribe(Resource):
 
             feedback = sanitize_feedback(feedback)
 
-            conn = connect_db()
-            cur = conn.cursor()
-
-            # Check if the email is in the subscriptions table
-            cur.execute("SELECT 1 FROM subscriptions WHERE email = %s", (email,))
-            if not cur.fetchone():
-                response = jsonify({"error": "Email address is not subscribed"})
-                response.status_code = 400
-                return response
+            with get_db().cursor() as cur:
+                # Check if the email is in the subscriptions table
+                cur.execute("SELECT 1 FROM subscriptions WHERE email = %s", (email,))
+                if not cur.fetchone():
+                    response = jsonify({"error": "Email address is not subscribed"})
+                    response.status_code = 400
+                    return response
 
-            # Unsubscribe the user
-            unsubscribe_user(cur, email)
-            conn.commit()
-            cur.close()
-            conn.close()
+                # Unsubscribe the user
+                unsubscribe_user(cur, email)
 
             if feedback:
-                conn = connect_db()
-                cur = conn.cursor()
-                cur.execute(
-                    "INSERT INTO feedback (email, feedback) VALUES (%s, %s)",
-                    (email, feedback)
-                )
-                conn.commit()
-                cur.close()
-                conn.close()
+                with get_db().cursor() as cur:
+                    cur.execute(
+                        "INSERT INTO feedback (email, feedback) VALUES (%s, %s)",
+                        (email, feedback)
+                    )
 
             current_app.logger.info("Unsubscribed successfully: %s", email)
 
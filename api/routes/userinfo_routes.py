@@ -1,7 +1,8 @@
-from flask import current_app, jsonify, request
+from flask import current_app, jsonify, make_response, request
 from flask_restx import Namespace, Resource
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from utils import connect_db
+import queries
+from utils import get_db
 
 user_ns = Namespace('user', description='User related operations')
 
@@ -11,20 +12,15 @@ class UserInfo(Resource):
     def get(self):
         try:
             user_id = get_jwt_identity()
-            current_app.logger.info(f"Fetching info for user_id: {user_id}")
+            current_app.logger.debug("Fetching info for user_id: %s", user_id)
 
-            conn = connect_db()
-            cur = conn.cursor()
-
-            cur.execute("SELECT id, name, email, phone_number, token, verified FROM userinfo1 WHERE id = %s", (user_id,))
-            user = cur.fetchone()
-
-            cur.close()
-            conn.close()
+            with get_db().cursor() as cur:
+                queries.execute(cur, queries.USERINFO_BY_ID, (user_id,))
+                user = cur.fetchone()
 
             if user:
                 user_id, name, email, phone_number, token, verified = user
-                current_app.logger.info(f"User found: {user}")
+                current_app.logger.debug("User found: %s", user_id)
                 return jsonify({
                     "user_id": user_id,
                     "name": name,
@@ -34,12 +30,12 @@ class UserInfo(Resource):
                     "verified": verified
                 })
             else:
-                current_app.logger.warning(f"User not found for user_id: {user_id}")
-                return jsonify({"error": "User not found"}), 404
+                current_app.logger.warning("User not found for user_id: %s", user_id)
+                return make_response(jsonify({"error": "User not found"}), 404)
 
         except Exception as e:
-            current_app.logger.error(f"Error fetching user info: {str(e)}")
-            return jsonify({"error": "An unexpected error occurred"}), 500
+            current_app.logger.error("Error fetching user info: %s", e)
+            return make_response(jsonify({"error": "An unexpected error occurred"}), 500)
 
 
 
@@ -51,19 +47,15 @@ class GetTokenByEmail(Resource):
             data = request.get_json()
             email = data.get('email')
 
-            conn = connect_db()
-            cur = conn.cursor()
-            cur.execute("SELECT token FROM userinfo1 WHERE email = %s", (email,))
-            token = cur.fetchone()
-
-            cur.close()
-            conn.close()
+            with get_db().cursor() as cur:
+                cur.execute("SELECT token FROM userinfo1 WHERE email = %s", (email,))
+                token = cur.fetchone()
 
             if token:
                 return jsonify({"token": token[0]})
             else:
-                return jsonify({"error": "User not found"}), 404
+                return make_response(jsonify({"error": "User not found"}), 404)
 
         except Exception as e:
             current_app.logger.error("Error fetching token by email: %s", str(e))
-            return jsonify({"error": "An unexpected error occurred"}), 500
+            return make_response(jsonify({"error": "An unexpected error occurred"}), 500)
@@ -0,0 +1,144 @@
+import bisect
+import re
+import threading
+
+from config import Config
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+BLOG_COLUMNS = "title, image, author, date, intro, content_section, list, conclusion, views"
+
+# Same relative weights Postgres uses for ts_rank with setweight A/B/C.
+FIELD_WEIGHTS = {'title': 1.0, 'author': 0.4, 'intro': 0.2}
+
+
+def tokenize(text):
+    return [token.lower() for token in _TOKEN_RE.findall(text or '')]
+
+
+def to_prefix_tsquery(query):
+    # Every term must match, and the last one may still be being typed.
+    terms = tokenize(query)
+    if not terms:
+        return None
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+class PostgresBlogSearch:
+    """Ranked prefix search over the blog.search_vector GIN index."""
+
+    def search(self, cur, query, limit, offset):
+        tsquery = to_prefix_tsquery(query)
+        if tsquery is None:
+            return [], 0
+        cur.execute(f"""
+            SELECT {BLOG_COLUMNS}, count(*) OVER () AS total
+            FROM blog, to_tsquery('simple', %s) AS q
+            WHERE search_vector @@ q
+            ORDER BY ts_rank(search_vector, q) DESC, title
+            LIMIT %s OFFSET %s
+        """, (tsquery, limit, offset))
+        rows = cur.fetchall()
+        total = rows[0][-1] if rows else 0
+        return [row[:-1] for row in rows], total
+
+    def index(self, blog):
+        pass  # search_vector is a generated column
+
+    def remove(self, title):
+        pass
+
+
+class InMemoryBlogSearch:
+    """Inverted index with the same ranking rules, for tests and local runs.
+
+    It is filled from the blog table on first use and kept current by the
+    blog write endpoints; it is per-process, so only use it with one worker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = {}
+        self._terms = []
+        self._docs = {}
+        self._loaded = False
+
+    def _ensure_loaded(self, cur):
+        if self._loaded:
+            return
+        cur.execute(f"SELECT {BLOG_COLUMNS} FROM blog")
+        rows = cur.fetchall()
+        with self._lock:
+            if not self._loaded:
+                for row in rows:
+                    self._add(row)
+                self._loaded = True
+
+    def _add(self, row):
+        title = row[0]
+        fields = {'title': row[0], 'author': row[2], 'intro': row[4]}
+        for field, text in fields.items():
+            for term in tokenize(text):
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    bisect.insort(self._terms, term)
+                postings[title] = postings.get(title, 0.0) + FIELD_WEIGHTS[field]
+        self._docs[title] = row
+
+    def _remove(self, title):
+        if self._docs.pop(title, None) is None:
+            return
+        for term in [t for t, postings in self._postings.items() if title in postings]:
+            postings = self._postings[term]
+            del postings[title]
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect.bisect_left(self._terms, term)]
+
+    def _prefix_scores(self, prefix):
+        scores = {}
+        i = bisect.bisect_left(self._terms, prefix)
+        while i < len(self._terms) and self._terms[i].startswith(prefix):
+            for title, weight in self._postings[self._terms[i]].items():
+                scores[title] = max(scores.get(title, 0.0), weight)
+            i += 1
+        return scores
+
+    def search(self, cur, query, limit, offset):
+        terms = tokenize(query)
+        if not terms:
+            return [], 0
+        self._ensure_loaded(cur)
+        with self._lock:
+            ranked = None
+            for term in terms:
+                scores = self._prefix_scores(term)
+                if ranked is None:
+                    ranked = scores
+                else:
+                    ranked = {title: ranked[title] + score for title, score in scores.items() if title in ranked}
+                if not ranked:
+                    return [], 0
+            order = sorted(ranked, key=lambda title: (-ranked[title], title))
+            return [self._docs[title] for title in order[offset:offset + limit]], len(order)
+
+    def index(self, blog):
+        with self._lock:
+            if self._loaded:
+                self._remove(blog[0])
+                self._add(blog)
+
+    def remove(self, title):
+        with self._lock:
+            self._remove(title)
+
+
+_blog_search = None
+
+
+def get_blog_search():
+    global _blog_search
+    if _blog_search is None:
+        _blog_search = InMemoryBlogSearch() if Config.SEARCH_BACKEND == 'memory' else PostgresBlogSearch()
+    return _blog_search
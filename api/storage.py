@@ -0,0 +1,203 @@
+import fcntl
+import hashlib
+import json
+import os
+import time
+import uuid
+
+from config import Config
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+class ContentStore:
+    """Content-addressed file storage with resumable uploads.
+
+    Every object lives at ``objects/<aa>/<bb>/<sha256>`` under ``root``, so a
+    file uploaded twice is stored once. Incoming data is streamed to a temp
+    file in ``chunk_size`` reads and hashed on the way, then renamed into
+    place. Chunked uploads are kept as ``uploads/<id>.part`` plus a JSON
+    sidecar, so any worker on the host can accept the next chunk.
+    """
+
+    def __init__(self, root, chunk_size=1024 * 1024, max_size=1024 ** 3, upload_expiry=86400):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.upload_expiry = upload_expiry
+        self._objects = os.path.join(root, 'objects')
+        self._uploads = os.path.join(root, 'uploads')
+        self._hashers = {}  # upload id -> (sha256, bytes hashed) for chunks seen by this process
+        self._next_expiry = 0.0
+        os.makedirs(self._objects, exist_ok=True)
+        os.makedirs(self._uploads, exist_ok=True)
+
+    def path_for(self, digest):
+        return os.path.join(self._objects, digest[:2], digest[2:4], digest)
+
+    def _copy(self, stream, out, limit, hasher=None):
+        written = 0
+        while True:
+            chunk = stream.read(self.chunk_size)
+            if not chunk:
+                return written
+            written += len(chunk)
+            if written > limit:
+                raise UploadError("Upload exceeds the allowed size", 413)
+            out.write(chunk)
+            if hasher is not None:
+                hasher.update(chunk)
+
+    def _commit(self, tmp_path, digest):
+        """Move a fully written temp file to its content address; returns False if it was already stored."""
+        path = self.path_for(digest)
+        if os.path.exists(path):
+            os.unlink(tmp_path)
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        return True
+
+    def save_stream(self, stream):
+        """Store everything read from ``stream``; returns (sha256, size, created)."""
+        tmp_path = os.path.join(self._uploads, f'{uuid.uuid4().hex}.tmp')
+        hasher = hashlib.sha256()
+        try:
+            with open(tmp_path, 'wb') as out:
+                size = self._copy(stream, out, self.max_size, hasher)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        digest = hasher.hexdigest()
+        return digest, size, self._commit(tmp_path, digest)
+
+    # -- resumable uploads ---------------------------------------------------
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self._uploads, f'{upload_id}.json')
+
+    def _part_path(self, upload_id):
+        return os.path.join(self._uploads, f'{upload_id}.part')
+
+    def create_upload(self, filename, size, content_type=None, owner=None):
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError("A positive upload size is required")
+        if size > self.max_size:
+            raise UploadError("Upload exceeds the allowed size", 413)
+        self.expire_uploads()
+        upload_id = uuid.uuid4().hex
+        meta = {'id': upload_id, 'filename': filename, 'size': size,
+                'content_type': content_type, 'owner': owner, 'created': time.time()}
+        open(self._part_path(upload_id), 'wb').close()
+        with open(self._meta_path(upload_id), 'w') as f:
+            json.dump(meta, f)
+        return meta
+
+    def get_upload(self, upload_id):
+        if not upload_id.isalnum():
+            raise UploadError("Upload not found", 404)
+        try:
+            with open(self._meta_path(upload_id)) as f:
+                meta = json.load(f)
+            meta['offset'] = os.path.getsize(self._part_path(upload_id))
+        except FileNotFoundError:
+            raise UploadError("Upload not found", 404)
+        return meta
+
+    def append_chunk(self, upload_id, offset, stream):
+        """Append a chunk written at ``offset``; returns the upload with its new offset.
+
+        Once the declared size is reached the upload is hashed, moved into
+        the object store and the returned dict gains ``sha256`` and
+        ``created``.
+        """
+        meta = self.get_upload(upload_id)
+        with open(self._part_path(upload_id), 'ab') as out:
+            # Serialises concurrent PATCHes to the same upload across workers.
+            fcntl.flock(out, fcntl.LOCK_EX)
+            current = os.fstat(out.fileno()).st_size
+            if offset != current:
+                raise UploadError("Offset does not match the upload", 409, offset=current)
+            hasher, hashed = self._hashers.pop(upload_id, (None, None))
+            if current == 0:
+                hasher = hashlib.sha256()
+            elif hashed != current:
+                hasher = None
+            try:
+                written = self._copy(stream, out, meta['size'] - current, hasher)
+            finally:
+                out.flush()
+            meta['offset'] = current + written
+            os.utime(self._meta_path(upload_id))
+            if hasher is not None:
+                self._hashers[upload_id] = (hasher, meta['offset'])
+            if meta['offset'] < meta['size']:
+                return meta
+            self._hashers.pop(upload_id, None)
+            digest = hasher.hexdigest() if hasher is not None else self._hash_file(self._part_path(upload_id))
+            meta['sha256'] = digest
+            meta['created'] = self._commit(self._part_path(upload_id), digest)
+        os.unlink(self._meta_path(upload_id))
+        return meta
+
+    def _hash_file(self, path):
+        # Chunks that arrived at another worker were not hashed here.
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.chunk_size), b''):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def abort_upload(self, upload_id):
+        self.get_upload(upload_id)
+        self._hashers.pop(upload_id, None)
+        for path in (self._part_path(upload_id), self._meta_path(upload_id)):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def expire_uploads(self):
+        now = time.time()
+        if now < self._next_expiry:
+            return
+        self._next_expiry = now + min(self.upload_expiry, 600)
+        for name in os.listdir(self._uploads):
+            path = os.path.join(self._uploads, name)
+            try:
+                if now - os.path.getmtime(path) > self.upload_expiry:
+                    os.unlink(path)
+            except FileNotFoundError:
+                pass
+        for upload_id in list(self._hashers):
+            if not os.path.exists(self._meta_path(upload_id)):
+                self._hashers.pop(upload_id, None)
+
+
+def record_file(cur, filename, digest, size, content_type=None, owner=None):
+    cur.execute("""
+        INSERT INTO files (filename, filepath, size, sha256, content_type, owner)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        RETURNING id
+    """, (filename, get_store().path_for(digest), size, digest, content_type, owner))
+    return cur.fetchone()[0]
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = ContentStore(
+            Config.UPLOAD_FOLDER,
+            chunk_size=Config.UPLOAD_CHUNK_SIZE,
+            max_size=Config.UPLOAD_MAX_SIZE,
+            upload_expiry=Config.UPLOAD_EXPIRY,
+        )
+    return _store
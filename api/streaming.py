@@ -0,0 +1,82 @@
+import csv
+import io
+import uuid
+
+from flask import Response, current_app, request, stream_with_context
+
+from utils import db_connection
+
+EXPORT_ITERSIZE = 1000
+CHUNK_SIZE = 64 * 1024
+
+
+def export_format():
+    fmt = request.args.get('format')
+    if fmt is None:
+        accept = request.headers.get('Accept', '')
+        if 'application/x-ndjson' in accept:
+            fmt = 'ndjson'
+        elif 'text/csv' in accept:
+            fmt = 'csv'
+    return fmt if fmt in ('ndjson', 'csv') else 'json'
+
+
+MIMETYPES = {'json': 'application/json', 'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+class _CSVRows:
+    """Formats dicts as CSV lines, writing the header before the first row."""
+
+    def __init__(self):
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+        self.header = False
+
+    def __call__(self, item):
+        if not self.header:
+            self.writer.writerow(item.keys())
+            self.header = True
+        self.writer.writerow(item.values())
+        line = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return line
+
+
+def stream_query(sql, params, row_to_dict, fmt='json', filename=None):
+    """Stream a query result as a JSON array, NDJSON or CSV without buffering it.
+
+    Rows come from a server-side (named) cursor ``EXPORT_ITERSIZE`` at a time
+    and are flushed to the client in chunks of roughly ``CHUNK_SIZE`` bytes,
+    so worker memory stays flat however large the table is. The connection is
+    checked out when the client starts reading and returned when it stops.
+    """
+    def generate():
+        dumps = _CSVRows() if fmt == 'csv' else current_app.json.dumps
+        if fmt == 'json':
+            yield '['
+        with db_connection() as conn, conn.cursor(name=f'export_{uuid.uuid4().hex}') as cur:
+            cur.itersize = EXPORT_ITERSIZE
+            cur.execute(sql, params)
+            chunk, size, first = [], 0, True
+            for row in cur:
+                item = dumps(row_to_dict(row))
+                if fmt == 'json':
+                    item = item if first else ',' + item
+                    first = False
+                elif fmt == 'ndjson':
+                    item += '\n'
+                chunk.append(item)
+                size += len(item)
+                if size >= CHUNK_SIZE:
+                    yield ''.join(chunk)
+                    chunk, size = [], 0
+            if chunk:
+                yield ''.join(chunk)
+        if fmt == 'json':
+            yield ']'
+
+    response = Response(stream_with_context(generate()), mimetype=MIMETYPES[fmt])
+    if filename:
+        response.headers['Content-Disposition'] = f'attachment; filename={filename}.{fmt}'
+    return response
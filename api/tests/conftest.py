@@ -0,0 +1,176 @@
+import datetime
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Config reads the environment at import time, so this runs before any app module is imported.
+os.environ.update({
+    'DB_NAME': 'sautis_test',
+    'DB_USER': 'test',
+    'DB_PASSWORD': 'test',
+    'DB_HOST': '127.0.0.1',
+    'DB_PORT': '5432',
+    'DB_POOL_MIN_SIZE': '0',
+    'PREPARED_STATEMENTS': 'false',  # keeps the SQL visible in FakeDatabase.statements
+    'BCRYPT_ROUNDS': '4',
+    'BCRYPT_WORKERS': '0',
+    'LOG_LEVEL': 'WARNING',
+    'MAIL_SPOOL_DIR': tempfile.mkdtemp(prefix='sautis-mail-'),
+    'UPLOAD_FOLDER': tempfile.mkdtemp(prefix='sautis-uploads-'),
+})
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from psycopg2 import extensions  # noqa: E402
+
+
+class FakeDatabase:
+    """Stands in for Postgres behind the connection pool.
+
+    Statements run inside a transaction are kept in ``pending`` until the
+    connection commits, when they move to ``committed``; a rollback drops
+    them. ``respond(fragment, rows)`` sets the rows returned by statements
+    containing ``fragment``; ``rows`` may also be a function of the params.
+    """
+
+    def __init__(self):
+        self.statements = []
+        self.committed = []
+        self.rollbacks = 0
+        self.connections = 0
+        self.commit_error = None  # raised by the next commit, then cleared
+        self._responses = []
+        self.respond('SELECT localtimestamp', lambda params: [(datetime.datetime.now(),)])
+
+    def respond(self, fragment, rows):
+        self._responses.insert(0, (fragment, rows))
+
+    def rows_for(self, sql, params):
+        for fragment, rows in self._responses:
+            if fragment in sql:
+                return list(rows(params) if callable(rows) else rows)
+        return []
+
+    def was_committed(self, fragment):
+        return any(fragment in sql for sql, params in self.committed)
+
+
+class FakeCursor:
+    def __init__(self, db, connection):
+        self.db = db
+        self.connection = connection
+        self.rowcount = -1
+        self.itersize = 2000
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def execute(self, query, params=None):
+        sql = ' '.join(query.split())
+        self.connection.status = extensions.TRANSACTION_STATUS_INTRANS
+        self.db.statements.append((sql, params))
+        self.connection.pending.append((sql, params))
+        self._rows = self.db.rows_for(sql, params)
+        self.rowcount = len(self._rows)
+
+    def copy_expert(self, sql, file):
+        # The COPY data stands in for the params.
+        self.execute(sql, file.read())
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchmany(self, size=None):
+        size = size or self.itersize
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def __iter__(self):
+        while self._rows:
+            yield self._rows.pop(0)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    closed = 0
+
+    def __init__(self, db):
+        self.db = db
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.pending = []
+        db.connections += 1
+
+    def cursor(self, name=None, **kwargs):
+        return FakeCursor(self.db, self)
+
+    def commit(self):
+        if self.db.commit_error is not None:
+            error, self.db.commit_error = self.db.commit_error, None
+            raise error
+        self.db.committed.extend(self.pending)
+        self.pending = []
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        if self.pending:
+            self.db.rollbacks += 1
+        self.pending = []
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def get_transaction_status(self):
+        return self.status
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def db(monkeypatch):
+    import db_pool
+
+    database = FakeDatabase()
+    db_pool.close_pool()
+    monkeypatch.setattr(db_pool.ConnectionPool, '_connect', lambda self: db_pool._PoolEntry(FakeConnection(database)))
+    yield database
+    db_pool.close_pool()
+
+
+@pytest.fixture
+def app(db, monkeypatch):
+    import cache
+    import ratelimit
+    import revocation
+    from app import app
+
+    # Per-process singletons start empty for every test.
+    monkeypatch.setattr(cache, '_cache', None)
+    monkeypatch.setattr(ratelimit, '_store', None)
+    monkeypatch.setattr(ratelimit, '_limiters', {})
+    monkeypatch.setattr(revocation, '_blocklist', None)
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(app):
+    from flask_jwt_extended import create_access_token
+
+    with app.app_context():
+        token = create_access_token(identity='0c2b5f9e-7d1a-4e59-9c0b-3f6f1d2a8e47')
+    return {'Authorization': f'Bearer {token}'}
@@ -0,0 +1,163 @@
+"""Smoke tests for the /api/async namespace, with the asyncpg pool replaced by a fake."""
+import datetime
+import uuid
+
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+from flask_mail import Mail
+from flask_restx import Api
+
+from aio import register_async
+from pagination import decode_cursor
+from routes import async_routes
+
+USER_ID = '0c2b5f9e-7d1a-4e59-9c0b-3f6f1d2a8e47'
+
+
+class Record(tuple):
+    """Like asyncpg.Record: iterates as values, indexable by position or column name."""
+
+    def __new__(cls, **columns):
+        record = super().__new__(cls, columns.values())
+        record._columns = list(columns)
+        return record
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            key = self._columns.index(key)
+        return super().__getitem__(key)
+
+
+class FakeAsyncDatabase:
+    def __init__(self):
+        self.calls = []
+        self.rows = {}
+
+    async def statement(self, name, *args):
+        self.calls.append((name, args))
+        return self.rows.get(name, [])
+
+    async def execute(self, sql, *args):
+        self.calls.append((sql, args))
+
+
+def blog(day, title):
+    return Record(title=title, image='img.png', author='Jane', date=datetime.date(2026, 5, day), intro='Intro',
+                  content_section='Body', list=[], conclusion='End', views=0, id=day)
+
+
+@pytest.fixture
+def adb(monkeypatch):
+    database = FakeAsyncDatabase()
+    monkeypatch.setattr(async_routes, 'get_async_db', lambda: database)
+    return database
+
+
+@pytest.fixture
+def async_client(app):
+    async_app = Flask(__name__)
+    async_app.config.update(app.config)
+    JWTManager(async_app)
+    Mail(async_app)
+    api = Api(async_app)
+    register_async(async_app)
+    api.add_namespace(async_routes.async_ns, path='/api/async')
+    with async_app.app_context():
+        token = create_access_token(identity=USER_ID)
+    client = async_app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    return client
+
+
+def test_userinfo_binds_the_identity_as_a_uuid(async_client, adb):
+    adb.rows['userinfo_by_id'] = [(uuid.UUID(USER_ID), 'Jane', 'jane@example.com', '123', 'tok', '1')]
+    response = async_client.get('/api/async/userinfo')
+    assert response.status_code == 200
+    assert response.get_json()['user_id'] == USER_ID
+    assert adb.calls == [('userinfo_by_id', (uuid.UUID(USER_ID),))]
+
+
+def test_userinfo_for_an_unknown_user_is_404(async_client, adb):
+    assert async_client.get('/api/async/userinfo').status_code == 404
+
+
+def test_blog_list_pages(async_client, adb):
+    adb.rows['blog_page'] = [blog(3, 'c'), blog(2, 'b'), blog(1, 'a')]
+    response = async_client.get('/api/async/blog?limit=2')
+    assert response.status_code == 200
+    assert [b['title'] for b in response.get_json()] == ['c', 'b']
+    assert decode_cursor(response.headers['X-Next-Cursor'], 3) == ['2026-05-02', 'b', 2]
+    assert adb.calls == [('blog_page', (3,))]
+    async_client.get(f"/api/async/blog?limit=2&cursor={response.headers['X-Next-Cursor']}")
+    assert adb.calls[-1] == ('blog_page_after', (datetime.date(2026, 5, 2), 'b', 2, 3))
+
+
+def test_blog_detail_not_found(async_client, adb):
+    assert async_client.get('/api/async/blog/missing').status_code == 404
+
+
+def test_login_without_fields_is_400(async_client, adb):
+    assert async_client.post('/api/async/auth/login', json={}).status_code == 400
+    assert adb.calls == []
+
+
+def test_login_is_rate_limited_per_account(async_client, adb):
+    login = {'emailOrPhone': 'jane@example.com', 'password': 'wrong password'}
+    statuses = [async_client.post('/api/async/auth/login', json=login,
+                                  environ_base={'REMOTE_ADDR': f'10.0.0.{i}'}).status_code
+                for i in range(11)]
+    assert statuses == [401] * 10 + [429]
+    assert len(adb.calls) == 10
+
+
+def test_login_sheds_load_when_the_admission_queue_is_full(async_client, adb, monkeypatch):
+    import ratelimit
+
+    monkeypatch.setitem(ratelimit._limiters, 'login', ratelimit.ConcurrencyLimiter(0, 0))
+    response = async_client.post('/api/async/auth/login', json={'emailOrPhone': 'jane@example.com', 'password': 'x'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
+    assert adb.calls == []
+
+
+@pytest.fixture
+def verified_user(adb):
+    from utils import hash_password
+
+    adb.rows['login_lookup'] = [(uuid.UUID(USER_ID), 'jane@example.com', hash_password('correct horse'), '1')]
+    return {'emailOrPhone': 'jane@example.com', 'password': 'correct horse'}
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    sent, queued = [], []
+
+    async def send_mail(msg):
+        sent.append(msg.recipients)
+
+    monkeypatch.setattr(async_routes, 'send_mail', send_mail)
+    monkeypatch.setattr(async_routes, 'enqueue_mail', lambda msg: queued.append(msg.recipients))
+    return sent, queued
+
+
+@pytest.mark.parametrize('queue_enabled', [False, None], ids=['queue-off', 'no-dispatcher'])
+def test_login_mail_goes_out_with_aiosmtplib_unless_queued(async_client, verified_user, outbox, queue_enabled):
+    from mailer import MailDispatcher
+
+    if queue_enabled is not None:
+        async_client.application.config['MAIL_QUEUE_ENABLED'] = queue_enabled
+        MailDispatcher(async_client.application)
+    response = async_client.post('/api/async/auth/login', json=verified_user)
+    assert response.status_code == 200
+    assert outbox == ([['jane@example.com']], [])
+
+
+def test_login_mail_is_queued_when_the_queue_is_on(async_client, verified_user, outbox):
+    from mailer import MailDispatcher
+
+    async_client.application.config['MAIL_QUEUE_ENABLED'] = True
+    MailDispatcher(async_client.application)
+    response = async_client.post('/api/async/auth/login', json=verified_user)
+    assert response.status_code == 200
+    assert outbox == ([], [['jane@example.com']])
@@ -0,0 +1,86 @@
+import datetime
+import time
+
+import pytest
+
+from cache import FakeRedis, LocalCache, RedisCache
+
+BLOG = ('First post', 'img.png', 'Jane', datetime.date(2026, 5, 1), 'Intro', 'Body', ['a'], 'End', 3)
+
+
+def blog_selects(db):
+    return [sql for sql, params in db.statements if sql.startswith('SELECT') and 'FROM blog' in sql]
+
+
+def test_local_cache_expires_and_evicts():
+    cache = LocalCache(max_entries=2)
+    cache.set('short', 1, ttl=0.01)
+    cache.set('a', 2)
+    time.sleep(0.02)
+    assert cache.get('short') is None
+    cache.set('b', 3)
+    cache.set('c', 4)
+    assert cache.get('a') is None
+    assert (cache.get('b'), cache.get('c')) == (3, 4)
+
+
+@pytest.mark.parametrize('cache', [LocalCache(), RedisCache(FakeRedis())], ids=['local', 'redis'])
+def test_generation_counter_survives(cache):
+    assert cache.get('blog:generation') is None
+    assert cache.incr('blog:generation') == 1
+    cache.set('entry', {'etag': 'x'}, ttl=60)
+    assert cache.get('entry') == {'etag': 'x'}
+    assert cache.get('blog:generation') == 1
+
+
+def test_blog_list_is_served_from_cache_with_an_etag(client, db):
+    db.respond('FROM blog', [BLOG])
+    first = client.get('/api/blog')
+    second = client.get('/api/blog')
+    assert first.status_code == second.status_code == 200
+    assert first.get_json() == second.get_json()
+    assert first.headers['ETag'] and first.headers['ETag'] == second.headers['ETag']
+    assert first.headers['Cache-Control'] == 'no-cache'
+    assert len(blog_selects(db)) == 1
+
+
+def test_matching_if_none_match_gets_304(client, db):
+    db.respond('FROM blog', [BLOG])
+    etag = client.get('/api/blog/First post').headers['ETag']
+    response = client.get('/api/blog/First post', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.get_data() == b''
+    assert client.get('/api/blog/First post', headers={'If-None-Match': '"stale"'}).status_code == 200
+
+
+def test_errors_are_not_cached(client, db):
+    assert client.get('/api/blog/missing').status_code == 404
+    assert client.get('/api/blog/missing').status_code == 404
+    assert len(blog_selects(db)) == 2
+
+
+def test_writes_invalidate_cached_pages(client, db):
+    db.respond('FROM blog', [BLOG])
+    client.get('/api/blog')
+    assert client.delete('/api/blog/First post').status_code == 200
+    client.get('/api/blog')
+    assert len(blog_selects(db)) == 2
+
+
+def test_the_key_ignores_argument_order_but_not_values(client, db):
+    db.respond('FROM blog', [('First post', datetime.date(2026, 5, 1), 1)])
+    client.get('/api/blog?limit=5&fields=title')
+    client.get('/api/blog?fields=title&limit=5')
+    assert len(blog_selects(db)) == 1
+    client.get('/api/blog?fields=title&limit=6')
+    assert len(blog_selects(db)) == 2
+
+
+def test_cached_pages_keep_their_paging_headers(client, db):
+    second = BLOG[:3] + (datetime.date(2026, 4, 1),) + BLOG[4:]
+    db.respond('FROM blog', [(*BLOG, 1), (*second, 2)])
+    first = client.get('/api/blog?limit=1')
+    again = client.get('/api/blog?limit=1')
+    assert len(blog_selects(db)) == 1
+    assert again.headers['X-Next-Cursor'] == first.headers['X-Next-Cursor']
+    assert again.headers['Link'] == first.headers['Link']
@@ -0,0 +1,79 @@
+import smtplib
+import time
+import types
+
+import pytest
+from flask import Flask
+from flask_mail import Mail
+
+import campaigns
+from mailer import LocalSMTPServer
+
+CAMPAIGN_ID = '8f1e1c2a-1111-4222-8333-444455556666'
+SUBSCRIBERS = [f'reader{i:02d}@example.com' for i in range(23)]
+
+
+@pytest.fixture
+def smtp():
+    server = LocalSMTPServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def mail_app(smtp):
+    app = Flask(__name__)
+    app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=smtp.port, MAIL_USE_TLS=False, MAIL_USE_SSL=False,
+                      MAIL_DEFAULT_SENDER='news@example.com', SECRET_KEY='test')
+    Mail(app)
+    return app
+
+
+@pytest.fixture
+def campaign(db):
+    db.respond('pg_try_advisory_lock', [(True,)])
+    db.respond('SELECT subject, body, html, status, last_email FROM campaigns',
+               [('Hello', 'News. Leave: {{ unsubscribe_url }}', None, 'draft', None)])
+    db.respond('SELECT id, subject, status', [(CAMPAIGN_ID, 'Hello', 'done', 0, 0, None, None, None, None)])
+    db.respond('FROM subscriptions WHERE email >',
+               lambda params: [(email,) for email in SUBSCRIBERS if email > params[0]][:params[1]])
+    return db
+
+
+def test_recipients_are_paged_one_short_transaction_per_batch(mail_app, smtp, campaign, monkeypatch):
+    monkeypatch.setattr(campaigns, 'unsubscribe_link', lambda email: f'https://example.com/u/{email}')
+    sender = campaigns.CampaignSender(mail_app, CAMPAIGN_ID, concurrency=3, rate=0, batch_size=10)
+
+    report = sender.run()
+
+    assert report['this_run']['sent'] == len(SUBSCRIBERS)
+    assert sorted(message['to'][0].strip('<>') for message in smtp.messages) == SUBSCRIBERS
+    pages = [params for sql, params in campaign.statements if 'FROM subscriptions' in sql]
+    assert pages == [('', 10), ('reader09@example.com', 10), ('reader19@example.com', 10),
+                     ('reader22@example.com', 10)]
+    assert all('LIMIT' in sql for sql, params in campaign.statements if 'FROM subscriptions' in sql)
+    # Only the lock-holding connection is used; no cursor stays open across batches.
+    assert campaign.connections == 1
+    checkpoints = [params[0] for sql, params in campaign.committed if 'SET last_email' in sql]
+    assert checkpoints == ['reader09@example.com', 'reader19@example.com', 'reader22@example.com']
+
+
+def test_worker_does_not_sleep_after_the_last_attempt(mail_app, campaign, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(campaigns, 'time', types.SimpleNamespace(sleep=sleeps.append, perf_counter=time.perf_counter))
+    monkeypatch.setattr(campaigns, 'unsubscribe_link', lambda email: f'https://example.com/u/{email}')
+
+    def refuse(send, message):
+        raise smtplib.SMTPServerDisconnected('gone')
+
+    monkeypatch.setattr(campaigns, '_send', refuse)
+    campaign.respond('FROM subscriptions WHERE email >',
+                     lambda params: [('only@example.com',)] if params[0] == '' else [])
+    sender = campaigns.CampaignSender(mail_app, CAMPAIGN_ID, concurrency=1, rate=0, batch_size=10, max_retries=2)
+
+    report = sender.run()
+
+    assert report['this_run']['failed'] == 1
+    assert sleeps == [1, 2]
+    failures = [params for sql, params in campaign.committed if 'campaign_failures' in sql]
+    assert failures and failures[0][1] == ['only@example.com']
@@ -0,0 +1,109 @@
+import datetime
+import uuid
+
+import psycopg2
+import pytest
+
+import chat_store
+from chat_store import MessageBuffer, invalid_message
+
+
+def message(email, content='hello'):
+    return (str(uuid.uuid4()), email, content, datetime.datetime(2026, 10, 1, 12, 0))
+
+
+@pytest.fixture
+def buffer(db, monkeypatch):
+    # The real execute_values needs libpq to build the statement; this keeps one statement per page.
+    def execute_values(cur, sql, rows, page_size=100):
+        cur.execute(sql, list(rows))
+
+    monkeypatch.setattr(chat_store, 'execute_values', execute_values)
+    monkeypatch.setattr(MessageBuffer, '_ensure_started', lambda self: None)
+    return MessageBuffer(flush_size=10, max_size=5, put_timeout=0)
+
+
+def reject_long_emails(params):
+    rows = params if isinstance(params, list) else [params]
+    if any(len(row[1]) > chat_store.EMAIL_MAX_LENGTH for row in rows):
+        raise psycopg2.DataError('value too long for type character varying(255)')
+    return []
+
+
+def stored_emails(db):
+    emails = []
+    for sql, params in db.committed:
+        if 'INSERT INTO messages' in sql:
+            emails.extend(row[1] for row in (params if isinstance(params, list) else [params]))
+    return emails
+
+
+def test_flush_inserts_the_batch_in_one_statement(buffer, db):
+    for i in range(3):
+        buffer.add(*message(f'user{i}@example.com'))
+    assert buffer.flush() == 3
+    assert stored_emails(db) == ['user0@example.com', 'user1@example.com', 'user2@example.com']
+    assert len([sql for sql, params in db.statements if 'INSERT INTO messages' in sql]) == 1
+    assert buffer.stats()['depth'] == 0
+
+
+def test_a_bad_row_is_dropped_and_the_rest_are_stored(buffer, db):
+    db.respond('INSERT INTO messages', reject_long_emails)
+    buffer.add(*message('first@example.com'))
+    buffer.add(*message('x' * 300 + '@example.com'))
+    buffer.add(*message('last@example.com'))
+
+    assert buffer.flush() == 2
+    assert stored_emails(db) == ['first@example.com', 'last@example.com']
+    stats = buffer.stats()
+    assert (stats['depth'], stats['rejected'], stats['flushed']) == (0, 1, 2)
+    assert buffer.flush() == 0
+
+
+def test_connection_errors_keep_the_batch_within_the_buffer_bound(buffer, db):
+    def down(params):
+        raise psycopg2.OperationalError('server closed the connection unexpectedly')
+
+    db.respond('INSERT INTO messages', down)
+    for i in range(4):
+        buffer.add(*message(f'user{i}@example.com'))
+    assert buffer.flush() == 0
+    assert buffer.stats()['depth'] == 4
+
+    buffer.add(*message('user4@example.com'))
+    assert not buffer.add(*message('user5@example.com'))  # full, dropped after put_timeout
+    assert buffer.flush() == 0
+    assert buffer.stats()['depth'] == 5
+
+    db.respond('INSERT INTO messages', [])
+    assert buffer.flush() == 5
+    assert stored_emails(db) == [f'user{i}@example.com' for i in range(5)]
+
+
+@pytest.mark.parametrize('email, content, error', [
+    ('jane@example.com', 'hi', None),
+    ('jane@example.com', {'text': 'hi'}, 'must be strings'),
+    (['jane@example.com'], 'hi', 'must be strings'),
+    ('x' * 250 + '@example.com', 'hi', 'longer than 255'),
+    ('jane@example.com', 'x' * 5001, 'longer than 5000'),
+    ('jane@example.com', 'a\x00b', 'NUL'),
+])
+def test_invalid_message(email, content, error):
+    result = invalid_message(email, content)
+    assert result is None if error is None else error in result
+
+
+def test_socket_refuses_a_message_that_cannot_be_stored(app, monkeypatch):
+    from app import socketio
+
+    added = []
+    monkeypatch.setattr(chat_store.get_message_buffer(), 'add', lambda *row: added.append(row))
+    client = socketio.test_client(app)
+    client.get_received()
+    client.emit('message', {'email': 'jane@example.com', 'message': {'text': 'hi'}})
+    assert client.get_received() == [
+        {'name': 'message_error', 'args': [{'error': 'email and message must be strings'}], 'namespace': '/'}]
+    client.emit('message', {'email': 'jane@example.com', 'message': 'hi'})
+    assert [event['name'] for event in client.get_received()] == ['message']
+    assert [row[1:3] for row in added] == [('jane@example.com', 'hi')]
+    client.disconnect()
@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+
+import psycopg2
+import pytest
+
+import db_pool
+from db_pool import ConnectionPool, PoolTimeout
+
+
+@pytest.fixture
+def pool(db):
+    pool = ConnectionPool({}, min_size=0, max_size=2, timeout=1.0, leak_threshold=30.0)
+    yield pool
+    pool.close()
+
+
+def test_released_connections_are_reused(pool, db):
+    for _ in range(3):
+        conn = pool.getconn()
+        conn.close()
+    assert db.connections == 1
+    assert pool.stats()['checkouts'] == 3
+    assert pool.stats()['idle'] == 1
+
+
+def test_release_rolls_back_an_open_transaction(pool, db):
+    conn = pool.getconn()
+    with conn.cursor() as cur:
+        cur.execute("UPDATE blog SET views = 0")
+    conn.close()
+    assert db.rollbacks == 1
+    assert db.committed == []
+
+
+def test_exhausted_pool_times_out(pool):
+    held = [pool.getconn(), pool.getconn()]
+    with pytest.raises(PoolTimeout):
+        pool.getconn(timeout=0.05)
+    assert pool.stats()['timeouts'] == 1
+    for conn in held:
+        conn.close()
+
+
+def test_waiter_gets_the_next_released_connection(pool, db):
+    held = [pool.getconn(), pool.getconn()]
+    threading.Timer(0.05, held[0].close).start()
+    conn = pool.getconn(timeout=2)
+    assert pool.stats()['in_use'] == 2
+    conn.close()
+    held[1].close()
+    assert db.connections == 2
+
+
+def test_closed_connection_is_discarded_on_release(pool):
+    conn = pool.getconn()
+    conn.raw.closed = 1
+    conn.close()
+    assert pool.stats()['discarded'] == 1
+    assert pool.stats()['size'] == 0
+
+
+def test_long_checkout_is_reported_once(pool):
+    conn = pool.getconn(owner='GET /api/slow')
+    later = time.monotonic() + pool.leak_threshold + 1
+    assert pool.check_leaks(now=later) == ['GET /api/slow']
+    assert pool.check_leaks(now=later) == []
+    assert pool.stats()['leaks_detected'] == 1
+    conn.close()
+
+
+def test_connection_past_max_lifetime_is_replaced(db):
+    pool = ConnectionPool({}, min_size=0, max_size=2, max_lifetime=60.0)
+    pool.getconn().close()
+    pool._idle[0].created_at -= 61
+    pool.getconn().close()
+    assert (db.connections, pool.stats()['discarded'], pool.stats()['size']) == (2, 1, 1)
+    pool.close()
+
+
+def test_idle_connection_is_pinged_and_replaced_if_dead(db):
+    pool = ConnectionPool({}, min_size=0, max_size=2, check_interval=30.0)
+    pool.getconn().close()
+    pool._idle[0].last_used -= 31
+    pool.getconn().close()
+    assert [sql for sql, params in db.statements] == ['SELECT 1']
+    assert db.connections == 1
+
+    def dead(params):
+        raise psycopg2.OperationalError('server closed the connection unexpectedly')
+
+    db.respond('SELECT 1', dead)
+    pool._idle[0].last_used -= 31
+    pool.getconn().close()
+    assert (db.connections, pool.stats()['discarded']) == (2, 1)
+    pool.close()
+
+
+def test_reap_trims_surplus_idle_connections_down_to_min_size(db):
+    pool = ConnectionPool({}, min_size=1, max_size=3, max_idle=10.0)
+    held = [pool.getconn() for _ in range(3)]
+    for conn in held:
+        conn.close()
+    for entry in pool._idle:
+        entry.last_used -= 11
+    pool.reap()
+    assert (pool.stats()['size'], pool.stats()['idle']) == (1, 1)
+    pool.close()
+
+
+def test_a_forked_process_gets_its_own_pool(db, monkeypatch):
+    parent = db_pool.get_pool()
+    assert db_pool.get_pool() is parent
+    monkeypatch.setattr(parent, 'pid', parent.pid - 1)  # as seen from a child after fork()
+    child = db_pool.get_pool()
+    assert child is not parent and child.pid == os.getpid()
+    parent.close()
@@ -0,0 +1,92 @@
+"""Writes made through get_db() are committed only with a successful response."""
+import psycopg2
+import pytest
+
+import db_pool
+import utils
+from utils import hash_password
+
+USER_ID = '0c2b5f9e-7d1a-4e59-9c0b-3f6f1d2a8e47'
+
+
+@pytest.fixture
+def connections_held_during_bcrypt(monkeypatch):
+    """Pool connections in use at each check_password/hash_password call."""
+    held = []
+    for name in ('check_password', 'hash_password'):
+        real = getattr(utils, name)
+
+        def spy(*args, real=real):
+            held.append(db_pool.get_pool().stats()['in_use'])
+            return real(*args)
+
+        monkeypatch.setattr(f'routes.auth_routes.{name}', spy)
+    return held
+
+
+def test_password_change_is_committed(client, db, auth_headers, connections_held_during_bcrypt):
+    db.respond('SELECT password FROM userinfo1 WHERE email', [(hash_password('old password'),)])
+    db.respond('UPDATE userinfo1 SET password', [()])  # one row updated
+    response = client.post('/api/auth/passwordchange', headers=auth_headers, json={
+        'email': 'jane@example.com', 'current_password': 'old password', 'new_password': 'new password'})
+    assert response.status_code == 200
+    assert response.get_json() == {"message": "Password changed successfully"}
+    assert db.was_committed('UPDATE userinfo1 SET password')
+    assert connections_held_during_bcrypt == [0, 0]
+
+
+def test_password_change_loses_to_a_concurrent_change(client, db, auth_headers):
+    db.respond('SELECT password FROM userinfo1 WHERE email', [(hash_password('old password'),)])
+    response = client.post('/api/auth/passwordchange', headers=auth_headers, json={
+        'email': 'jane@example.com', 'current_password': 'old password', 'new_password': 'new password'})
+    assert response.status_code == 409
+    sql, params = [(sql, params) for sql, params in db.statements if 'UPDATE userinfo1' in sql][0]
+    assert 'AND password = %s' in sql
+
+
+def test_password_change_with_wrong_password_writes_nothing(client, db, auth_headers):
+    db.respond('SELECT password FROM userinfo1 WHERE email', [(hash_password('old password'),)])
+    response = client.post('/api/auth/passwordchange', headers=auth_headers, json={
+        'email': 'jane@example.com', 'current_password': 'wrong', 'new_password': 'new password'})
+    assert response.status_code == 401
+    assert not any('UPDATE userinfo1' in sql for sql, params in db.statements)
+
+
+def test_account_deletion_is_committed(client, db, auth_headers, connections_held_during_bcrypt):
+    stored = hash_password('my password')
+    db.respond('SELECT password FROM userinfo1 WHERE id', [(stored,)])
+    db.respond('DELETE FROM userinfo1', [()])  # one row deleted
+    response = client.delete('/api/auth/delete', headers=auth_headers, json={'password': 'my password'})
+    assert response.status_code == 200
+    assert response.get_json() == {"message": "Account deleted successfully"}
+    assert ('DELETE FROM userinfo1 WHERE id = %s AND password = %s', (USER_ID, stored)) in db.committed
+    assert connections_held_during_bcrypt == [0]
+
+
+def test_blog_feedback_is_committed(client, db, auth_headers):
+    db.respond('INSERT INTO feedback_blog', [(42,)])
+    response = client.post('/api/feedback-blog', headers=auth_headers,
+                           json={'blog_id': 'b1', 'like': True, 'comment': 'Nice'})
+    assert response.status_code == 200
+    assert response.get_json()['feedback_id'] == 42
+    assert db.was_committed('INSERT INTO feedback_blog')
+
+
+def test_error_response_rolls_back(client, db, auth_headers):
+    db.respond('SELECT password FROM userinfo1 WHERE id', [(hash_password('my password'),)])
+    response = client.delete('/api/auth/delete', headers=auth_headers, json={'password': 'my password'})
+    assert response.status_code == 409  # the password changed after it was read
+    assert not db.was_committed('DELETE FROM userinfo1')
+
+
+def test_failed_commit_becomes_a_500_that_the_other_hooks_see(app, client, db, auth_headers):
+    db.respond('INSERT INTO feedback_blog', [(42,)])
+    db.commit_error = psycopg2.OperationalError("could not serialize access")
+    response = client.post('/api/feedback-blog', headers={**auth_headers, 'X-Request-ID': 'req-123'},
+                           json={'blog_id': 'b1', 'like': True})
+    assert response.status_code == 500
+    assert response.headers['X-Request-ID'] == 'req-123'
+    assert not db.was_committed('INSERT INTO feedback_blog')
+    # after_request hooks run last-registered first, so the commit must come before metrics and logging.
+    hooks = [hook.__name__ for hook in reversed(app.after_request_funcs[None])]
+    assert hooks[0] == 'finish_transaction'
@@ -0,0 +1,58 @@
+import datetime
+import io
+
+import pytest
+
+from storage import get_store
+
+OWNER = '0c2b5f9e-7d1a-4e59-9c0b-3f6f1d2a8e47'
+UPLOADED = datetime.datetime(2026, 10, 1, 12, 0, tzinfo=datetime.timezone.utc)
+
+
+@pytest.fixture
+def stored(db):
+    digest, size, created = get_store().save_stream(io.BytesIO(b'%PDF-1.7 quarterly report'))
+    row = ('report.pdf', get_store().path_for(digest), digest, 'application/pdf', UPLOADED)
+    db.respond('FROM files WHERE id = %s AND owner = %s',
+               lambda params: [row] if params == (7, OWNER) else [])
+    db.respond('WHERE sha256 = %s', lambda params: [row[0:1] + row[3:]] if params == (digest,) else [])
+    return digest
+
+
+def test_download_by_id_needs_a_token(client, stored):
+    anonymous = client.get('/api/files/7')
+    assert anonymous.status_code != 200
+    assert b'quarterly report' not in anonymous.data
+
+
+def test_download_by_id_is_only_for_the_uploader(client, app, stored):
+    from flask_jwt_extended import create_access_token
+
+    with app.app_context():
+        token = create_access_token(identity='5b0d8e3c-2f4a-4c71-8a9e-6d1f0c3b7a25')
+    response = client.get('/api/files/7', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 404
+
+
+def test_the_uploader_gets_the_file_with_ranges(client, auth_headers, stored):
+    response = client.get('/api/files/7', headers=auth_headers)
+    assert response.status_code == 200
+    assert response.data == b'%PDF-1.7 quarterly report'
+    assert response.headers['ETag'] == f'"{stored}"'
+
+    response = client.get('/api/files/7', headers={**auth_headers, 'Range': 'bytes=0-7'})
+    assert response.status_code == 206
+    assert response.data == b'%PDF-1.7'
+
+
+def test_upload_records_the_owner_and_returns_the_content_url(client, auth_headers, db):
+    db.respond('INSERT INTO files', [(8,)])
+    response = client.post('/api/auth/profile/upload', data=b'plain text', headers={
+        **auth_headers, 'Content-Type': 'text/plain', 'X-Filename': 'notes.txt'})
+
+    assert response.status_code == 201
+    digest = response.get_json()['sha256']
+    assert response.get_json()['url'] == f'/api/files/sha256/{digest}'
+    inserts = [params for sql, params in db.committed if 'INSERT INTO files' in sql]
+    assert inserts == [('notes.txt', get_store().path_for(digest), 10, digest, 'text/plain', OWNER)]
+    assert client.get(response.get_json()['url']).status_code == 404  # the fake has no row for it
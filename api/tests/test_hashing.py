@@ -0,0 +1,76 @@
+import bcrypt
+import pytest
+
+from hashing import HashingBusy, PasswordHasher
+
+USER_ID = '0c2b5f9e-7d1a-4e59-9c0b-3f6f1d2a8e47'
+
+
+def test_hashing_runs_in_the_process_pool():
+    hasher = PasswordHasher(rounds=4, workers=1)
+    try:
+        hashed = hasher.hash('correct horse')
+        assert hasher._executor is not None
+        assert hashed.startswith('$2b$04$')
+        assert hasher.verify('correct horse', hashed)
+        assert not hasher.verify('wrong horse', hashed)
+    finally:
+        hasher.shutdown()
+
+
+def test_callers_beyond_max_pending_get_hashing_busy():
+    hasher = PasswordHasher(rounds=4, workers=1, max_pending=1, queue_timeout=0.05)
+    hasher._slots.acquire()  # one hash already in flight
+    try:
+        with pytest.raises(HashingBusy):
+            hasher.hash('correct horse')
+        assert hasher._executor is None  # rejected before reaching the pool
+    finally:
+        hasher._slots.release()
+
+
+@pytest.mark.parametrize('hashed, expected', [
+    ('$2b$04$' + 'a' * 53, False),
+    ('$2b$12$' + 'a' * 53, True),
+    ('not a bcrypt hash', True),
+])
+def test_needs_rehash(hashed, expected):
+    assert PasswordHasher(rounds=4).needs_rehash(hashed) is expected
+
+
+@pytest.fixture
+def login(client, db, monkeypatch):
+    from routes import auth_routes
+
+    monkeypatch.setattr(auth_routes, 'enqueue_mail', lambda msg: None)
+
+    def login(stored_hash, password='correct horse'):
+        db.respond('FROM userinfo1 WHERE email', [(USER_ID, 'jane@example.com', stored_hash, '1')])
+        return client.post('/api/auth/login', json={'emailOrPhone': 'jane@example.com', 'password': password})
+    return login
+
+
+def test_login_rehashes_a_password_stored_at_another_cost(login, db):
+    response = login(bcrypt.hashpw(b'correct horse', bcrypt.gensalt(5)).decode())
+
+    assert response.status_code == 200
+    updates = [params for sql, params in db.committed if 'UPDATE userinfo1 SET password' in sql]
+    assert len(updates) == 1 and updates[0][1] == USER_ID
+    assert updates[0][0].startswith('$2b$04$')
+    assert bcrypt.checkpw(b'correct horse', updates[0][0].encode())
+
+
+def test_login_keeps_a_hash_at_the_configured_cost(login, db):
+    assert login(bcrypt.hashpw(b'correct horse', bcrypt.gensalt(4)).decode()).status_code == 200
+    assert not db.was_committed('UPDATE userinfo1 SET password')
+
+
+def test_login_is_503_when_hashing_is_saturated(login, monkeypatch):
+    import utils
+
+    def busy(password, hashed):
+        raise HashingBusy("Too many password hashing requests in flight")
+
+    monkeypatch.setattr(utils.get_hasher(), 'verify', busy)
+    response = login(bcrypt.hashpw(b'correct horse', bcrypt.gensalt(4)).decode())
+    assert response.status_code == 503
@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.mark.parametrize('path', ['/api/home/db_pool', '/api/home/queries'])
+def test_internal_stats_need_a_token(client, auth_headers, path):
+    anonymous = client.get(path)
+    assert anonymous.status_code != 200
+    assert 'statements' not in anonymous.get_json() and 'checkouts' not in anonymous.get_json()
+    assert client.get(path, headers=auth_headers).status_code == 200
+
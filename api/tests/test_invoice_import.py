@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from config import Config
+
+USER_ID = '5b0d8e3c-2f4a-4c71-8a9e-6d1f0c3b7a25'
+CSV = (
+    'name,amount,due_date,status,user_id\n'
+    'Hosting,120.50,2026-06-30,pending,\n'
+    '"Design\tand build",900,2026-07-15,paid,' + USER_ID + '\n'
+    'Support,35.00,2026-07-31,,\n'
+)
+
+
+def copies(db, committed=True):
+    statements = db.committed if committed else db.statements
+    return [data for sql, data in statements if sql.startswith('COPY invoices')]
+
+
+def post(client, auth_headers, body, content_type='text/csv', query=''):
+    return client.post(f'/api/import/invoices{query}', data=body.encode(),
+                       headers={**auth_headers, 'Content-Type': content_type})
+
+
+def test_csv_is_copied_in_batches_and_the_totals_applied_once(client, auth_headers, db, monkeypatch):
+    monkeypatch.setattr(Config, 'IMPORT_BATCH_ROWS', 2)
+
+    response = post(client, auth_headers, CSV)
+
+    assert response.status_code == 201
+    assert (response.get_json()['imported'], response.get_json()['rejected']) == (3, 0)
+    assert copies(db) == [
+        'Hosting\t120.50\t2026-06-30\tpending\t\\N\n'
+        f'Design\\tand build\t900\t2026-07-15\tpaid\t{USER_ID}\n',
+        'Support\t35.00\t2026-07-31\tpending\t\\N\n',
+    ]
+    status_totals = [params for sql, params in db.committed if 'INSERT INTO invoice_status_totals' in sql]
+    assert len(status_totals) == 1
+    assert not db.was_committed('UPDATE userinfo1 SET invoice_balance')  # the only owned invoice is paid
+
+
+def test_ndjson_is_chosen_by_the_content_type(client, auth_headers, db):
+    body = '\n'.join(json.dumps(row) for row in [
+        {'name': 'Hosting', 'amount': 120.5, 'due_date': '2026-06-30', 'user_id': USER_ID},
+        {'name': 'Support', 'amount': '35', 'due_date': '2026-07-31'},
+    ]) + '\n'
+
+    response = post(client, auth_headers, body, content_type='application/x-ndjson')
+
+    assert response.status_code == 201
+    assert len(copies(db)[0].splitlines()) == 2
+    assert db.was_committed('UPDATE userinfo1 SET invoice_balance')
+
+
+BAD_CSV = CSV + 'Refund,-12.345,2026-08-01,,\nBroken,10,tomorrow,,\n'
+
+
+def test_one_invalid_row_aborts_the_whole_import(client, auth_headers, db, monkeypatch):
+    monkeypatch.setattr(Config, 'IMPORT_BATCH_ROWS', 2)
+
+    response = post(client, auth_headers, BAD_CSV)
+
+    assert response.status_code == 422
+    report = response.get_json()
+    assert (report['imported'], report['rejected']) == (0, 2)
+    assert [error['line'] for error in report['errors']] == [5, 6]
+    assert 'decimal places' in report['errors'][0]['error']
+    assert copies(db, committed=False)  # the first batch went out...
+    assert copies(db) == []  # ...and was rolled back
+
+
+def test_skip_imports_the_valid_rows(client, auth_headers, db):
+    response = post(client, auth_headers, BAD_CSV, query='?on_error=skip')
+
+    assert response.status_code == 201
+    assert (response.get_json()['imported'], response.get_json()['rejected']) == (3, 2)
+    assert len(copies(db)[0].splitlines()) == 3
+
+
+@pytest.mark.parametrize('body, content_type, error', [
+    ('name,amount\nHosting,1\n', 'text/csv', 'missing'),
+    ('name,amount,due_date,colour\n', 'text/csv', 'unknown'),
+    ('{}', 'application/json', 'Send text/csv'),
+])
+def test_unreadable_uploads_are_a_400(client, auth_headers, db, body, content_type, error):
+    response = post(client, auth_headers, body, content_type=content_type)
+    assert response.status_code == 400
+    assert error in response.get_json()['message']
+    assert copies(db, committed=False) == []
@@ -0,0 +1,108 @@
+import datetime
+import decimal
+
+import pytest
+
+from invoice_import import validate
+
+INVOICE = {'name': 'Hosting', 'amount': '120.50', 'due_date': '2026-06-30', 'status': 'pending'}
+
+
+def invoice_writes(db):
+    return [sql for sql, params in db.statements if sql.startswith(('INSERT INTO invoices', 'UPDATE invoices'))]
+
+
+@pytest.mark.parametrize('change, error', [
+    ({'status': None}, 'status is required'),
+    ({'status': 'archived'}, 'status must be one of'),
+    ({'due_date': '30/06/2026'}, 'due_date must be YYYY-MM-DD'),
+    ({'due_date': None}, 'due_date must be YYYY-MM-DD'),
+    ({'amount': 'lots'}, 'amount is not a number'),
+    ({'user_id': 'not-a-uuid'}, 'user_id is not a UUID'),
+])
+def test_invalid_invoice_is_rejected_before_writing(client, db, change, error):
+    response = client.post('/api/list_invoices', json={**INVOICE, **change})
+    assert response.status_code == 400
+    assert error in response.get_json()['message']
+    assert invoice_writes(db) == []
+
+
+def test_update_requires_a_status(client, db):
+    invoice = {key: value for key, value in INVOICE.items() if key != 'status'}
+    response = client.put('/api/get_invoice/7', json=invoice)
+    assert response.status_code == 400
+    assert response.get_json() == {'message': 'status is required'}
+    assert invoice_writes(db) == []
+
+
+def committed_params(db, fragment):
+    return next(params for sql, params in db.committed if fragment in sql)
+
+
+def test_created_invoice_moves_the_totals(client, db):
+    db.respond('INSERT INTO invoices',
+               lambda params: [(None, decimal.Decimal(params[1]), params[2], params[3], None)])
+    response = client.post('/api/list_invoices', json={key: value for key, value in INVOICE.items() if key != 'status'})
+    assert response.status_code == 201
+    insert = committed_params(db, 'INSERT INTO invoices')
+    assert insert == ('Hosting', decimal.Decimal('120.50'), datetime.date(2026, 6, 30), 'pending', None, 'pending')
+    amount = [decimal.Decimal('120.50')]
+    assert committed_params(db, 'INSERT INTO invoice_totals') == {
+        'p1': ['pending'], 'p2': [datetime.date(2026, 6, 1)], 'p3': [1], 'p4': amount}
+    assert committed_params(db, 'INSERT INTO invoice_status_totals') == {'p1': ['pending'], 'p2': [1], 'p3': amount}
+    assert committed_params(db, 'INSERT INTO invoice_open_totals') == {
+        'p1': [datetime.date(2026, 6, 30)], 'p2': [1], 'p3': amount}
+    assert not db.was_committed('INSERT INTO invoice_paid_totals')
+
+
+def test_paying_an_invoice_buckets_it_by_the_payment_month(client, db):
+    paid_at = datetime.datetime(2026, 10, 3, 9, 30, tzinfo=datetime.timezone.utc)
+    due, amount = datetime.date(2026, 6, 30), decimal.Decimal('120.50')
+    db.respond('UPDATE invoices', [(None, amount, due, 'pending', None, None, amount, due, 'paid', paid_at)])
+    response = client.put('/api/get_invoice/7', json={**INVOICE, 'status': 'paid'})
+    assert response.status_code == 200
+    update = next(sql for sql, params in db.committed if sql.startswith('UPDATE invoices'))
+    assert "paid_at = CASE WHEN %s = 'paid' THEN coalesce(old.paid_at, now()) END" in update
+    # Paid in October, although it was due in June.
+    assert committed_params(db, 'INSERT INTO invoice_paid_totals') == {
+        'p1': [datetime.date(2026, 10, 1)], 'p2': [1], 'p3': [amount]}
+    assert committed_params(db, 'INSERT INTO invoice_open_totals') == {'p1': [due], 'p2': [-1], 'p3': [-amount]}
+    assert committed_params(db, 'DELETE FROM invoice_open_totals') == {'p1': [due]}
+
+
+def test_summary_reads_only_the_aggregate_rows(client, db):
+    db.respond("SELECT 'status'", [
+        ('status', 'pending', 3, decimal.Decimal('300.00')),
+        ('status', 'overdue', 1, decimal.Decimal('50.00')),
+        ('status', 'paid', 4, decimal.Decimal('400.00')),
+        ('status', 'cancelled', 0, decimal.Decimal('0.00')),
+        ('paid_this_month', None, 2, decimal.Decimal('200.00')),
+        ('overdue', None, 2, decimal.Decimal('90.00')),
+    ])
+    response = client.get('/api/invoices/summary')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['outstanding'] == {'count': 4, 'amount': '350.00'}
+    assert body['overdue'] == {'count': 2, 'amount': '90.00'}
+    assert body['paid_this_month'] == {'count': 2, 'amount': '200.00'}
+    assert set(body['by_status']) == {'pending', 'overdue', 'paid'}
+    sql = db.statements[-1][0]
+    assert 'FROM invoice_open_totals WHERE due_date < CURRENT_DATE' in sql
+    assert 'invoices ' not in sql and 'invoice_totals ' not in sql
+
+
+def test_import_rejects_unknown_statuses():
+    assert validate({**INVOICE, 'status': ''})[3] == 'pending'
+    with pytest.raises(ValueError, match='status must be one of'):
+        validate({**INVOICE, 'status': 'archived'})
+
+
+def test_only_unsettled_invoices_count_as_open():
+    from invoice_totals import InvoiceDeltas
+
+    deltas = InvoiceDeltas()
+    for status in ('pending', 'overdue', 'paid', 'cancelled'):
+        deltas.add('0c2b5f9e-7d1a-4e59-9c0b-3f6f1d2a8e47', '10.00', '2026-01-15', status)
+    assert deltas.open == {datetime.date(2026, 1, 15): (2, decimal.Decimal('20.00'))}
+    assert deltas.balances == {'0c2b5f9e-7d1a-4e59-9c0b-3f6f1d2a8e47': decimal.Decimal('20.00')}
+    assert deltas.paid == {}  # paid without a paid_at, as imported
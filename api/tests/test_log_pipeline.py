@@ -0,0 +1,78 @@
+import json
+import logging
+import threading
+
+import pytest
+from flask import Flask, g
+
+from log_pipeline import JsonFormatter, PipelineHandler
+
+
+class Collect(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        record.thread_name = threading.current_thread().name
+        self.records.append(record)
+
+
+@pytest.fixture
+def pipeline():
+    collected = Collect()
+    handler = PipelineHandler([collected], debug_sample_rate=0.0)
+    logger = logging.getLogger('tests.pipeline')
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    yield logger, handler, collected.records
+    logger.removeHandler(handler)
+    handler.stop()
+
+
+def test_records_are_written_off_the_calling_thread_with_the_request_id(pipeline):
+    logger, handler, records = pipeline
+    app = Flask(__name__)
+    with app.test_request_context('/api/blog', method='PUT'):
+        g.request_id = 'req-1'
+        logger.info("Updated %s", 'Pooling')
+    logger.debug("dropped by sampling")
+    handler.stop()  # drains the queue
+
+    assert len(records) == 1
+    record = records[0]
+    assert record.thread_name != threading.current_thread().name
+    assert (record.msg, record.args) == ('Updated Pooling', None)
+    assert (record.request_id, record.method, record.path) == ('req-1', 'PUT', '/api/blog')
+
+
+def test_exceptions_are_rendered_before_queueing(pipeline):
+    logger, handler, records = pipeline
+    try:
+        raise ValueError('bad row')
+    except ValueError:
+        logger.exception("Import failed")
+    handler.stop()
+
+    assert records[0].exc_info is None
+    assert 'ValueError: bad row' in records[0].exc_text
+
+
+def test_json_formatter_includes_extras_and_the_source_of_warnings():
+    record = logging.makeLogRecord({'name': 'invoices', 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                                    'msg': 'Slow import of %d rows', 'args': (5000,), 'pathname': 'invoices.py',
+                                    'lineno': 12, 'request_id': 'req-2', 'batch': 3})
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry['message'] == 'Slow import of 5000 rows'
+    assert (entry['level'], entry['logger'], entry['request_id'], entry['batch']) == ('WARNING', 'invoices', 'req-2', 3)
+    assert entry['source'] == 'invoices.py:12'
+    assert entry['ts'].endswith('+00:00')
+
+
+@pytest.mark.parametrize('sent, echoed', [('trace-abc.1', True), ('bad id with spaces', False), (None, False)])
+def test_request_id_is_echoed_or_generated(client, sent, echoed):
+    headers = {'X-Request-ID': sent} if sent else {}
+    request_id = client.get('/api/home/home', headers=headers).headers['X-Request-ID']
+    assert (request_id == sent) is echoed
+    assert request_id
@@ -0,0 +1,111 @@
+import json
+import os
+import time
+
+import pytest
+from flask import Flask
+from flask_mail import Mail, Message
+
+from mailer import LocalSMTPServer, MailDispatcher
+
+STALE = time.time() - 3600
+
+
+@pytest.fixture
+def smtp():
+    server = LocalSMTPServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def mail_app(smtp, tmp_path):
+    app = Flask(__name__)
+    app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=smtp.port, MAIL_USE_TLS=False, MAIL_USE_SSL=False,
+                      MAIL_DEFAULT_SENDER='noreply@example.com', SECRET_KEY='test',
+                      MAIL_SPOOL_DIR=str(tmp_path), MAIL_QUEUE_IDLE_TIMEOUT=0.1, MAIL_QUEUE_LEASE=60)
+    Mail(app)
+    for sub in ('pending', 'inflight', 'failed'):
+        os.makedirs(tmp_path / sub)
+    return app
+
+
+def spool_inflight(app, job_id, owner, mtime=None):
+    """Leave a message in ``inflight`` the way a process with boot nonce ``owner`` would."""
+    job = {'id': job_id, 'subject': 'Confirm your email', 'recipients': [f'{job_id}@example.com'],
+           'body': 'Welcome', 'html': None, 'sender': None, 'cc': None, 'bcc': None, 'reply_to': None,
+           'attempts': 0, 'not_before': 0}
+    path = os.path.join(app.config['MAIL_SPOOL_DIR'], 'inflight', f'{job_id}.{owner}.json')
+    with open(path, 'w') as f:
+        json.dump(job, f)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, 'timed out'
+        time.sleep(0.02)
+
+
+def test_init_app_resends_mail_whose_lease_expired(mail_app, smtp):
+    # The owner's pid may well be alive again as an unrelated process; only the lease matters.
+    path = spool_inflight(mail_app, '1760000000.000001-abc', owner='0' * 32, mtime=STALE)
+
+    dispatcher = MailDispatcher(mail_app)
+
+    wait_for(lambda: smtp.messages)
+    assert [m['to'] for m in smtp.messages] == [['<1760000000.000001-abc@example.com>']]
+    wait_for(lambda: dispatcher.stats()['sent'] == 1)
+    assert not os.path.exists(path)
+    assert os.listdir(os.path.join(mail_app.config['MAIL_SPOOL_DIR'], 'inflight')) == []
+
+
+def test_mail_another_process_is_still_sending_is_left_alone(mail_app, smtp):
+    path = spool_inflight(mail_app, '1760000000.000002-def', owner='1' * 32)
+
+    dispatcher = MailDispatcher(mail_app)
+    dispatcher._reclaim_expired()
+
+    time.sleep(0.2)
+    assert smtp.messages == []
+    assert os.path.exists(path)
+
+
+def test_the_retry_loop_reclaims_mail_that_expires_while_running(mail_app, smtp):
+    mail_app.config['MAIL_QUEUE_LEASE'] = 0.3
+    dispatcher = MailDispatcher(mail_app)
+    path = spool_inflight(mail_app, '1760000000.000003-fed', owner='2' * 32)
+
+    wait_for(lambda: dispatcher.stats()['sent'] == 1)
+    assert [m['to'] for m in smtp.messages] == [['<1760000000.000003-fed@example.com>']]
+    assert not os.path.exists(path)
+
+
+def test_enqueued_mail_is_spooled_then_sent(mail_app, smtp):
+    dispatcher = MailDispatcher(mail_app)
+    with mail_app.app_context():
+        job_ids = [dispatcher.enqueue(Message('Hello', recipients=[f'reader{i}@example.com'], body='Hi'))
+                   for i in range(3)]
+
+    wait_for(lambda: dispatcher.stats()['sent'] == 3)
+    assert sorted(m['to'][0] for m in smtp.messages) == [f'<reader{i}@example.com>' for i in range(3)]
+    spool = mail_app.config['MAIL_SPOOL_DIR']
+    assert all(not os.path.exists(os.path.join(spool, 'pending', f'{job_id}.json')) for job_id in job_ids)
+    assert os.listdir(os.path.join(spool, 'inflight')) == []
+
+
+def test_mail_that_keeps_failing_is_moved_to_failed(mail_app, smtp):
+    smtp.stop()  # nothing listens on the port any more
+    mail_app.config.update(MAIL_QUEUE_MAX_RETRIES=1, MAIL_QUEUE_RETRY_BACKOFF=0.05)
+    dispatcher = MailDispatcher(mail_app)
+    with mail_app.app_context():
+        job_id = dispatcher.enqueue(Message('Hello', recipients=['reader@example.com'], body='Hi'))
+
+    wait_for(lambda: dispatcher.stats()['failed'] == 1)
+    assert dispatcher.stats()['retried'] == 1
+    with open(os.path.join(mail_app.config['MAIL_SPOOL_DIR'], 'failed', f'{job_id}.json')) as f:
+        job = json.load(f)
+    assert job['attempts'] == 2 and job['last_error']
@@ -0,0 +1,109 @@
+import datetime
+
+import pytest
+
+from pagination import InvalidPageRequest, MAX_LIMIT, decode_cursor, encode_cursor, paginate
+
+
+def blog(day, title, id=None):
+    return (title, 'img.png', 'Jane', datetime.date(2026, 5, day), 'Intro', 'Body', [], 'End', 0, id or day)
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor([datetime.date(2026, 5, 1), 'Title'])
+    assert '=' not in cursor
+    assert decode_cursor(cursor, 2) == ['2026-05-01', 'Title']
+
+
+@pytest.mark.parametrize('cursor', ['!!!', encode_cursor(['only one']), encode_cursor({'a': 1})])
+def test_bad_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidPageRequest):
+        decode_cursor(cursor, 2)
+
+
+def test_paginate_trims_the_extra_row():
+    rows, cursor = paginate([(3, 'c'), (2, 'b'), (1, 'a')], 2, key=lambda row: row)
+    assert rows == [(3, 'c'), (2, 'b')]
+    assert decode_cursor(cursor, 2) == [2, 'b']
+    assert paginate([(1, 'a')], 2, key=lambda row: row) == ([(1, 'a')], None)
+
+
+def test_blog_pages_follow_the_cursor(client, db):
+    db.respond('FROM blog', [blog(3, 'c'), blog(2, 'b'), blog(1, 'a')])
+    first = client.get('/api/blog?limit=2')
+    assert [b['title'] for b in first.get_json()] == ['c', 'b']
+    cursor = first.headers['X-Next-Cursor']
+    assert 'rel="next"' in first.headers['Link']
+
+    client.get(f'/api/blog?limit=2&cursor={cursor}')
+    sql, params = db.statements[-1]
+    assert 'WHERE (date, title, id) <' in sql
+    assert 'ORDER BY date DESC, title DESC, id DESC' in sql
+    assert params == {'p1': '2026-05-02', 'p2': 'b', 'p3': 2, 'p4': 3}
+
+
+def test_posts_sharing_a_date_and_title_are_told_apart_by_id(client, db):
+    db.respond('FROM blog', [blog(2, 'Weekly notes', id=9), blog(2, 'Weekly notes', id=7)])
+    first = client.get('/api/blog?limit=1')
+    assert decode_cursor(first.headers['X-Next-Cursor'], 3) == ['2026-05-02', 'Weekly notes', 9]
+
+    client.get(f"/api/blog?limit=1&cursor={first.headers['X-Next-Cursor']}")
+    assert db.statements[-1][1] == {'p1': '2026-05-02', 'p2': 'Weekly notes', 'p3': 9, 'p4': 2}
+
+
+def test_projected_pages_carry_the_id_in_the_cursor(client, db):
+    db.respond('FROM blog', [('c', datetime.date(2026, 5, 3), 4), ('b', datetime.date(2026, 5, 3), 3)])
+    response = client.get('/api/blog?fields=title&limit=1')
+    assert response.get_json() == [{'title': 'c'}]
+    assert decode_cursor(response.headers['X-Next-Cursor'], 3) == ['2026-05-03', 'c', 4]
+    assert db.statements[-1][0].startswith('SELECT title, date, id FROM blog')
+
+
+def test_blog_cursor_with_a_non_integer_id_is_rejected(client, db):
+    cursor = encode_cursor(['2026-05-03', 'c', 'x'])
+    assert client.get(f'/api/blog?cursor={cursor}').status_code == 400
+    assert not any('FROM blog' in sql for sql, params in db.statements)
+
+
+def test_contact_messages_page_on_timestamp_and_uuid(client, db):
+    db.respond('FROM contact', [
+        (f'00000000-0000-4000-8000-00000000000{i}', 'jane@example.com', 'Hi', datetime.datetime(2026, 5, 1, 12))
+        for i in (3, 2, 1)])
+    first = client.get('/api/messages?limit=2')
+    assert first.status_code == 200
+    assert len(first.get_json()) == 2
+    client.get(f"/api/messages?limit=2&cursor={first.headers['X-Next-Cursor']}")
+    sql, params = db.statements[-1]
+    assert 'WHERE (contact_timestamp, uuid) <' in sql
+    assert params == ('2026-05-01T12:00:00', '00000000-0000-4000-8000-000000000002', 3)
+
+
+def test_limit_is_clamped(client, db):
+    client.get('/api/blog?limit=100000')
+    assert db.statements[-1][1] == {'p1': MAX_LIMIT + 1}
+
+
+def test_fields_are_projected(client, db):
+    db.respond('FROM blog', [('c', datetime.date(2026, 5, 3), 'Intro', 1)])
+    response = client.get('/api/blog?fields=title,intro')
+    assert response.get_json() == [{'title': 'c', 'intro': 'Intro'}]
+    assert db.statements[-1][0].startswith('SELECT title, date, intro, id FROM blog')
+
+
+@pytest.mark.parametrize('query', ['cursor=garbage', 'fields=password'])
+def test_bad_page_requests_get_400(client, query):
+    assert client.get(f'/api/blog?{query}').status_code == 400
+
+
+def test_invoices_page_on_id_and_keep_it_out_of_projected_rows(client, db):
+    db.respond('FROM invoices', [(i, 'Hosting') for i in (7, 8, 9)])
+    first = client.get('/api/list_invoices?limit=2&fields=name')
+    assert first.get_json() == [{'name': 'Hosting'}, {'name': 'Hosting'}]
+    assert db.statements[-1] == ('SELECT id, name FROM invoices ORDER BY id LIMIT %s', (3,))
+    assert first.headers['Link'] == f"<http://localhost/api/list_invoices?limit=2&fields=name&cursor={first.headers['X-Next-Cursor']}>; rel=\"next\""
+
+    db.respond('FROM invoices WHERE id >', [(9, 'Hosting')])
+    last = client.get(f"/api/list_invoices?limit=2&fields=name&cursor={first.headers['X-Next-Cursor']}")
+    assert db.statements[-1] == ('SELECT id, name FROM invoices WHERE id > %s ORDER BY id LIMIT %s', (8, 3))
+    assert last.get_json() == [{'name': 'Hosting'}]
+    assert 'X-Next-Cursor' not in last.headers and 'Link' not in last.headers
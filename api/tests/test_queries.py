@@ -0,0 +1,76 @@
+import psycopg2
+import pytest
+
+import queries
+from db_pool import ConnectionPool
+from queries import StatementRegistry
+
+
+@pytest.fixture
+def pool(db):
+    pool = ConnectionPool({}, min_size=0, max_size=2, timeout=1.0)
+    yield pool
+    pool.close()
+
+
+def run(registry, conn, name, params=()):
+    with conn.cursor() as cur:
+        return registry.execute(cur, name, params).fetchall()
+
+
+def test_statements_are_prepared_once_per_connection(pool, db):
+    registry = StatementRegistry(enabled=True)
+    db.respond('EXECUTE blog_views', [(42,)])
+    first, second = pool.getconn(), pool.getconn()
+
+    assert run(registry, first, queries.BLOG_VIEWS, ('Pooling',)) == [(42,)]
+    run(registry, first, queries.BLOG_VIEWS, ('Caching',))
+    run(registry, second, queries.BLOG_VIEWS, ('Pooling',))
+
+    assert [sql for sql, params in db.statements] == [
+        'PREPARE blog_views AS SELECT views FROM blog WHERE title = $1',
+        'EXECUTE blog_views (%s)',
+        'EXECUTE blog_views (%s)',
+        'PREPARE blog_views AS SELECT views FROM blog WHERE title = $1',
+        'EXECUTE blog_views (%s)',
+    ]
+    assert [params for sql, params in db.statements if sql.startswith('EXECUTE')] == [
+        ('Pooling',), ('Caching',), ('Pooling',)]
+    stats = registry.stats()['statements']['blog_views']
+    assert (stats['prepare']['count'], stats['execute']['count']) == (2, 3)
+    first.close()
+    second.close()
+
+
+def test_a_statement_the_session_lost_is_prepared_again(pool, db):
+    registry = StatementRegistry(enabled=True)
+    conn = pool.getconn()
+    run(registry, conn, queries.BLOG_VIEWS, ('Pooling',))
+
+    def discarded(params):
+        raise psycopg2.errors.InvalidSqlStatementName('prepared statement "blog_views" does not exist')
+
+    db.respond('EXECUTE blog_views', discarded)
+    with pytest.raises(psycopg2.errors.InvalidSqlStatementName):
+        run(registry, conn, queries.BLOG_VIEWS, ('Pooling',))
+    db.respond('EXECUTE blog_views', [(1,)])
+    assert run(registry, conn, queries.BLOG_VIEWS, ('Pooling',)) == [(1,)]
+    assert len([sql for sql, params in db.statements if sql.startswith('PREPARE')]) == 2
+    conn.close()
+
+
+def test_disabled_registry_runs_the_plain_statement(pool, db):
+    registry = StatementRegistry(enabled=False)
+    conn = pool.getconn()
+    run(registry, conn, queries.BLOG_ADD_VIEWS, (['Pooling'], [3]))
+    sql, params = db.statements[-1]
+    assert sql.startswith('UPDATE blog SET views') and 'unnest(%(p1)s::text[], %(p2)s::int[])' in sql
+    assert params == {'p1': ['Pooling'], 'p2': [3]}
+    assert list(registry.stats()['statements']['blog_add_views']) == ['plain']
+    conn.close()
+
+
+@pytest.mark.parametrize('name', ['blog_views', 'not an identifier'])
+def test_register_rejects_duplicate_and_invalid_names(name):
+    with pytest.raises(ValueError):
+        queries.register(name, 'SELECT 1')
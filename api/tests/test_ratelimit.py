@@ -0,0 +1,133 @@
+import threading
+import time
+
+import pytest
+
+import ratelimit
+from cache import FakeRedis
+from config import Config
+from ratelimit import (ConcurrencyLimiter, LocalStore, Overloaded, RedisStore, TokenBucket, json_field,
+                       limit_concurrency, parse_rate)
+
+
+@pytest.mark.parametrize('spec, expected', [
+    ('10/minute', (10 / 60, 10)),
+    ('5/15minutes', (5 / 900, 5)),
+    (' 3 / second ', (3, 3)),
+])
+def test_parse_rate(spec, expected):
+    assert parse_rate(spec) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('spec', ['', 'ten/minute', '10/fortnight', '10'])
+def test_parse_rate_rejects_nonsense(spec):
+    with pytest.raises(ValueError):
+        parse_rate(spec)
+
+
+def test_token_bucket_allows_a_burst_then_refills():
+    bucket = TokenBucket(rate=20, burst=2)
+    assert bucket.try_acquire() == bucket.try_acquire() == 0
+    wait = bucket.try_acquire()
+    assert 0 < wait <= 0.05
+    time.sleep(wait)
+    assert bucket.try_acquire() == 0
+
+
+@pytest.mark.parametrize('store', [LocalStore(), RedisStore(FakeRedis())], ids=['local', 'redis'])
+def test_stores_limit_each_key_separately(store):
+    assert [store.take('a', 1, 3) for _ in range(3)] == [0, 0, 0]
+    assert store.take('a', 1, 3) > 0
+    assert store.take('b', 1, 3) == 0
+
+
+def test_redis_store_refills_over_time():
+    store = RedisStore(FakeRedis())
+    store.take('k', 20, 1)
+    wait = store.take('k', 20, 1)
+    assert 0 < wait <= 0.05
+    time.sleep(wait + 0.01)
+    assert store.take('k', 20, 1) == 0
+
+
+def test_local_store_evicts_the_least_recently_used_key():
+    store = LocalStore(max_keys=2)
+    store.take('a', 1, 1)
+    store.take('b', 1, 1)
+    store.take('c', 1, 1)
+    assert list(store._buckets) == ['b', 'c']
+
+
+def test_concurrency_limiter_queues_then_sheds():
+    limiter = ConcurrencyLimiter(max_in_flight=1, max_queue=1, timeout=0.05)
+    limiter.acquire()
+    errors = []
+
+    def wait():
+        try:
+            limiter.acquire()
+        except Overloaded as e:
+            errors.append(str(e))
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    while limiter.stats()['waiting'] == 0:
+        time.sleep(0.001)
+    with pytest.raises(Overloaded, match='queue is full'):
+        limiter.acquire()
+    waiter.join()
+    assert errors == ["Timed out waiting for a free slot"]
+    limiter.release()
+    limiter.acquire()
+    assert limiter.stats()['in_flight'] == 1
+
+
+def test_queued_caller_gets_the_released_slot():
+    limiter = ConcurrencyLimiter(max_in_flight=1, max_queue=1, timeout=2)
+    limiter.acquire()
+    threading.Timer(0.02, limiter.release).start()
+    limiter.acquire()
+    assert limiter.stats() == {'in_flight': 1, 'waiting': 0, 'max_in_flight': 1, 'max_queue': 1}
+
+
+def test_login_is_limited_per_account(client):
+    login = {'emailOrPhone': 'jane@example.com', 'password': 'wrong password'}
+    # Each attempt from a different address, so only the per-account limit applies.
+    statuses = [client.post('/api/auth/login', json=login, environ_base={'REMOTE_ADDR': f'10.0.0.{i}'}).status_code
+                for i in range(11)]
+    assert statuses == [401] * 10 + [429]
+
+
+def test_rate_limited_response_has_retry_after(client):
+    for i in range(20):
+        client.post('/api/auth/login', json={'emailOrPhone': f'user{i}@example.com', 'password': 'x'})
+    response = client.post('/api/auth/login', json={'emailOrPhone': 'other@example.com', 'password': 'x'})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert response.get_json() == {"error": "Too many requests. Please try again later."}
+
+
+def test_account_key_ignores_case_and_whitespace(app):
+    key = json_field('emailOrPhone')
+    for body, expected in [({'emailOrPhone': ' Jane@Example.com '}, 'jane@example.com'),
+                           ({'emailOrPhone': ''}, None), ({}, None), (['jane'], None)]:
+        with app.test_request_context(json=body):
+            assert key() == expected
+
+
+def test_disabled_limits_let_every_request_through(client, monkeypatch):
+    monkeypatch.setattr(Config, 'RATELIMIT_ENABLED', False)
+    monkeypatch.setattr(ratelimit, 'get_concurrency_limiter', lambda name: pytest.fail("limiter used while disabled"))
+    login = {'emailOrPhone': 'jane@example.com', 'password': 'wrong password'}
+    assert {client.post('/api/auth/login', json=login).status_code for _ in range(25)} == {401}
+
+
+def test_the_slot_is_released_when_the_handler_raises(app):
+    @limit_concurrency('flaky')
+    def handler():
+        raise RuntimeError('boom')
+
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            handler()
+    assert ratelimit.get_concurrency_limiter('flaky').stats()['in_flight'] == 0
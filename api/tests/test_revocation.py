@@ -0,0 +1,113 @@
+import datetime
+
+import psycopg2
+import pytest
+
+from revocation import BloomFilter, TokenBlocklist
+
+
+@pytest.fixture
+def blocklist(db):
+    return TokenBlocklist(capacity=1000, sync_interval=60)
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000)
+    for i in range(1000):
+        bloom.add(f'jti-{i}')
+    assert all(f'jti-{i}' in bloom for i in range(1000))
+    assert sum(f'other-{i}' in bloom for i in range(1000)) < 50
+
+
+def test_unknown_token_is_answered_from_memory(blocklist, db):
+    assert blocklist.is_revoked('never-revoked') is False
+    assert blocklist.db_lookups == 0
+
+
+def test_revoked_token_is_stored_and_rejected(blocklist, db):
+    expires_at = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    blocklist.revoke('jti-1', expires_at)
+    assert ('INSERT INTO blacklist_tokens (jti, expires_at) VALUES (%s, %s) ON CONFLICT (jti) DO NOTHING',
+            ('jti-1', expires_at)) in db.committed
+    assert blocklist.is_revoked('jti-1') is True
+    assert blocklist.db_lookups == 0
+
+
+def test_sync_picks_up_other_workers_revocations(blocklist, db):
+    db.respond('FROM blacklist_tokens WHERE', [('from-another-worker', None)])
+    blocklist._next_sync = 0
+    assert blocklist.is_revoked('from-another-worker') is True
+
+
+def test_sync_rereads_an_overlap_window(blocklist, db):
+    synced_at = datetime.datetime(2026, 5, 1, 12, 0, 0)
+    db.respond('SELECT localtimestamp', [(synced_at,)])
+    blocklist._sync()
+    blocklist._sync()
+    reads = [params for sql, params in db.statements if 'FROM blacklist_tokens WHERE' in sql]
+    assert reads[0] == {'since': None}
+    # A revocation stamped just before the first sync but committed after it is still read.
+    assert reads[1] == {'since': synced_at - blocklist.sync_overlap}
+
+
+def test_logout_revokes_the_token(client, db, auth_headers):
+    assert client.post('/api/auth/logout', headers=auth_headers).status_code == 200
+    assert db.was_committed('INSERT INTO blacklist_tokens')
+    assert client.get('/api/home/db_pool', headers=auth_headers).status_code != 200
+
+
+def test_logout_fails_closed(client, db, auth_headers):
+    def unavailable(params):
+        raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+    db.respond('INSERT INTO blacklist_tokens', unavailable)
+    assert client.post('/api/auth/logout', headers=auth_headers).status_code == 500
+    assert client.get('/api/home/db_pool', headers=auth_headers).status_code == 200
+
+
+def test_revoked_token_is_rejected_before_the_first_sync(blocklist, db):
+    failures = []
+
+    def unavailable_at_boot(params):
+        if not failures:
+            failures.append(params)
+            raise psycopg2.OperationalError("the database system is starting up")
+        return [(datetime.datetime.utcnow(),)]
+
+    db.respond('SELECT localtimestamp', unavailable_at_boot)
+    db.respond('SELECT expires_at FROM blacklist_tokens', [(None,)])
+    assert blocklist.is_revoked('revoked-before-restart') is True
+    assert blocklist.db_lookups == 1
+
+
+def test_token_check_fails_closed_while_the_database_is_down(client, db, auth_headers):
+    import revocation
+
+    def unavailable(params):
+        raise psycopg2.OperationalError("could not connect to server")
+
+    db.respond('SELECT localtimestamp', unavailable)
+    db.respond('SELECT expires_at FROM blacklist_tokens', unavailable)
+    revocation.get_blocklist()._next_sync = 0
+    assert client.get('/api/home/db_pool', headers=auth_headers).status_code != 200
+
+
+def test_compact_purges_expired_rows_and_rebuilds_the_filter(blocklist, db):
+    blocklist.revoke('expired-since', None)
+    rebuilds = []
+
+    def live_rows(params):
+        if not rebuilds:  # another request logs out while the filter is being rebuilt
+            rebuilds.append(params)
+            blocklist.revoke('revoked-during-rebuild', None)
+        return [('still-live', None)]
+
+    db.respond('FROM blacklist_tokens WHERE', live_rows)
+    db.respond('DELETE FROM blacklist_tokens', [()])
+
+    assert blocklist.compact() == 1
+    assert db.was_committed('DELETE FROM blacklist_tokens WHERE expires_at <=')
+    assert 'expired-since' not in blocklist._bloom
+    assert 'still-live' in blocklist._bloom
+    assert 'revoked-during-rebuild' in blocklist._bloom
+    assert blocklist._revoked_during_rebuild is None
@@ -0,0 +1,82 @@
+import datetime
+
+import pytest
+
+from search import InMemoryBlogSearch, to_prefix_tsquery
+
+
+def blog(title, author='Jane Doe', intro='', date=datetime.date(2026, 10, 1)):
+    return (title, None, author, date, intro, None, None, None, 0)
+
+
+@pytest.fixture
+def cur(db):
+    from db_pool import get_pool
+
+    with get_pool().connection() as conn, conn.cursor() as cur:
+        yield cur
+
+
+@pytest.fixture
+def index(db):
+    db.respond('FROM blog', [
+        blog('Pooling Postgres connections', intro='Why a pool beats connect per request'),
+        blog('Caching blog pages', intro='Postgres is not the bottleneck'),
+        blog('Rate limits', author='Pooja Rao'),
+    ])
+    return InMemoryBlogSearch()
+
+
+def titles(rows):
+    return [row[0] for row in rows]
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('Flask  pool!', 'flask:* & pool:*'),
+    ('Déjà vu', 'déjà:* & vu:*'),
+    ('  --  ', None),
+])
+def test_to_prefix_tsquery(query, expected):
+    assert to_prefix_tsquery(query) == expected
+
+
+def test_title_matches_rank_above_intro_matches(index, cur):
+    rows, total = index.search(cur, 'postgres', 10, 0)
+    assert titles(rows) == ['Pooling Postgres connections', 'Caching blog pages']
+    assert total == 2
+
+
+def test_every_term_must_match_and_the_last_is_a_prefix(index, cur):
+    assert titles(index.search(cur, 'poo', 10, 0)[0]) == ['Pooling Postgres connections', 'Rate limits']
+    assert titles(index.search(cur, 'pool conn', 10, 0)[0]) == ['Pooling Postgres connections']
+    assert index.search(cur, 'pool caching', 10, 0) == ([], 0)
+
+
+def test_pages_are_sliced_after_ranking(index, cur):
+    rows, total = index.search(cur, 'poo', 1, 1)
+    assert (titles(rows), total) == (['Rate limits'], 2)
+
+
+def test_writes_update_the_index(index, cur):
+    index.search(cur, 'x', 10, 0)  # loads the table
+    index.index(blog('Rate limits', intro='Token buckets in Redis'))
+    index.remove('Caching blog pages')
+    assert titles(index.search(cur, 'redis', 10, 0)[0]) == ['Rate limits']
+    assert titles(index.search(cur, 'postgres', 10, 0)[0]) == ['Pooling Postgres connections']
+
+
+def test_blog_query_runs_a_ranked_search_with_an_offset_cursor(client, db):
+    db.respond('to_tsquery', lambda params: [(*blog('Pooling Postgres connections'), 3)])
+
+    response = client.get('/api/blog?query=pool%20post&limit=1')
+
+    assert response.status_code == 200
+    assert [b['title'] for b in response.get_json()] == ['Pooling Postgres connections']
+    assert response.headers['X-Total-Count'] == '3'
+    sql, params = [(sql, params) for sql, params in db.statements if 'to_tsquery' in sql][0]
+    assert 'ILIKE' not in sql and 'ORDER BY ts_rank' in sql
+    assert params == ('pool:* & post:*', 1, 0)
+
+    client.get(f"/api/blog?query=pool%20post&limit=1&cursor={response.headers['X-Next-Cursor']}")
+    assert [params for sql, params in db.statements if 'to_tsquery' in sql][1] == ('pool:* & post:*', 1, 1)
+
@@ -0,0 +1,46 @@
+import hashlib
+import io
+
+import pytest
+
+from storage import ContentStore, UploadError
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ContentStore(str(tmp_path), chunk_size=4, max_size=1024)
+
+
+def test_save_stream_deduplicates(store):
+    digest, size, created = store.save_stream(io.BytesIO(b'hello world'))
+    assert digest == hashlib.sha256(b'hello world').hexdigest()
+    assert (size, created) == (11, True)
+    assert store.save_stream(io.BytesIO(b'hello world'))[2] is False
+
+
+def test_chunked_upload_is_hashed_while_written(store, monkeypatch):
+    data = b'0123456789abcdefghij'
+    monkeypatch.setattr(store, '_hash_file', lambda path: pytest.fail("the upload was re-read to hash it"))
+    upload = store.create_upload('data.bin', len(data))
+    for offset in range(0, len(data), 7):
+        result = store.append_chunk(upload['id'], offset, io.BytesIO(data[offset:offset + 7]))
+    assert result['sha256'] == hashlib.sha256(data).hexdigest()
+    with open(store.path_for(result['sha256']), 'rb') as f:
+        assert f.read() == data
+
+
+def test_chunk_from_another_worker_falls_back_to_rehashing(store):
+    data = b'0123456789'
+    upload = store.create_upload('data.bin', len(data))
+    store.append_chunk(upload['id'], 0, io.BytesIO(data[:5]))
+    store._hashers.clear()  # as if the first chunk had been handled elsewhere
+    result = store.append_chunk(upload['id'], 5, io.BytesIO(data[5:]))
+    assert result['sha256'] == hashlib.sha256(data).hexdigest()
+
+
+def test_chunk_at_wrong_offset_is_rejected(store):
+    upload = store.create_upload('data.bin', 10)
+    store.append_chunk(upload['id'], 0, io.BytesIO(b'abc'))
+    with pytest.raises(UploadError) as excinfo:
+        store.append_chunk(upload['id'], 1, io.BytesIO(b'def'))
+    assert (excinfo.value.status, excinfo.value.offset) == (409, 3)
@@ -0,0 +1,67 @@
+import csv
+import datetime
+import io
+import json
+
+import pytest
+
+import streaming
+
+INVOICES = [(i, f'Customer {i}', f'{i}.50', datetime.date(2026, 10, i % 28 + 1), 'unpaid') for i in range(1, 51)]
+
+
+@pytest.fixture
+def invoices(db):
+    db.respond('FROM invoices ORDER BY id', INVOICES)
+    return db
+
+
+def test_export_is_streamed_in_chunks(client, auth_headers, invoices, monkeypatch):
+    monkeypatch.setattr(streaming, 'CHUNK_SIZE', 512)
+
+    response = client.get('/api/export/invoices?format=ndjson', headers=auth_headers)
+
+    assert response.is_streamed
+    chunks = list(response.response)
+    assert len(chunks) > 2
+    assert all(chunk.endswith(b'\n') for chunk in chunks)
+    rows = [json.loads(line) for line in b''.join(chunks).splitlines()]
+    assert [row['id'] for row in rows] == list(range(1, 51))
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.headers['Content-Disposition'] == 'attachment; filename=invoices.ndjson'
+    response.close()
+
+
+@pytest.mark.parametrize('query, headers, mimetype', [
+    ('', {}, 'application/json'),
+    ('', {'Accept': 'text/csv'}, 'text/csv'),
+    ('?format=csv', {'Accept': 'application/x-ndjson'}, 'text/csv'),
+    ('?format=xml', {}, 'application/json'),
+])
+def test_format_comes_from_the_query_then_accept(client, auth_headers, invoices, query, headers, mimetype):
+    response = client.get(f'/api/export/invoices{query}', headers={**auth_headers, **headers})
+    assert response.mimetype == mimetype
+
+
+def test_json_and_csv_exports_hold_every_row(client, auth_headers, invoices):
+    as_json = client.get('/api/export/invoices', headers=auth_headers).get_json()
+    assert len(as_json) == 50 and as_json[0]['name'] == 'Customer 1'
+
+    as_csv = client.get('/api/export/invoices?format=csv', headers=auth_headers).get_data(as_text=True)
+    rows = list(csv.reader(io.StringIO(as_csv)))
+    assert rows[0] == ['id', 'name', 'amount', 'due_date', 'status']
+    assert rows[1] == ['1', 'Customer 1', '1.50', '2026-10-02', 'unpaid']
+    assert len(rows) == 51
+
+
+def test_empty_json_export_is_an_empty_array(client, auth_headers, db):
+    assert client.get('/api/export/invoices', headers=auth_headers).get_json() == []
+
+
+def test_the_connection_is_returned_when_the_stream_ends(client, auth_headers, invoices):
+    from db_pool import get_pool
+
+    response = client.get('/api/export/invoices?format=ndjson', headers=auth_headers)
+    response.get_data()
+    response.close()
+    assert get_pool().stats()['in_use'] == 0
@@ -0,0 +1,25 @@
+import threading
+from concurrent.futures import Future
+
+from thumbnails import ThumbnailPipeline
+
+
+class FinishedExecutor:
+    """Hands back futures that are already done, like a very fast worker process."""
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(args[1])
+        return future
+
+
+def test_submit_with_an_already_finished_render_does_not_deadlock(tmp_path, monkeypatch):
+    pipeline = ThumbnailPipeline(str(tmp_path), sizes=(64,))
+    monkeypatch.setattr(pipeline, '_get_executor', lambda: FinishedExecutor())
+    results = []
+    worker = threading.Thread(target=lambda: results.append(pipeline.submit('source', 'ab' * 32, 64)), daemon=True)
+    worker.start()
+    worker.join(5)
+    assert not worker.is_alive(), "submit() deadlocked on its own lock"
+    assert results[0].result() == pipeline.path_for('ab' * 32, 64)
+    assert pipeline._inflight == {}
@@ -0,0 +1,99 @@
+import atexit
+
+import psycopg2
+import pytest
+
+import view_counter
+from view_counter import ViewCounter
+
+
+@pytest.fixture
+def blog_views(db):
+    """Views per title as the blog table holds them; the fake UPDATE adds to it."""
+    views = {'Pooling': 10, 'Caching': 0}
+
+    def add_views(params):
+        updated = []
+        for title, n in zip(params['p1'], params['p2']):
+            if title in views:
+                views[title] += n
+                updated.append((title, views[title]))
+        return updated
+
+    db.respond('SELECT views FROM blog', lambda params: [(views[params['p1']],)] if params['p1'] in views else [])
+    db.respond('UPDATE blog SET views', add_views)
+    return views
+
+
+@pytest.fixture
+def make_counter(monkeypatch):
+    counters = []
+
+    def make(**kwargs):
+        counters.append(ViewCounter(**kwargs))
+        return counters[-1]
+
+    monkeypatch.setattr(ViewCounter, '_ensure_started', lambda self: None)
+    yield make
+    for counter in counters:
+        atexit.unregister(counter.flush)  # the fake database is gone by then
+
+
+@pytest.fixture
+def counter(make_counter):
+    return make_counter(flush_interval=60, flush_threshold=3)
+
+
+def test_views_are_counted_in_memory_and_flushed_in_one_update(counter, db, blog_views):
+    assert [counter.increment('Pooling') for _ in range(2)] == [11, 12]
+    assert counter.increment('Caching') == 1
+    assert counter.increment('Missing') is None
+    assert blog_views == {'Pooling': 10, 'Caching': 0}
+
+    counter.flush()
+
+    assert blog_views == {'Pooling': 12, 'Caching': 1}
+    assert len([sql for sql, params in db.committed if 'UPDATE blog SET views' in sql]) == 1
+    assert counter.stats() == {'pending_titles': 0, 'pending_views': 0, 'flushes': 1}
+    assert counter.increment('Pooling') == 13
+    assert len([sql for sql, params in db.statements if 'SELECT views' in sql]) == 3  # one per title
+
+
+def test_reaching_the_threshold_wakes_the_flusher(counter, blog_views):
+    counter.increment('Pooling')
+    counter.increment('Pooling')
+    assert not counter._wake.is_set()
+    counter.increment('Caching')
+    assert counter._wake.is_set()
+
+
+def test_a_failed_flush_keeps_the_views_for_the_next_one(counter, db, blog_views):
+    counter.increment('Pooling')
+    counter.increment('Pooling')
+
+    def down(params):
+        raise psycopg2.OperationalError('server closed the connection unexpectedly')
+
+    db.respond('UPDATE blog SET views', down)
+    counter.flush()
+    assert counter.stats()['pending_views'] == 2
+
+    db.respond('UPDATE blog SET views', lambda params: [('Pooling', 12)])
+    counter.flush()
+    assert counter.stats() == {'pending_titles': 0, 'pending_views': 0, 'flushes': 1}
+
+
+def test_a_deleted_post_is_forgotten(counter, blog_views):
+    counter.increment('Caching')
+    counter.forget('Caching')
+    assert counter.stats()['pending_views'] == 0
+    del blog_views['Caching']
+    assert counter.increment('Caching') is None
+
+
+def test_the_views_route_does_not_write_per_request(client, db, blog_views, make_counter, monkeypatch):
+    monkeypatch.setattr(view_counter, '_view_counter', make_counter(flush_interval=60, flush_threshold=100))
+
+    assert [client.put('/api/blog/views/Pooling').get_json() for _ in range(3)] == [{'views': n} for n in (11, 12, 13)]
+    assert client.put('/api/blog/views/Missing').status_code == 404
+    assert not db.was_committed('UPDATE blog SET views')
@@ -0,0 +1,136 @@
+import importlib.util
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_FORMATS = {'webp': ('WEBP', 'image/webp'), 'jpeg': ('JPEG', 'image/jpeg'), 'png': ('PNG', 'image/png')}
+
+
+class ThumbnailUnavailable(Exception):
+    def __init__(self, message, status=404):
+        super().__init__(message)
+        self.status = status
+
+
+def _render(source, target, size, fmt):
+    from PIL import Image, ImageOps  # optional dependency, only imported in the worker processes
+
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        if fmt == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        tmp = f'{target}.{os.getpid()}.tmp'
+        image.save(tmp, fmt, quality=85)
+    os.replace(tmp, target)
+    return target
+
+
+class ThumbnailPipeline:
+    """Renders fixed-size thumbnails of stored images in a process pool.
+
+    Thumbnails are cached on disk next to the originals, keyed by content
+    hash and size, so each variant is rendered at most once. Profile uploads
+    queue every size up front; get() renders a missing variant on demand and
+    waits up to ``timeout`` seconds for it. Concurrent requests for the same
+    variant share one render.
+    """
+
+    def __init__(self, root, sizes=(64, 128, 256), fmt='webp', workers=2, timeout=10.0):
+        self.root = root
+        self.sizes = tuple(sorted(sizes))
+        self.format, self.content_type = _FORMATS[fmt]
+        self.extension = fmt
+        self.workers = workers
+        self.timeout = timeout
+        self._inflight = {}
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def available():
+        return importlib.util.find_spec('PIL') is not None
+
+    def path_for(self, digest, size):
+        return os.path.join(self.root, digest[:2], digest[2:4], f'{digest}-{size}.{self.extension}')
+
+    def _get_executor(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    self._inflight = {}
+                    self._pid = os.getpid()
+        return self._executor
+
+    def submit(self, source, digest, size):
+        executor = self._get_executor()
+        key = (digest, size)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            target = self.path_for(digest, size)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            future = self._inflight[key] = executor.submit(_render, source, target, size, self.format)
+        # Outside the lock: a future that has already finished runs the callback right here.
+        future.add_done_callback(lambda f: self._done(key, f))
+        return future
+
+    def _done(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        if future.exception() is not None:
+            logger.warning("Could not render %s thumbnail of %s: %s", key[1], key[0], future.exception())
+
+    def generate_all(self, source, digest):
+        if not self.available():
+            return
+        for size in self.sizes:
+            if not os.path.exists(self.path_for(digest, size)):
+                self.submit(source, digest, size)
+
+    def get(self, source, digest, size):
+        """Path of the ``size`` thumbnail for ``digest``, rendering it if needed."""
+        if size not in self.sizes:
+            raise ThumbnailUnavailable(f"Thumbnail sizes are {', '.join(map(str, self.sizes))}")
+        path = self.path_for(digest, size)
+        if os.path.exists(path):
+            return path
+        if not self.available():
+            raise ThumbnailUnavailable("Image processing is not installed", 503)
+        try:
+            return self.submit(source, digest, size).result(self.timeout)
+        except TimeoutError:
+            raise ThumbnailUnavailable("Thumbnail is still being generated", 503)
+        except Exception:
+            raise ThumbnailUnavailable("Cannot make a thumbnail of this file", 415)
+
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False)
+        self._executor = None
+        self._pid = None
+
+
+_thumbnailer = None
+
+
+def get_thumbnailer():
+    global _thumbnailer
+    if _thumbnailer is None:
+        _thumbnailer = ThumbnailPipeline(
+            os.path.join(Config.UPLOAD_FOLDER, 'thumbs'),
+            sizes=[int(size) for size in Config.THUMBNAIL_SIZES.split(',')],
+            fmt=Config.THUMBNAIL_FORMAT,
+            workers=Config.THUMBNAIL_WORKERS,
+            timeout=Config.THUMBNAIL_TIMEOUT,
+        )
+    return _thumbnailer
@@ -0,0 +1,133 @@
+from flask import current_app, jsonify, make_response, request, url_for
+from werkzeug.utils import secure_filename
+
+from storage import UploadError, get_store, record_file
+from utils import get_db
+
+
+def _error(error):
+    response = make_response(jsonify({"error": str(error)}), error.status)
+    if error.offset is not None:
+        response.headers['Upload-Offset'] = str(error.offset)
+    return response
+
+
+def _stored(filename, digest, size, created, content_type, owner=None, on_stored=None):
+    extra = {}
+    with get_db().cursor() as cur:
+        file_id = record_file(cur, filename, digest, size, content_type, owner)
+        if on_stored is not None:
+            extra = on_stored(cur, file_id, digest, content_type) or {}
+    current_app.logger.info("Stored upload %s (%s, %d bytes%s)", filename, digest, size,
+                            "" if created else ", deduplicated")
+    return make_response(jsonify({
+        "message": "File uploaded successfully",
+        "id": file_id,
+        "sha256": digest,
+        "size": size,
+        "deduplicated": not created,
+        "url": url_for('files_content_download', digest=digest),
+        **extra,
+    }), 201)
+
+
+def receive_upload(owner=None, on_stored=None):
+    """Store a whole file sent as multipart ``file`` or as the raw request body.
+
+    A raw body (any non-form content type) is streamed straight from the
+    socket to disk; its name comes from the ``X-Filename`` header or the
+    ``filename`` query argument. The file is recorded as ``owner``'s, and
+    only they can fetch it by id; anyone can fetch it by its content hash,
+    which is the ``url`` returned. ``on_stored(cur, file_id, digest,
+    content_type)`` runs in the transaction that records the file and may
+    return extra fields for the response.
+    """
+    if request.mimetype in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+        if 'file' not in request.files:
+            return make_response(jsonify({"error": "No file part"}), 400)
+        file = request.files['file']
+        filename, stream, content_type = file.filename, file.stream, file.mimetype
+    else:
+        filename = request.headers.get('X-Filename') or request.args.get('filename')
+        stream, content_type = request.stream, request.mimetype or None
+    filename = secure_filename(filename or '')
+    if not filename:
+        return make_response(jsonify({"error": "No selected file"}), 400)
+    try:
+        digest, size, created = get_store().save_stream(stream)
+    except UploadError as error:
+        return _error(error)
+    return _stored(filename, digest, size, created, content_type, owner, on_stored)
+
+
+def _upload_body(meta):
+    return {"upload_id": meta['id'], "offset": meta['offset'], "size": meta['size'],
+            "chunk_size": get_store().chunk_size}
+
+
+def _owned_upload(upload_id, owner):
+    meta = get_store().get_upload(upload_id)
+    if meta.get('owner') != owner:
+        raise UploadError("Upload not found", 404)
+    return meta
+
+
+def start_upload(endpoint, owner=None):
+    """Open a resumable upload from a JSON ``{filename, size, content_type}`` body."""
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get('filename') or '')
+    if not filename:
+        return make_response(jsonify({"error": "No selected file"}), 400)
+    try:
+        meta = get_store().create_upload(filename, data.get('size'), data.get('content_type'), owner)
+    except UploadError as error:
+        return _error(error)
+    meta['offset'] = 0
+    response = make_response(jsonify(_upload_body(meta)), 201)
+    response.headers['Location'] = url_for(endpoint, upload_id=meta['id'])
+    response.headers['Upload-Offset'] = '0'
+    return response
+
+
+def upload_status(upload_id, owner=None):
+    try:
+        meta = _owned_upload(upload_id, owner)
+    except UploadError as error:
+        return _error(error)
+    response = make_response(jsonify(_upload_body(meta)), 200)
+    response.headers['Upload-Offset'] = str(meta['offset'])
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def upload_chunk(upload_id, owner=None, on_stored=None):
+    """Append the raw request body at the ``Upload-Offset`` header's position.
+
+    A client that lost its connection asks upload_status() for the offset
+    and carries on from there. The request that supplies the last byte gets
+    the stored file back with a 201.
+    """
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return make_response(jsonify({"error": "Upload-Offset header is required"}), 400)
+    try:
+        _owned_upload(upload_id, owner)
+        meta = get_store().append_chunk(upload_id, offset, request.stream)
+    except UploadError as error:
+        return _error(error)
+    if 'sha256' not in meta:
+        response = make_response(jsonify(_upload_body(meta)), 200)
+        response.headers['Upload-Offset'] = str(meta['offset'])
+        return response
+    return _stored(meta['filename'], meta['sha256'], meta['size'], meta['created'], meta['content_type'],
+                   owner, on_stored)
+
+
+def cancel_upload(upload_id, owner=None):
+    try:
+        _owned_upload(upload_id, owner)
+        get_store().abort_upload(upload_id)
+    except UploadError as error:
+        return _error(error)
+    return make_response('', 204)
@@ -1,156 +1,258 @@
 import datetime
-import os
-import bcrypt
-from flask_socketio import emit
+from contextlib import contextmanager
+from urllib.parse import quote
+from flask_socketio import emit, join_room, leave_room, rooms
 import psycopg2
 import uuid
-from flask import Config, current_app
+from flask import Config, current_app, g, has_request_context, request
 import logging
-from logging.handlers import RotatingFileHandler
 from config import Config
-
-
-
-def setup_logging(app):
-    if not app.debug:
-        log_dir = os.path.join(app.config['logs'])
-        if not os.path.exists(log_dir):
-            os.makedirs(log_dir)
-        
-        file_handler = RotatingFileHandler(os.path.join(log_dir, 'sautis.log'), maxBytes=10240, backupCount=10)
-        file_handler.setLevel(logging.DEBUG)
-        formatter = logging.Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-        file_handler.setFormatter(formatter)
-        app.logger.addHandler(file_handler)
-        app.logger.setLevel(logging.DEBUG)
-        app.logger.info('Sautis startup')
+from db_pool import get_pool
+from hashing import get_hasher
+from chat_store import get_message_buffer, invalid_message
+from chat_bus import LOBBY_ROOM, conversation_room
 
 
 def register_socketio_events(socketio):
     @socketio.on('connect')
     def handle_connect():
-        print('Client connected')
+        current_app.logger.debug("Socket client connected: %s", request.sid)
+        join_room(LOBBY_ROOM)
         emit('message', {'data': 'Connected'})
 
+    @socketio.on('join')
+    def handle_join(data):
+        conversation = data.get('conversation') if isinstance(data, dict) else None
+        if not conversation:
+            emit('message_error', {'error': 'Missing conversation'})
+            return
+        join_room(conversation_room(conversation))
+        emit('joined', {'conversation': conversation})
+
+    @socketio.on('leave')
+    def handle_leave(data):
+        conversation = data.get('conversation') if isinstance(data, dict) else None
+        if conversation:
+            leave_room(conversation_room(conversation))
+            emit('left', {'conversation': conversation})
+
     @socketio.on('message')
     def handle_message(data):
-        print('Received message:', data)
         email = data.get('email')
         message = data.get('message')
+        conversation = data.get('conversation')
         if email and message:
+            error = invalid_message(email, message)
+            if error:
+                # Refused up front: the flusher could never insert it.
+                emit('message_error', {'error': error})
+                return
+            room = conversation_room(conversation) if conversation else LOBBY_ROOM
+            if room not in rooms():
+                emit('message_error', {'error': 'Join the conversation first'})
+                return
             message_id = str(uuid.uuid4())
             timestamp = datetime.datetime.utcnow()
 
-            conn = connect_db()
-            cur = conn.cursor()
-            try:
-                cur.execute("INSERT INTO messages (uuid, email, content, timestamp) VALUES (%s, %s, %s, %s)",
-                            (message_id, email, message, timestamp))
-                conn.commit()
-                print('Message saved to database')
-            finally:
-                cur.close()
-                conn.close()
-
-            emit('message', {'email': email, 'message': message}, broadcast=True)
+            payload = {'email': email, 'message': message}
+            if conversation:
+                payload['conversation'] = conversation
+            emit('message', payload, to=room)
+            get_message_buffer().add(message_id, email, message, timestamp)
         else:
-            print('Invalid message format')
-            emit('message_error', {'error': 'Invalid message format'}, broadcast=True)
+            current_app.logger.debug("Rejected malformed chat message from %s", request.sid)
+            emit('message_error', {'error': 'Invalid message format'})
 
     @socketio.on('disconnect')
     def handle_disconnect():
-        print('Client disconnected')
+        current_app.logger.debug("Socket client disconnected: %s", request.sid)
+        get_message_buffer().flush()
 
 
 def hash_password(password: str) -> str:
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode(), salt)
-    return hashed.decode()
+    return get_hasher().hash(password)
 
 def check_password(password: str, hashed: str) -> bool:
     password = password.strip()
-    logging.debug(f"Checking password: {password} against hashed: {hashed}")
     try:
-        result = bcrypt.checkpw(password.encode(), hashed.encode())
-        logging.debug(f"Password match result: {result}")
+        result = get_hasher().verify(password, hashed)
+        logging.debug("Password match result: %s", result)
         return result
     except Exception as error:
-        logging.error(f"Error in check_password: {error}")
+        logging.error("Error in check_password: %s", error)
         raise
 
+def password_needs_rehash(hashed: str) -> bool:
+    return get_hasher().needs_rehash(hashed)
+
 def connect_db():
-    print(f"Connecting to database {Config.DB_NAME} on {Config.DB_HOST}:{Config.DB_PORT} as user {Config.DB_USER}")
     try:
-        conn = psycopg2.connect(
-            dbname=Config.DB_NAME,
-            user=Config.DB_USER,
-            password=Config.DB_PASSWORD,
-            host=Config.DB_HOST,
-            port=Config.DB_PORT
-        )
-        print("Successfully connected to the database")
-        return conn
+        return get_pool().getconn()
     except Exception as e:
-        print(f"Failed to connect to the database: {e}")
+        logging.error("Failed to get a database connection from the pool: %s", e)
         raise
 
+@contextmanager
+def db_connection():
+    conn = connect_db()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+def get_db():
+    """The connection for the current request (or app context), checked out on first use.
+
+    Handlers share it and do not need to commit: register_db_session() commits
+    after a successful response, rolls back on 4xx/5xx or an exception, and
+    always returns the connection to the pool. Commit explicitly only when
+    something outside the database (mail, cache) must not run ahead of it.
+    """
+    conn = g.get('db_conn')
+    if conn is None:
+        owner = f"{request.method} {request.path}" if has_request_context() else None
+        conn = g.db_conn = get_pool().getconn(owner=owner)
+    return conn
+
+def release_db():
+    """Commit and hand the request's connection back early, e.g. before slow non-database work."""
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        try:
+            conn.commit()
+        finally:
+            conn.close()
+
+def register_db_session(app):
+    @app.after_request
+    def finish_transaction(response):
+        conn = g.get('db_conn')
+        if conn is None:
+            return response
+        if response.status_code >= 400:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                pass  # the pool discards a broken connection on release
+            return response
+        try:
+            conn.commit()
+        except psycopg2.Error as e:
+            current_app.logger.error("Commit failed for %s %s: %s", request.method, request.path, e)
+            conn.rollback()
+            return app.make_response(({"error": "A database error occurred. Please try again later."}, 500))
+        return response
+
+    @app.teardown_appcontext
+    def release_connection(exc):
+        conn = g.pop('db_conn', None)
+        if conn is None:
+            return
+        try:
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                # No response was finalised (an exception escaped, or a CLI command ended).
+                if exc is None:
+                    conn.commit()
+                else:
+                    conn.rollback()
+        finally:
+            conn.close()
+
 def user_exists(cur, email):
     cur.execute("SELECT EXISTS(SELECT 1 FROM userinfo1 WHERE email = %s)", (email,))
     return cur.fetchone()[0]
 
-def phone_exists(cur, phone_number):
-    cur.execute("SELECT 1 FROM userinfo1 WHERE phone_number = %s", (phone_number,))
-    return cur.fetchone() is not None
-
-def create_user(cur, name, email, phone_number, password, token):
+def insert_user(cur, name, email, phone_number, hashed_password, token):
     user_id = str(uuid.uuid4())
-    hashed_password = hash_password(password)
     cur.execute("""
         INSERT INTO userinfo1 (id, name, email, phone_number, password, token)
         VALUES (%s, %s, %s, %s, %s, %s)
     """, (user_id, name, email, phone_number, hashed_password, token))
 
+def create_user(cur, name, email, phone_number, password, token):
+    insert_user(cur, name, email, phone_number, hash_password(password), token)
+
 
 def initialize_db():
-    conn = connect_db()
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS userinfo1 (
-            id UUID PRIMARY KEY,
-            name VARCHAR(100),
-            email VARCHAR(100) UNIQUE,
-            phone_number VARCHAR(15),
-            password VARCHAR(60),
-            token VARCHAR(100),
-            verified VARCHAR(1) DEFAULT '0' NOT NULL CHECK (verified IN ('0', '1')),
-            profile_image TEXT
-        );
-    """)
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS blacklist_tokens (
-            id SERIAL PRIMARY KEY,
-            token TEXT NOT NULL UNIQUE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS subscriptions (
-            id UUID PRIMARY KEY,
-            email VARCHAR(100) UNIQUE,
-            subscribed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    users = [
-        ("John Doe", "john@example.com", "1234567890", hash_password("password123")),
-        ("Jane Smith", "jane@example.com", "9876543210", hash_password("password456")),
-        ("Jane Smith", "janes@example.com", "9876548900", hash_password("password789"))
-    ]
-    for name, email, phone_number, password in users:
-        if not user_exists(cur, email):
-            create_user(cur, name, email, phone_number, password, token=str(uuid.uuid4()))
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS userinfo1 (
+                id UUID PRIMARY KEY,
+                name VARCHAR(100),
+                email VARCHAR(100),
+                phone_number VARCHAR(15),
+                password VARCHAR(60),
+                token VARCHAR(100),
+                verified VARCHAR(1) DEFAULT '0' NOT NULL CHECK (verified IN ('0', '1')),
+                profile_image TEXT,
+                invoice_balance NUMERIC(14, 2) DEFAULT 0 NOT NULL,
+                CONSTRAINT userinfo1_email_key UNIQUE (email) INCLUDE (id, password, verified),
+                CONSTRAINT userinfo1_phone_number_key UNIQUE (phone_number) INCLUDE (id, email, password, verified)
+            );
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS blacklist_tokens (
+                id SERIAL PRIMARY KEY,
+                token TEXT UNIQUE,
+                jti VARCHAR(36) UNIQUE,
+                expires_at TIMESTAMP,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS blacklist_tokens_created_at_idx ON blacklist_tokens (created_at)")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                id SERIAL PRIMARY KEY,
+                filename VARCHAR(255) NOT NULL,
+                filepath TEXT NOT NULL,
+                size BIGINT,
+                sha256 CHAR(64),
+                content_type VARCHAR(255),
+                owner UUID,
+                timestamp TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS files_sha256_idx ON files (sha256)")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS subscriptions (
+                id UUID PRIMARY KEY,
+                email VARCHAR(100) UNIQUE,
+                subscribed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS campaigns (
+                id UUID PRIMARY KEY,
+                subject TEXT NOT NULL,
+                body TEXT NOT NULL,
+                html TEXT,
+                status VARCHAR(20) DEFAULT 'draft' NOT NULL,
+                last_email VARCHAR(100),
+                sent INTEGER DEFAULT 0 NOT NULL,
+                failed INTEGER DEFAULT 0 NOT NULL,
+                created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMPTZ,
+                finished_at TIMESTAMPTZ
+            )
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS campaign_failures (
+                campaign_id UUID REFERENCES campaigns (id) ON DELETE CASCADE,
+                email VARCHAR(100),
+                error TEXT,
+                failed_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (campaign_id, email)
+            )
+        """)
+        users = [
+            ("John Doe", "john@example.com", "1234567890", "password123"),
+            ("Jane Smith", "jane@example.com", "9876543210", "password456"),
+            ("Jane Smith", "janes@example.com", "9876548900", "password789")
+        ]
+        for name, email, phone_number, password in users:
+            if not user_exists(cur, email):
+                create_user(cur, name, email, phone_number, password, token=str(uuid.uuid4()))
+        conn.commit()
 
 def subscribe_user(cur, email):
     subscription_id = str(uuid.uuid4())
@@ -164,7 +266,7 @@ def unsubscribe_user(cur, email):
 
 def set_cookies(resp, cookies):
     for key, value in cookies.items():
-        current_app.logger.debug(f"Setting cookie: {key} = {value}")
+        current_app.logger.debug("Setting cookie: %s", key)
         resp.headers.add('Set-Cookie', f"{key}={value}")
 
     return resp
@@ -174,27 +276,20 @@ def generate_magic_link(token):
     magic_link = f"http://localhost:3000/confirm/{token}"
     return magic_link
 
+def unsubscribe_link(email):
+    return f"http://localhost:3000/unsubscribe?email={quote(email)}"
+
 def update_user_registration_status(token):
     try:
-        conn = connect_db()
-        cur = conn.cursor()
-        cur.execute("UPDATE userinfo1 SET verified = '1' WHERE token = %s", (token,))
-        conn.commit()
-        cur.close()
-        conn.close()
+        with get_db().cursor() as cur:
+            cur.execute("UPDATE userinfo1 SET verified = '1' WHERE token = %s", (token,))
         current_app.logger.info("User registration status updated successfully for token: %s", token)
         return True
     except Exception as e:
         current_app.logger.error("Error updating user registration status: %s", str(e))
         return False
 
-def add_to_blacklist(token):
-    try:
-        conn = connect_db()
-        cur = conn.cursor()
-        cur.execute("INSERT INTO blacklist_tokens (token) VALUES (%s)", (token,))
-        conn.commit()
-        cur.close()
-        conn.close()
-    except Exception as e:
-        current_app.logger.error("Error adding token to blacklist: %s", str(e))
+def add_to_blacklist(jti, expires_at):
+    """Revoke a token; raises if the revocation could not be stored, so callers fail closed."""
+    from revocation import get_blocklist  # revocation imports utils
+    get_blocklist().revoke(jti, expires_at)
@@ -0,0 +1,116 @@
+import atexit
+import logging
+import os
+import threading
+
+import queries
+from config import Config
+from utils import db_connection
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    """Coalesces blog view increments and writes them back in batches.
+
+    increment() only touches memory and returns the last persisted count plus
+    the views still pending in this process. Pending views are flushed in a
+    single UPDATE every ``flush_interval`` seconds, as soon as
+    ``flush_threshold`` views are pending, and at interpreter exit.
+    """
+
+    def __init__(self, flush_interval=5.0, flush_threshold=500):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._pending = {}
+        self._pending_total = 0
+        self._known = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+        self.flushes = 0
+        atexit.register(self.flush)
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._flush_loop, name='view-counter', daemon=True).start()
+
+    def _load(self, title):
+        with db_connection() as conn, conn.cursor() as cur:
+            queries.execute(cur, queries.BLOG_VIEWS, (title,))
+            row = cur.fetchone()
+        return None if row is None else row[0] or 0
+
+    def increment(self, title):
+        """Record a view; returns the approximate count, or None if the post does not exist."""
+        self._ensure_started()
+        if title not in self._known:
+            views = self._load(title)
+            if views is None:
+                return None
+            with self._lock:
+                self._known.setdefault(title, views)
+        with self._lock:
+            pending = self._pending[title] = self._pending.get(title, 0) + 1
+            self._pending_total += 1
+            count = self._known.get(title, 0) + pending
+            if self._pending_total >= self.flush_threshold:
+                self._wake.set()
+        return count
+
+    def forget(self, title):
+        with self._lock:
+            self._pending_total -= self._pending.pop(title, 0)
+            self._known.pop(title, None)
+
+    def _flush_loop(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending, self._pending_total = self._pending, {}, 0
+            if not batch:
+                return
+            try:
+                with db_connection() as conn, conn.cursor() as cur:
+                    queries.execute(cur, queries.BLOG_ADD_VIEWS, (list(batch), list(batch.values())))
+                    rows = cur.fetchall()
+                    conn.commit()
+            except Exception:
+                logger.exception("Failed to flush %d blog view counts, will retry", len(batch))
+                with self._lock:
+                    for title, n in batch.items():
+                        self._pending[title] = self._pending.get(title, 0) + n
+                        self._pending_total += n
+                return
+            with self._lock:
+                persisted = dict(rows)
+                for title in batch:
+                    if title in persisted:
+                        self._known[title] = persisted[title]
+                    else:
+                        self._known.pop(title, None)  # deleted since it was viewed
+                self.flushes += 1
+
+    def stats(self):
+        with self._lock:
+            return {"pending_titles": len(self._pending), "pending_views": self._pending_total, "flushes": self.flushes}
+
+
+_view_counter = None
+
+
+def get_view_counter():
+    global _view_counter
+    if _view_counter is None:
+        _view_counter = ViewCounter(Config.VIEW_FLUSH_INTERVAL, Config.VIEW_FLUSH_THRESHOLD)
+    return _view_counter